@@ -1,16 +1,21 @@
 from flask import Flask
-from flask_jsonrpc import JSONRPC
 import json
+import os
 
 from core.base import BaseDTO
+from core.cache import ResponseCache
 from core.fields import String, Int, Bool, List, Dict
 
 from protocols import DTOJsonEncoder, DTOJsonDecoder
-from protocols import aa_data_api
+from protocols import aa_data_api, CachedJSONRPC, ParallelJSONRPCSite
 
 from errors import APIError
 
 class Category(BaseDTO):
+    __compact__ = True
+    __frozen__ = True
+    __intern__ = 4096
+
     market = String()
     category_id = Int()
     is_main_category = Bool()
@@ -23,11 +28,17 @@ app = Flask(__name__)
 app.json_encoder = DTOJsonEncoder
 app.json_decoder = DTOJsonDecoder
 
-jsonrpc = JSONRPC(app, '/api')
+# calls of a batch request run concurrently
+jsonrpc = CachedJSONRPC(app, '/api', site=ParallelJSONRPCSite(max_workers=8))
+
+# record json-rpc traffic for replay, see: loadtest.py
+if os.environ.get('CAPTURE_REQUESTS'):
+    import loadtest
+    loadtest.capture(app, os.environ['CAPTURE_REQUESTS'])
 
 
 
-@jsonrpc.method('get_categories')
+@jsonrpc.method('get_categories', cache=ResponseCache(max_entries=1024, ttl=300))
 @aa_data_api
 def get_categories(id, name):
     category = Category(
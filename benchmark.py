@@ -0,0 +1,364 @@
+"""
+microbenchmarks of the hot paths of core: dto construction and conversion, json
+encoding and decoding, packing of results, argument conversion and field validation,
+each on small, large and deeply nested payloads
+
+    python benchmark.py                        # run and print
+    python benchmark.py -k json                # only cases with `json` in name
+    python benchmark.py --save                 # store result as baseline
+    python benchmark.py --compare              # compare with baseline, exit 1 on regression
+
+a case is timed by several repeats of a number of loops, the best repeat is taken,
+since noise of machine only makes code slower. baselines are machine specific,
+save a new one before comparing on another machine
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import sys
+import time
+
+from core import pingpong, utils
+from core.base import BaseDTO, DTOList, json_default
+from core.entry_point import EntryPoint
+from core.fields import Bool, DateField, Dict, DTOField, Float, Int, List, String
+from core.signature import Signature
+
+from protocols import DTOJsonDecoder, DTOJsonEncoder
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+# slower than baseline by more than this ratio is a regression, below it is mostly noise of a shared machine
+THRESHOLD = 0.25
+# target seconds of one repeat, number of loops is calibrated to it
+REPEAT_TIME = 0.05
+REPEAT = 5
+
+LARGE = 1000
+DEPTH = 8
+
+
+class BenchCategory(BaseDTO):
+    market = String()
+    category_id = Int()
+    is_main_category = Bool()
+    legacy_category_id = Int()
+    unified_categories = List(element_type=Int(), can_be_empty=True)
+    localized_info = Dict(can_be_none=True)
+
+
+class BenchMetric(BaseDTO):
+    date = DateField()
+    downloads = Int()
+    revenue = Float(None, False, None)
+    categories = List(element_type=BenchCategory, can_be_empty=True)
+
+
+def _node_classes(depth):
+    # a field cannot refer to its own dto class, so each level of nesting has its own class
+    classes = []
+    for level in xrange(depth):
+        fields = {'name': String(), 'level': Int(), 'tags': List(element_type=String(), can_be_empty=True)}
+        if classes:
+            fields['child'] = DTOField(dto_class=classes[-1])
+        classes.append(type('BenchNode%d' % level, (BaseDTO,), fields))
+    return classes
+
+
+NODE_CLASSES = _node_classes(DEPTH)
+
+
+class BenchCategoryList(DTOList):
+    __type__ = BenchCategory
+
+
+def category_data(index=0):
+    return dict(market='ios', category_id=100 + index, is_main_category=index % 2 == 0, legacy_category_id=index,
+                unified_categories=[1, 2, 3], localized_info={'name': 'games', 'value': {'z': 2, 'c': [12, 3, 4]}})
+
+
+def make_category(index=0):
+    return BenchCategory(**category_data(index))
+
+
+def make_metric(index=0):
+    return BenchMetric(date=datetime.date(2017, 1, 1) + datetime.timedelta(days=index % 365), downloads=index,
+                       revenue=index * 0.99, categories=[make_category(index), make_category(index + 1)])
+
+
+def make_node(depth=DEPTH):
+    node = None
+    for level, kls in enumerate(NODE_CLASSES[:depth]):
+        child = {} if node is None else {'child': node}
+        node = kls(name='node-%d' % level, level=level, tags=['a', 'b'], **child)
+    return node
+
+
+PAYLOADS = {
+    'small': lambda: make_category(),
+    'large': lambda: [make_metric(i) for i in xrange(LARGE)],
+    'nested': lambda: make_node(),
+}
+
+CASES = []
+
+
+def bench(name):
+    """
+    register a case, the decorated function does the setup and returns the callable to time
+    """
+
+    def decorator(setup):
+        CASES.append((name, setup))
+        return setup
+
+    return decorator
+
+
+def each_payload(name):
+    """
+    register one case for each of small, large and nested payload, setup gets the payload
+    """
+
+    def decorator(setup):
+        for size in sorted(PAYLOADS):
+            CASES.append(('%s[%s]' % (name, size), lambda size=size: setup(PAYLOADS[size]())))
+        return setup
+
+    return decorator
+
+
+@bench('dto.construct[small]')
+def _():
+    data = category_data()
+    return lambda: BenchCategory(**data)
+
+
+@bench('dto.construct[large]')
+def _():
+    rows = [dict(date=datetime.date(2017, 1, 1), downloads=i, revenue=i * 0.99,
+                 categories=[make_category(i), make_category(i + 1)]) for i in xrange(LARGE)]
+    return lambda: [BenchMetric(**row) for row in rows]
+
+
+@bench('dto.construct[nested]')
+def _():
+    return lambda: make_node()
+
+
+@each_payload('dto.to_dict')
+def _(payload):
+    return lambda: pingpong.to_dict(payload)
+
+
+@each_payload('dto.from_dict')
+def _(payload):
+    dikt = pingpong.to_dict(payload)
+    return lambda: pingpong.from_dict(dikt)
+
+
+@bench('dto_list.to_dict[large]')
+def _():
+    dto_list = BenchCategoryList([make_category(i) for i in xrange(LARGE)])
+    return dto_list.to_dict
+
+
+@bench('dto_list.from_dict[large]')
+def _():
+    dikt = BenchCategoryList([make_category(i) for i in xrange(LARGE)]).to_dict()
+    return lambda: BenchCategoryList.from_dict(dikt)
+
+
+@each_payload('json.encode')
+def _(payload):
+    # dates are encoded as on the wire
+    return lambda: json.dumps(payload, cls=DTOJsonEncoder, default=json_default)
+
+
+@each_payload('json.decode')
+def _(payload):
+    data = json.dumps(payload, cls=DTOJsonEncoder, default=json_default)
+    return lambda: json.loads(data, cls=DTOJsonDecoder)
+
+
+@each_payload('utils.json_loads')
+def _(payload):
+    data = utils.json_dumps(pingpong.to_dict(payload))
+    return lambda: utils.json_loads(data)
+
+
+@each_payload('pingpong.pack_result')
+def _(payload):
+    return lambda: pingpong.pack_result(lambda: payload)
+
+
+@each_payload('pingpong.unpack_result')
+def _(payload):
+    response = json.loads(json.dumps(pingpong.pack_result(lambda: payload), default=json_default))
+    return lambda: pingpong.unpack_result(response)
+
+
+def _entry(market, category_id, start_date, limit=10, countries=None):
+    pass
+
+
+@bench('signature.convert_to_dict')
+def _():
+    sig = Signature(_entry, {})
+    return lambda: sig.convert_to_dict(('ios', 100), {'start_date': datetime.date(2017, 1, 1), 'limit': 20})
+
+
+@bench('entry_point.convert_arg_dict[to_string]')
+def _():
+    entry = EntryPoint(_entry, {'market': String(), 'category_id': Int(), 'start_date': DateField(),
+                                'limit': Int()})
+    args = {'market': 'ios', 'category_id': 100, 'start_date': datetime.date(2017, 1, 1), 'limit': 20,
+            'countries': 'US'}
+    return lambda: entry.convert_arg_dict(args)
+
+
+@bench('entry_point.convert_arg_dict[from_string]')
+def _():
+    entry = EntryPoint(_entry, {'market': String(), 'category_id': Int(), 'start_date': DateField(),
+                                'limit': Int()})
+    args = entry.convert_arg_dict({'market': 'ios', 'category_id': 100, 'start_date': datetime.date(2017, 1, 1),
+                                   'limit': 20, 'countries': 'US'})
+    return lambda: entry.convert_arg_dict(args, direction='from_string')
+
+
+@bench('fields.validate[small]')
+def _():
+    fields = [(Int(), 100), (String(max_length=20), 'ios'), (Bool(), True), (DateField(), datetime.date(2017, 1, 1)),
+              (List(element_type=Int()), [1, 2, 3]), (Dict(), {'a': 1})]
+    return lambda: [field(value) for field, value in fields]
+
+
+@bench('fields.validate[large]')
+def _():
+    field = List(element_type=Int())
+    values = range(LARGE * 10)
+    return lambda: field(values)
+
+
+@bench('fields.validate[nested]')
+def _():
+    field = DTOField(dto_class=NODE_CLASSES[-1])
+    node = make_node()
+    return lambda: field(node)
+
+
+@bench('fields.validate_many[large]')
+def _():
+    field = String(max_length=20)
+    values = ['value-%d' % i for i in xrange(LARGE * 10)]
+    return lambda: field.validate_many(values)
+
+
+def measure(func, repeat=REPEAT, repeat_time=REPEAT_TIME):
+    """
+    :return: best seconds per call
+    """
+    number = 1
+    while True:
+        started = time.time()
+        for _ in xrange(number):
+            func()
+        elapsed = time.time() - started
+        if elapsed >= repeat_time / 10 or number >= 1 << 20:
+            break
+        number *= 10
+    number = max(1, int(number * repeat_time / max(elapsed, 1e-9)))
+    best = None
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in xrange(repeat):
+            started = time.time()
+            for _ in xrange(number):
+                func()
+            elapsed = (time.time() - started) / number
+            best = elapsed if best is None else min(best, elapsed)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return best
+
+
+def run(keyword=None, repeat=REPEAT, repeat_time=REPEAT_TIME):
+    """
+    :param keyword: only cases with keyword in name
+    :return: dict of case name => microseconds per call
+    """
+    results = {}
+    for name, setup in CASES:
+        if keyword and keyword not in name:
+            continue
+        results[name] = measure(setup(), repeat, repeat_time) * 1e6
+        print '>>> %-48s %12.2f us' % (name, results[name])
+    return results
+
+
+def save(results, path=BASELINE):
+    with open(path, 'w') as f:
+        results = {name: round(value, 3) for name, value in results.items()}
+        json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'results': results}, f,
+                  indent=2, separators=(',', ': '), sort_keys=True)
+        f.write('\n')
+
+
+def load(path=BASELINE):
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """
+    :return: (report lines, names of regressed cases)
+    """
+    lines = ['%-48s %12s %12s %8s' % ('case', 'baseline us', 'current us', 'change')]
+    regressions = []
+    for name in sorted(results):
+        current = results[name]
+        base = baseline.get(name)
+        if not base:
+            lines.append('%-48s %12s %12.2f %8s' % (name, '-', current, 'new'))
+            continue
+        change = current / base - 1
+        mark = ''
+        if change > threshold:
+            mark = ' REGRESSION'
+            regressions.append(name)
+        elif change < -threshold:
+            mark = ' faster'
+        lines.append('%-48s %12.2f %12.2f %+7.1f%%%s' % (name, base, current, change * 100, mark))
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='microbenchmarks of core')
+    parser.add_argument('-k', dest='keyword', help='only run cases with keyword in name')
+    parser.add_argument('--save', nargs='?', const=BASELINE, help='store results as baseline')
+    parser.add_argument('--compare', nargs='?', const=BASELINE, help='compare results with baseline')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='slower than baseline by more than this ratio fails the comparison')
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--repeat-time', type=float, default=REPEAT_TIME)
+    args = parser.parse_args(argv)
+
+    results = run(args.keyword, args.repeat, args.repeat_time)
+    if args.save:
+        save(results, args.save)
+        print '>>> baseline saved to %s' % args.save
+    if args.compare:
+        lines, regressions = compare(results, load(args.compare), args.threshold)
+        print '\n'.join(lines)
+        if regressions:
+            print '>>> %d case(s) regressed by more than %d%%' % (len(regressions), args.threshold * 100)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
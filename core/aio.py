@@ -0,0 +1,406 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+"""
+minimal event loop on top of asyncore, the select/poll loop of standard library
+
+python 2 has no asyncio, coroutines here are generators in the style of
+`asyncio.coroutine` before `yield from`: a coroutine yields futures (or other
+coroutines) and gets their results back, its result is given by `Return`
+
+    @aio.coroutine
+    def slow_entry(n):
+        yield aio.sleep(1)
+        total = yield aio.run_in_executor(expensive, n)
+        raise aio.Return(total)
+
+everything except `EventLoop.call_soon_threadsafe` must be called in the loop thread
+"""
+import asyncore
+import collections
+import errno
+import heapq
+import select
+import socket
+import sys
+import threading
+import time
+import traceback
+import types
+from multiprocessing.pool import ThreadPool
+
+# default number of threads of executor
+MAX_WORKERS = 16
+
+
+class CancelledError(Exception):
+    pass
+
+
+class Return(Exception):
+    """
+    raised in coroutine to give its result, generator of python 2 cannot return a value
+    """
+
+    def __init__(self, value=None):
+        super(Return, self).__init__(value)
+        self.value = value
+
+
+class Future(object):
+    """
+    result of an operation that completes later, callbacks are called with the future
+    """
+
+    def __init__(self):
+        self._done = False
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+
+    def done(self):
+        return self._done
+
+    def result(self):
+        if not self._done:
+            raise RuntimeError('result is not ready')
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def exception(self):
+        if not self._done:
+            raise RuntimeError('result is not ready')
+        return self._exc_info and self._exc_info[1]
+
+    def set_result(self, result):
+        self._result = result
+        self._finish()
+
+    def set_exception(self, exception, tb=None):
+        self._exc_info = (type(exception), exception, tb)
+        self._finish()
+
+    def set_exc_info(self, exc_info):
+        self._exc_info = exc_info
+        self._finish()
+
+    def cancel(self):
+        if self._done:
+            return False
+        self.set_exception(CancelledError())
+        return True
+
+    def add_done_callback(self, callback):
+        if self._done:
+            callback(self)
+        else:
+            self._callbacks.append(callback)
+
+    def _finish(self):
+        if self._done:
+            raise RuntimeError('result is already set')
+        self._done = True
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+
+def coroutine(func):
+    """
+    mark generator function as coroutine, so that it is driven by event loop instead of
+    being streamed as an iterator (see: pingpong.is_stream)
+    """
+    func._is_coroutine = True
+    return func
+
+
+def is_coroutine_function(func):
+    func = getattr(func, '__func__', func)
+    return getattr(func, '_is_coroutine', False)
+
+
+class Task(Future):
+    """
+    future of a running coroutine, the coroutine is resumed when the future it yields is done
+    """
+
+    def __init__(self, gen, loop):
+        super(Task, self).__init__()
+        self._gen = gen
+        self._loop = loop
+        loop.call_soon(self._step, None, None)
+
+    def _step(self, value, exc_info):
+        try:
+            if exc_info is not None:
+                yielded = self._gen.throw(*exc_info)
+            else:
+                yielded = self._gen.send(value)
+        except (Return, StopIteration), e:
+            self.set_result(getattr(e, 'value', None))
+            return
+        except Exception:
+            self.set_exc_info(sys.exc_info())
+            return
+        if isinstance(yielded, types.GeneratorType):
+            yielded = Task(yielded, self._loop)
+        elif isinstance(yielded, (list, tuple)):
+            yielded = self._loop.gather(*yielded)
+        if not isinstance(yielded, Future):
+            self._loop.call_soon(self._step, None,
+                                 (TypeError, TypeError('coroutine should yield future, not %r' % (yielded,)), None))
+            return
+        yielded.add_done_callback(self._wakeup)
+
+    def _wakeup(self, future):
+        # resume in next round, so that a chain of finished futures does not grow the stack
+        if future._exc_info is not None:
+            self._loop.call_soon(self._step, None, future._exc_info)
+        else:
+            self._loop.call_soon(self._step, future._result, None)
+
+
+class _Waker(asyncore.dispatcher):
+    """
+    one end of a socket pair in the loop, other threads write a byte to wake up poll
+    """
+
+    def __init__(self, loop_map):
+        self._reader, self._writer = socket.socketpair()
+        self._writer.setblocking(False)
+        asyncore.dispatcher.__init__(self, self._reader, map=loop_map)
+
+    def wake(self):
+        try:
+            self._writer.send('x')
+        except socket.error:
+            # buffer is full, loop will wake up anyway
+            pass
+
+    def handle_read(self):
+        try:
+            self.recv(4096)
+        except socket.error:
+            pass
+
+    def writable(self):
+        return False
+
+
+class EventLoop(object):
+    """
+    :param max_workers: number of threads to run blocking functions (see: run_in_executor)
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS):
+        self.map = {}
+        self.max_workers = max_workers
+        self._ready = collections.deque()
+        self._timers = []
+        self._lock = threading.Lock()
+        self._threadsafe = []
+        self._executor = None
+        self._running = False
+        self._waker = _Waker(self.map)
+        # registrations of poll are kept between rounds, see: _poll
+        self._poller = select.poll() if hasattr(select, 'poll') else None
+        self._masks = {}
+        self._dirty = set()
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPool(self.max_workers)
+        return self._executor
+
+    def call_soon(self, callback, *args):
+        self._ready.append((callback, args))
+
+    def call_later(self, delay, callback, *args):
+        heapq.heappush(self._timers, (time.time() + delay, callback, args))
+
+    def call_soon_threadsafe(self, callback, *args):
+        with self._lock:
+            self._threadsafe.append((callback, args))
+        self._waker.wake()
+
+    def sleep(self, seconds, result=None):
+        future = Future()
+        self.call_later(seconds, future.set_result, result)
+        return future
+
+    def run_in_executor(self, func, *args, **kwargs):
+        """
+        run a blocking function in thread of executor
+        :return: future resolved in the loop thread
+        """
+        future = Future()
+
+        def run():
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                self.call_soon_threadsafe(future.set_exc_info, sys.exc_info())
+            else:
+                self.call_soon_threadsafe(future.set_result, result)
+
+        self.executor.apply_async(run)
+        return future
+
+    def spawn(self, gen):
+        """
+        :param gen: generator returned by coroutine
+        :return: Task
+        """
+        return Task(gen, self)
+
+    def gather(self, *futures):
+        """
+        :return: future of list of results in the same order, the first error fails the whole one
+        """
+        futures = [Task(f, self) if isinstance(f, types.GeneratorType) else f for f in futures]
+        gathered = Future()
+        results = [None] * len(futures)
+        pending = [len(futures)]
+
+        def on_done(index, future):
+            if gathered.done():
+                return
+            if future._exc_info is not None:
+                gathered.set_exc_info(future._exc_info)
+                return
+            results[index] = future._result
+            pending[0] -= 1
+            if not pending[0]:
+                gathered.set_result(results)
+
+        if not futures:
+            gathered.set_result(results)
+        for index, future in enumerate(futures):
+            future.add_done_callback(lambda f, i=index: on_done(i, f))
+        return gathered
+
+    def stop(self):
+        self._running = False
+        self._waker.wake()
+
+    def run_forever(self):
+        self._running = True
+        while self._running:
+            self.run_once()
+
+    def run_until_complete(self, future):
+        if isinstance(future, types.GeneratorType):
+            future = Task(future, self)
+        future.add_done_callback(lambda f: self.stop())
+        self.run_forever()
+        return future.result()
+
+    def run_once(self):
+        if self._ready:
+            timeout = 0
+        elif self._timers:
+            timeout = max(0, self._timers[0][0] - time.time())
+        else:
+            timeout = 30.0
+        if self._poller is not None:
+            self._poll(timeout)
+        else:
+            asyncore.poll(timeout, self.map)
+        with self._lock:
+            threadsafe, self._threadsafe = self._threadsafe, []
+        self._ready.extend(threadsafe)
+        now = time.time()
+        while self._timers and self._timers[0][0] <= now:
+            _, callback, args = heapq.heappop(self._timers)
+            self._ready.append((callback, args))
+        # callbacks added while running are called in next round
+        for _ in xrange(len(self._ready)):
+            callback, args = self._ready.popleft()
+            try:
+                callback(*args)
+            except Exception:
+                traceback.print_exc()
+
+    def touch(self, dispatcher):
+        """
+        tell the loop that readable()/writable() of dispatcher may have changed,
+        such as data pushed to it outside its own handlers
+        """
+        self._dirty.add(dispatcher._fileno)
+
+    def _poll(self, timeout):
+        # unlike asyncore.poll2, which registers every channel on every round, only channels
+        # added, removed, having events or touched are checked again, idle ones cost nothing
+        loop_map = self.map
+        masks = self._masks
+        for fd in self._dirty | (loop_map.viewkeys() ^ masks.viewkeys()):
+            obj = loop_map.get(fd)
+            if obj is None:
+                if masks.pop(fd, None) is not None:
+                    try:
+                        self._poller.unregister(fd)
+                    except (KeyError, ValueError):
+                        pass
+                continue
+            mask = 0
+            if obj.readable():
+                mask |= select.POLLIN | select.POLLPRI
+            # accepting sockets are never writable, see: asyncore.poll2
+            if obj.writable() and not obj.accepting:
+                mask |= select.POLLOUT
+            if mask:
+                mask |= select.POLLERR | select.POLLHUP | select.POLLNVAL
+            if masks.get(fd) != mask:
+                self._poller.register(fd, mask)
+                masks[fd] = mask
+        self._dirty = set()
+        try:
+            events = self._poller.poll(timeout * 1000)
+        except select.error, error:
+            if error.args[0] != errno.EINTR:
+                raise
+            return
+        for fd, event in events:
+            obj = loop_map.get(fd)
+            if obj is None:
+                continue
+            self._dirty.add(fd)
+            asyncore.readwrite(obj, event)
+
+    def close(self):
+        self._running = False
+        for dispatcher in self.map.values():
+            dispatcher.close()
+        if self._executor is not None:
+            self._executor.terminate()
+            self._executor = None
+
+
+_default_loop = None
+
+
+def get_event_loop():
+    """
+    :return: default event loop of process
+    """
+    global _default_loop
+    if _default_loop is None:
+        _default_loop = EventLoop()
+    return _default_loop
+
+
+def set_event_loop(loop):
+    global _default_loop
+    _default_loop = loop
+
+
+def sleep(seconds, result=None):
+    return get_event_loop().sleep(seconds, result)
+
+
+def run_in_executor(func, *args, **kwargs):
+    return get_event_loop().run_in_executor(func, *args, **kwargs)
+
+
+def gather(*futures):
+    return get_event_loop().gather(*futures)
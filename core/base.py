@@ -1,5 +1,10 @@
 # Copyright (c) 2017 App Annie Inc. All rights reserved.
-from fields import BaseField
+import json
+
+import codegen
+import columnar
+import utils
+from fields import BaseField, ContainerField
 
 class Serializable(object):
     """
@@ -18,6 +23,21 @@ class Serializable(object):
 
 
 class FieldRegisterMeta(type):
+    """
+    collect fields of dto class
+
+    set `__compact__ = True` in dto class to store values in __slots__ instead of
+    per instance `_data` dict, the __init__ of compact dto is generated from
+    declared fields (see: core.codegen), it saves memory and construction time
+
+    set `__frozen__ = True` in dto class to reject attribute setting after construction,
+    its hash, dict and json are computed once and cached, the dict is read-only, list and
+    dict values are copied to read-only ones when the dto is built
+
+    set `__intern__ = <size>` in frozen dto class to share one instance for same field
+    values, constructor, from_dict, from_dicts and lazy_from_dict look up a bounded table
+    of the class first (see: InternedMeta)
+    """
     ALL_DTO_CLASS = {}
 
     def __new__(mcs, name, bases, dct):
@@ -37,31 +57,252 @@ class FieldRegisterMeta(type):
                     _field_dict[value.name] = value
                 else:
                     raise TypeError('Duplicate define of dto field %s' % value.name)
+        _field_list = tuple(sorted(_fields, key=lambda f: f.creation_order))
         dct['_field_keys'] = _field_keys
         dct['_fields'] = _fields
         dct['_field_dict'] = _field_dict
+        dct['_field_list'] = _field_list
+        dct['_field_names'] = tuple(field.name for field in _field_list)
+        dct['_container_names'] = tuple(field.name for field in _field_list if isinstance(field, ContainerField))
+        compact = dct.get('__compact__', False)
+        if compact:
+            mcs.prepare_compact(name, dct, _field_list)
+        if dct.get('__frozen__', False):
+            mcs.prepare_frozen(dct, compact)
+        if dct.get('__intern__') and not issubclass(mcs, InternedMeta):
+            mcs = InternedMeta
         kls = super(FieldRegisterMeta, mcs).__new__(mcs, name, bases, dct)
         for field in _fields:
             field.bind(kls)
+        if compact:
+            freeze = _read_only if kls.__frozen__ else None
+            kls.__init__ = codegen.build_slot_init(kls, _field_list, freeze)
+            kls._from_valid_row = classmethod(codegen.build_slot_from_row(kls, _field_list, freeze))
+        kls._dump_fields = codegen.build_dump(kls, _field_list, compact)
+        kls._load_fields = classmethod(codegen.build_load(kls, _field_list))
+        if kls.__intern__:
+            if not kls.__frozen__:
+                raise TypeError('dto %s should be frozen to be interned' % name)
+            kls._intern_table = utils.GenerationCache(kls.__intern__)
         if name != 'BaseDTO':
             # if change this name with class BaseDTO simultaneous
             FieldRegisterMeta.ALL_DTO_CLASS[name] = kls
         return kls
 
+    @staticmethod
+    def prepare_compact(name, dct, field_list):
+        if '__init__' in dct:
+            raise TypeError('compact dto %s cannot define __init__' % name)
+        codegen.check_slot_names(name, field_list)
+        dct['__slots__'] = dct['_field_names'] + ('_raw',)
+        dct['__setattr__'] = _compact_setattr
+        dct['__getattr__'] = _compact_getattr
+        dct['_store_value'] = _compact_store_value
+        dct['_data'] = property(_compact_data)
+
+
+    @staticmethod
+    def prepare_frozen(dct, compact):
+        if compact:
+            dct['__slots__'] += FROZEN_CACHES
+        else:
+            dct.setdefault('__init__', _frozen_init)
+        dct['__setattr__'] = _frozen_setattr
+        dct['__hash__'] = _frozen_hash
+        dct['__eq__'] = _frozen_eq
+        dct['__ne__'] = _frozen_ne
+        dct.setdefault('to_dict', _frozen_to_dict)
+        dct.setdefault('to_json', _frozen_to_json)
+
+
+class InternedMeta(FieldRegisterMeta):
+    """
+    constructor of interned dto returns the canonical instance for same field values
+    """
+
+    def __call__(cls, *args, **kwargs):
+        if args and cls.__compact__:
+            # positional args of compact dto are fields in declared order
+            kwargs.update(zip(cls._field_names, args))
+            args = ()
+        try:
+            key = _intern_key([args, [kwargs.get(name) for name in cls._field_names]])
+            dto = cls._intern_table.get(key)
+        except TypeError:
+            # not json serializable value, no interning
+            return super(InternedMeta, cls).__call__(*args, **kwargs)
+        if dto is None:
+            dto = super(InternedMeta, cls).__call__(*args, **kwargs)
+            cls._intern_table.set(key, dto)
+        return dto
+
+
+def _compact_setattr(self, key, value):
+    field = self._field_dict.get(key)
+    if field is not None:
+        value = field(value)
+    object.__setattr__(self, key, value)
+
+
+def _compact_getattr(self, item):
+    # only reached when slot is not set, that's a field of lazy dto not accessed yet
+    if item in self._field_keys and self._raw is not None:
+        return self._load_raw_value(item)
+    raise AttributeError(item)
+
+
+def _compact_store_value(self, key, value):
+    object.__setattr__(self, key, value)
+
+
+def _compact_data(self):
+    """
+    compact dto has no `_data` dict, build a fresh one from slots
+    """
+    return {field.name: getattr(self, field.name) for field in self._field_list}
+
+
+# attributes to cache results of frozen dto
+FROZEN_CACHES = ('_hash_value', '_dict_value', '_json_value')
+
+
+def _frozen_init(self, **data):
+    BaseDTO.__init__(self, **data)
+    _data = self._data
+    for name in self._container_names:
+        _data[name] = _read_only(_data[name])
+
+
+def _frozen_setattr(self, key, value):
+    raise TypeError('%s is frozen, cannot set %s' % (self.__class__.__name__, key))
+
+
+def _frozen_cached(self, attr, build):
+    value = getattr(self, attr, None)
+    if value is None:
+        value = build()
+        object.__setattr__(self, attr, value)
+    return value
+
+
+def _frozen_to_dict(self):
+    """
+    cached dict, shared by hash & eq, it is read-only, `copy.deepcopy` gives a plain one to change
+    """
+    return _frozen_cached(self, '_dict_value', lambda: _read_only(BaseDTO.to_dict(self)))
+
+
+def _frozen_to_json(self):
+    return _frozen_cached(self, '_json_value', lambda: BaseDTO.to_json(self))
+
+
+def _frozen_hash(self):
+    return _frozen_cached(self, '_hash_value', lambda: hash(_hashable(_frozen_to_dict(self))))
+
+
+def _frozen_eq(self, other):
+    return type(self) is type(other) and _frozen_to_dict(self) == _frozen_to_dict(other)
+
+
+def _frozen_ne(self, other):
+    return not _frozen_eq(self, other)
+
+
+def _reject_change(self, *args, **kwargs):
+    raise TypeError('dict of frozen dto is read-only')
+
+
+class _ReadOnlyDict(dict):
+    """
+    dict of frozen dto, copied and pickled as plain dict
+    """
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _reject_change
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+class _ReadOnlyList(list):
+    __setitem__ = __delitem__ = __setslice__ = __delslice__ = __iadd__ = __imul__ = _reject_change
+    append = extend = insert = pop = remove = reverse = sort = _reject_change
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+def _read_only(value):
+    """
+    :return: read-only version of dumped dict, dicts of nested frozen dto are shared as they are
+    """
+    if isinstance(value, (_ReadOnlyDict, _ReadOnlyList)):
+        return value
+    elif isinstance(value, dict):
+        return _ReadOnlyDict((k, _read_only(v)) for k, v in value.iteritems())
+    elif isinstance(value, list):
+        return _ReadOnlyList(_read_only(v) for v in value)
+    return value
+
+
+def _hashable(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _hashable(v)) for k, v in value.items()))
+    elif isinstance(value, (list, tuple)):
+        return tuple(_hashable(v) for v in value)
+    elif isinstance(value, set):
+        return frozenset(_hashable(v) for v in value)
+    return value
+
+
+def _intern_key(values):
+    """
+    json of values, key of intern table
+    keys are not sorted to keep the C encoder, equal dicts in different order only cause a miss
+    """
+    return _INTERN_KEY_ENCODER.encode(values)
+
+
+def json_default(o):
+    """
+    `default` of json encoder, convert dto and Serializable to dict, date and datetime to string
+    """
+    if isinstance(o, BaseDTO):
+        return o.to_dict()
+    elif isinstance(o, Serializable):
+        return o.to_dto().to_dict()
+    value = utils.datetime_to_json(o)
+    if value is None:
+        raise TypeError(repr(o) + ' is not JSON serializable')
+    return value
+
+
+_INTERN_KEY_ENCODER = json.JSONEncoder(separators=(',', ':'), default=json_default)
+
 
 class BaseDTO(object):
     __metaclass__ = FieldRegisterMeta
+    # empty slots, so that compact subclass will not get a __dict__
+    __slots__ = ()
 
     _field_keys = set()
     _fields = set()
     _field_dict = {}
+    _field_list = ()
+    _field_names = ()
+    _container_names = ()
+    # raw dict of lazy dto, fields not accessed yet are validated from it
+    _raw = None
+    # see: FieldRegisterMeta
+    __compact__ = False
+    __frozen__ = False
+    __intern__ = 0
+    _intern_table = None
 
     def __init__(self, **data):
         _data = {}
         for field in self._fields:
             key = field.name
             _data[key] = field(data.get(key))
-        self._data = _data
+        object.__setattr__(self, '_data', _data)
 
     def repr(self):
         return '\n'.join(['\t%s=%r' % (key, value) for key, value in self._data.items()])
@@ -70,15 +311,193 @@ class BaseDTO(object):
         return '<(DTO)%s \n%s\t>' % (self.__class__.__name__, self.repr())
 
     def to_dict(self):
-        self._data['__cls__'] = self.__class__.__name__
+        if self._raw is not None:
+            self.validate()
         return self._to_dict()
 
+    def to_json(self):
+        """
+        :return: compact json str of to_dict
+        """
+        return json.dumps(self.to_dict(), default=json_default, separators=(',', ':'))
+
     def _to_dict(self):
-        return self._data
+        # _dump_fields & _load_fields are generated for each dto class by FieldRegisterMeta
+        return self._dump_fields()
 
     @classmethod
     def from_dict(cls, dikt):
-        return cls(**dikt)
+        return cls(**cls._load_fields(dikt))
+
+    @classmethod
+    def lazy_from_dict(cls, dikt):
+        """
+        wrap a decoded dict without validation, each field is validated and converted
+        on first access, nested dto are restored lazily too, the dict is kept by dto as it is
+        and should not be changed after
+        call `validate()` to check all fields at once
+        interned dto is built at once, it is looked up by values of all fields (see: InternedMeta)
+        :param dikt: dict
+        :return: dto
+        """
+        if cls.__intern__:
+            return cls.from_dict(dikt)
+        dto = cls.__new__(cls)
+        if not cls._is_compact():
+            object.__setattr__(dto, '_data', {})
+        object.__setattr__(dto, '_raw', dikt)
+        return dto
+
+    @classmethod
+    def validate_many(cls, dikts):
+        """
+        validate a batch of raw dicts column by column, all values of one field are
+        checked in a single pass, errors are collected per row instead of raised
+        :param dikts: list of dict
+        :return: (kwargs_list, errors), kwargs of invalid row is None, errors is dict of
+            row index => list of error message
+        """
+        rows, errors = cls._validate_columns(dikts)
+        names = cls._field_names
+        return [None if index in errors else dict(zip(names, row)) for index, row in enumerate(rows)], errors
+
+    @classmethod
+    def _validate_columns(cls, dikts):
+        """
+        :return: (rows, errors), rows are tuples of validated values in declared field order
+        """
+        errors = {}
+        rows = []
+        for index, dikt in enumerate(dikts):
+            if not isinstance(dikt, dict):
+                errors[index] = ['%s row should be dict, but get %r' % (cls.__name__, dikt)]
+                dikt = {}
+            rows.append(dikt)
+        # fields of row which is not a dict are not checked, one error is enough
+        not_dict = set(errors)
+        columns = []
+        for field in cls._field_list:
+            name = field.name
+            values = [row.get(name) for row in rows]
+            failed = set(not_dict)
+            if field.json_conversion:
+                for index, value in enumerate(values):
+                    if index in failed:
+                        continue
+                    try:
+                        values[index] = field.from_json(value)
+                    except (TypeError, ValueError), error:
+                        failed.add(index)
+                        errors.setdefault(index, []).append(str(error))
+            dto_class, many, _ = codegen.nested_dto(field)
+            if dto_class is not None:
+                values = cls._nested_from_dicts(field, dto_class, many, values, errors, failed)
+            values, field_errors = field.validate_many(values)
+            for index, message in field_errors.items():
+                if index not in failed:
+                    errors.setdefault(index, []).append(message)
+            columns.append(values)
+        if not columns:
+            return [()] * len(rows), errors
+        return zip(*columns), errors
+
+    @classmethod
+    def _nested_from_dicts(cls, field, dto_class, many, values, errors, failed):
+        """
+        convert dict values of nested dto field by one bulk call of the nested class
+        """
+        if many:
+            positions = [(index, pos) for index, value in enumerate(values) if value is not None
+                         for pos, elem in enumerate(value) if isinstance(elem, dict)]
+            dikts = [values[index][pos] for index, pos in positions]
+        else:
+            positions = [(index, None) for index, value in enumerate(values) if isinstance(value, dict)]
+            dikts = [values[index] for index, _ in positions]
+        if not dikts:
+            return values
+        dtos, sub_errors = dto_class.from_dicts(dikts)
+        values = [list(value) if many and value is not None else value for value in values]
+        for sub_index, ((index, pos), dto) in enumerate(zip(positions, dtos)):
+            if sub_index in sub_errors:
+                failed.add(index)
+                errors.setdefault(index, []).extend(['%s: %s' % (field, message) for message in sub_errors[sub_index]])
+            elif many:
+                values[index][pos] = dto
+            else:
+                values[index] = dto
+        return values
+
+    @classmethod
+    def from_dicts(cls, dikts):
+        """
+        bulk version of from_dict, see validate_many
+        :param dikts: list of dict
+        :return: (dtos, errors), dto of invalid row is None
+        """
+        rows, errors = cls._validate_columns(dikts)
+        from_row = cls._from_valid_row
+        if cls.__intern__:
+            # through the constructor, which looks up intern table
+            names = cls._field_names
+            from_row = lambda row: cls(**dict(zip(names, row)))
+        return [None if index in errors else from_row(row) for index, row in enumerate(rows)], errors
+
+    @classmethod
+    def _from_valid_row(cls, row):
+        """
+        build dto from validated values without validate again, generated for compact dto
+        :param row: tuple of values in declared field order
+        """
+        if cls.__init__.im_func is not BaseDTO.__init__.im_func:
+            return cls(**dict(zip(cls._field_names, row)))
+        dto = cls.__new__(cls)
+        object.__setattr__(dto, '_data', dict(zip(cls._field_names, row)))
+        return dto
+
+    @classmethod
+    def _is_compact(cls):
+        return '_raw' in getattr(cls, '__slots__', ())
+
+    def validate(self):
+        """
+        validate all fields of lazy dto which are not accessed yet, include nested dto
+        :return: self
+        """
+        raw = self._raw
+        if raw is None:
+            return self
+        for field in self._field_list:
+            value = getattr(self, field.name)
+            if value is None:
+                continue
+            dto_class, many, _ = codegen.nested_dto(field)
+            if dto_class is None:
+                continue
+            for dto in (value if many else [value]):
+                if dto is not None:
+                    dto.validate()
+        object.__setattr__(self, '_raw', None)
+        return self
+
+    def _load_raw_value(self, key):
+        field = self._field_dict[key]
+        value = self._raw.get(key)
+        if field.json_conversion:
+            value = field.from_json(value)
+        dto_class, many, _ = codegen.nested_dto(field)
+        if dto_class is not None and value is not None:
+            if many:
+                value = [dto_class.lazy_from_dict(e) if isinstance(e, dict) else e for e in value]
+            elif isinstance(value, dict):
+                value = dto_class.lazy_from_dict(value)
+        value = field(value)
+        if self.__frozen__ and key in self._container_names:
+            value = _read_only(value)
+        self._store_value(key, value)
+        return value
+
+    def _store_value(self, key, value):
+        self._data[key] = value
 
     def _set_field_value(self, field_key, value):
         field = self._get_field(field_key)
@@ -92,7 +511,12 @@ class BaseDTO(object):
 
     def __getattr__(self, item):
         if item in self._field_keys:
-            return self._data[item]
+            try:
+                return self._data[item]
+            except KeyError:
+                if self._raw is None:
+                    raise
+                return self._load_raw_value(item)
         return self.__getattribute__(item)
 
     def _get_field(self, key):
@@ -105,14 +529,21 @@ class BaseDTO(object):
 
 class DTOList(BaseDTO):
     __type__ = None
+    # set True to store and transport elements by columns (see: core.columnar)
+    __columnar__ = False
 
     def __init__(self, data_list, **kwargs):
         super(DTOList, self).__init__(**kwargs)
-        li = []
-        for dct in data_list:
-            if not isinstance(dct, self.__type__):
-                dct = self.__type__.from_dict(dct)
-            li.append(dct)
+        if isinstance(data_list, columnar.ColumnList):
+            li = data_list
+        elif self.__columnar__:
+            li = columnar.ColumnList.from_rows(self.__type__, data_list)
+        else:
+            li = []
+            for dct in data_list:
+                if not isinstance(dct, self.__type__):
+                    dct = self.__type__.from_dict(dct)
+                li.append(dct)
         self._data['__list__'] = li
 
     @property
@@ -120,11 +551,38 @@ class DTOList(BaseDTO):
         return self._data['__list__']
 
     def _to_dict(self):
-        rdi = {}
-        rdi.update(self._data)
-        rdi['__list__'] = [i.to_dict() for i in self._data['__list__']]
+        rdi = self._dump_fields()
+        li = self._data['__list__']
+        if isinstance(li, columnar.ColumnList):
+            rdi['__columns__'] = li.to_columns()
+            rdi['__size__'] = len(li)
+        else:
+            rdi['__list__'] = [i.to_dict() for i in li]
         return rdi
 
+    @classmethod
+    def from_dict(cls, dikt):
+        columns = dikt.get('__columns__')
+        if columns is not None:
+            data_list = columnar.ColumnList.from_columns(cls.__type__, columns, dikt.get('__size__', 0))
+        else:
+            data_list = dikt.get('__list__') or []
+        return cls(data_list, **cls._load_fields(dikt))
+
+    @classmethod
+    def lazy_from_dict(cls, dikt):
+        """
+        fields of list are validated at once, elements are restored lazily
+        """
+        if dikt.get('__columns__') is not None:
+            return cls.from_dict(dikt)
+        data_list = [cls.__type__.lazy_from_dict(e) if isinstance(e, dict) else e
+                     for e in dikt.get('__list__') or []]
+        return cls(data_list, **cls._load_fields(dikt))
+
+    def __len__(self):
+        return len(self.__list__)
+
     def __iter__(self):
         for i in self.__list__:
             yield i
@@ -148,8 +606,7 @@ class DTODict(BaseDTO):
         self._data['__dict__'] = di
 
     def _to_dict(self):
-        rdi = {}
-        rdi.update(self._data)
+        rdi = self._dump_fields()
         rdi['__dict__'] = {k: v.to_dict() for k, v in self._data['__dict__'].items()}
         return rdi
 
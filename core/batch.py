@@ -0,0 +1,214 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+"""
+client side batching of remote calls
+
+remote calls made inside a batch return futures at once, they are sent together
+as one request to the batch entry of server when the batch exits, or when the
+result of any of them is read
+
+    with Batch():
+        futures = [get_app_info(app_id) for app_id in app_ids]
+    apps = [future.result() for future in futures]
+
+each call is packed apart on server (see: pingpong.pack_result), the error of one
+call is raised by its own future and the others are not affected
+
+the batch entry is registered with the others by `WebServiceCenter.bind_web_interface`
+"""
+import threading
+
+import requests
+
+import aio
+import codec
+import deadline
+import pingpong
+from http_code import BAD_REQUEST, NOT_FOUND
+
+BATCH_KEY = '_batch'
+BATCH_PATH = '/invoke/%s' % BATCH_KEY
+# max calls sent in one request, more are split into several
+MAX_SIZE = 100
+
+
+class UnknownEntryError(Exception):
+    code = NOT_FOUND
+
+
+class BadCallError(Exception):
+    code = BAD_REQUEST
+
+
+class BatchError(Exception):
+    pass
+
+
+def dispatcher(entries):
+    """
+    :param entries: dict of key => EntryPoint, looked up on each call, so later entries are found too
+    :return: function of batch entry, returns response dict of each call in the same order
+    """
+
+    def find(call):
+        """
+        :return: entry of call, None if call is malformed or entry is unknown
+        """
+        if not isinstance(call, dict) or not isinstance(call.get('key'), basestring):
+            return None
+        entry = entries.get(call['key'])
+        return None if entry is None or entry.client_mode else entry
+
+    def call_one(call, entry):
+        # malformed call only fails itself, like errors of entry
+        if not isinstance(call, dict):
+            raise BadCallError('call should be an object of key and args')
+        if entry is None:
+            raise UnknownEntryError('no entry %s' % call.get('key'))
+        if aio.is_coroutine_function(entry.original_callable):
+            raise TypeError('coroutine entry %s cannot be called in batch' % entry.key)
+        args = call.get('args') or {}
+        if not isinstance(args, dict):
+            raise BadCallError('args of call %s should be an object' % entry.key)
+        result = entry.call_from_request(**args)
+        # items of generator entry are sent as a list
+        return list(result) if pingpong.is_stream(result) else result
+
+    def dispatch_batch(calls):
+        responses = []
+        for call in calls:
+            entry = find(call)
+            plain = entry is not None and entry.retype_is_string
+            responses.append(pingpong.pack_result(callback=lambda: call_one(call, entry), plain=plain))
+        return responses
+
+    return dispatch_batch
+
+
+class BatchFuture(aio.Future):
+    """
+    result of a call in batch, reading it before the batch is sent sends the batch at once
+    """
+
+    def __init__(self, batch):
+        super(BatchFuture, self).__init__()
+        self._batch = batch
+
+    def result(self):
+        if not self.done():
+            self._batch.flush()
+        return super(BatchFuture, self).result()
+
+    def exception(self):
+        if not self.done():
+            self._batch.flush()
+        return super(BatchFuture, self).exception()
+
+
+_local = threading.local()
+
+
+def current():
+    """
+    :return: innermost batch of current thread, None if not in a batch
+    """
+    stack = getattr(_local, 'stack', None)
+    return stack[-1] if stack else None
+
+
+class Batch(object):
+    """
+    collect remote calls of current thread (see: EntryPoint.call_remote)
+
+    :param max_size: max calls in one request
+    """
+
+    def __init__(self, max_size=MAX_SIZE):
+        self.max_size = max_size
+        self.pending = []
+        self.requests = 0
+
+    def __enter__(self):
+        if getattr(_local, 'stack', None) is None:
+            _local.stack = []
+        _local.stack.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        _local.stack.remove(self)
+        if exc_type is None:
+            self.flush()
+        else:
+            self.cancel()
+
+    def add(self, entry, arg_dict):
+        """
+        :param arg_dict: args converted by entry, path args included
+        :return: BatchFuture
+        """
+        future = BatchFuture(self)
+        self.pending.append((entry, arg_dict, future))
+        return future
+
+    def cancel(self):
+        pending, self.pending = self.pending, []
+        for _, _, future in pending:
+            future.cancel()
+
+    def flush(self):
+        """
+        send pending calls, calls to the same host go in one request
+        """
+        pending, self.pending = self.pending, []
+        groups = {}
+        for call in pending:
+            entry = call[0]
+            groups.setdefault((entry.host, entry.client), []).append(call)
+        for (host, client), calls in groups.items():
+            for start in xrange(0, len(calls), self.max_size):
+                self.send(host, client, calls[start:start + self.max_size])
+
+    def send(self, host, client, calls):
+        try:
+            responses = self.request(host, client, calls)
+            if len(responses) != len(calls):
+                raise BatchError('batch of %d calls gets %d responses' % (len(calls), len(responses)))
+        except Exception, error:
+            for _, _, future in calls:
+                future.set_exception(error)
+            return
+        for (entry, _, future), response in zip(calls, responses):
+            try:
+                future.set_result(pingpong.unpack_result(response, dto_type=entry.retype, lazy=entry.lazy_decode))
+            except Exception, error:
+                future.set_exception(error)
+
+    def request(self, host, client, calls):
+        """
+        :return: response dict of each call
+        """
+        wire = calls[0][0].wire_codec
+        body = {'calls': [{'key': entry.key, 'args': arg_dict} for entry, arg_dict, _ in calls]}
+        headers = {'Accept': wire.content_type, 'Content-Type': wire.content_type}
+        options = {}
+        # calls in batch share the deadline of thread which sends it (see: core.deadline)
+        at = deadline.current()
+        left = deadline.remaining(at)
+        if left is not None:
+            deadline.check(at)
+            headers[deadline.HEADER] = deadline.to_header(left)
+            options['timeout'] = deadline.shorten(getattr(client, 'timeout', None), left)
+        print '>>> Call Remote Batch :', len(calls), host + BATCH_PATH
+        self.requests += 1
+        try:
+            response = client.post(host + BATCH_PATH, data=wire.encode(body), headers=headers, **options)
+        except requests.Timeout:
+            # timeout caused by deadline is raised as DeadlineExceeded (see: EntryPoint.send_request)
+            if at is not None and deadline.remaining(at) <= 0:
+                raise deadline.DeadlineExceeded('no response from %s before deadline' % host)
+            raise
+        content_type = response.headers.get('Content-Type', '')
+        try:
+            data = (codec.find(content_type) or codec.JSON_CODEC).decode(response.content)
+        except (ValueError, codec.CodecError):
+            raise BatchError('Not Json Data: %s' % response.content)
+        return pingpong.unpack_result(data)
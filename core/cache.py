@@ -0,0 +1,195 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+"""
+cache of encoded responses for idempotent entries
+
+    @expose(options=EntryOptions(cache=ResponseCache(max_entries=512, ttl=300)))
+    def get_categories(market):
+        ...
+
+the cache is checked before the handler is called, a hit sends the stored bytes
+as they are, only successful responses are stored
+
+identical calls in flight at the same time could share one execution (see: SingleFlight)
+"""
+import collections
+import json
+import sys
+import threading
+import time
+
+from base import json_default
+
+_KEY_ENCODER = json.JSONEncoder(sort_keys=True, separators=(',', ':'), default=json_default)
+
+
+def canonical_key(*parts):
+    """
+    :param parts: json encodable values, dict keys are sorted, so same params give same key
+    :return: str
+    """
+    return _KEY_ENCODER.encode(parts)
+
+
+class ResponseCache(object):
+    """
+    thread safe LRU cache with expiration and byte budget, the least recently used entries are
+    evicted when it holds more than `max_entries` entries or `max_bytes` bytes
+
+    :param max_entries: max number of entries
+    :param max_bytes: max total size of values, value larger than it is never stored
+    :param ttl: seconds an entry lives, None for never
+    :param clock: function returns current time in seconds
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=60, clock=time.time):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """
+        :return: value, None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            expire_at, value, size = entry
+            if expire_at is not None and expire_at <= self.clock():
+                self.bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            # move to the most recently used end
+            self._entries[key] = entry
+            self.hits += 1
+            return value
+
+    def set(self, key, value, size=None):
+        """
+        :param value: anything, usually encoded bytes with content type
+        :param size: bytes of value, len(value) by default
+        """
+        if size is None:
+            size = len(value)
+        if size > self.max_bytes:
+            return
+        expire_at = None if self.ttl is None else self.clock() + self.ttl
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            self._entries[key] = (expire_at, value, size)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, key=None):
+        """
+        :param key: drop the entry of key, or everything if it is None
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self.bytes = 0
+            else:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self.bytes -= entry[2]
+
+    def invalidate_if(self, predicate):
+        """
+        :param predicate: called with each key, entries of keys it returns True are dropped
+        """
+        with self._lock:
+            for key in [k for k in self._entries if predicate(k)]:
+                self.bytes -= self._entries.pop(key)[2]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {'size': len(self), 'bytes': self.bytes, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'expirations': self.expirations}
+
+
+class _Flight(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exc_info = None
+
+
+class SingleFlight(object):
+    """
+    concurrent calls with the same key share one execution, all of them get the same
+    result or error, nothing is kept after the execution finishes
+
+        flight = SingleFlight()
+        flight.do(canonical_key(params), lambda: load(**params))
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.shared = 0
+
+    def do(self, key, func):
+        """
+        call func, or wait for the running call of same key in another thread
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.executions += 1
+            else:
+                self.shared += 1
+        if leader:
+            try:
+                flight.result = func()
+            except BaseException:
+                # interrupt or exit of leader is raised in waiters too, they should not take None as result
+                flight.exc_info = sys.exc_info()
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+        else:
+            flight.done.wait()
+        if flight.exc_info is not None:
+            raise flight.exc_info[0], flight.exc_info[1], flight.exc_info[2]
+        return flight.result
+
+    def share(self, key, factory):
+        """
+        future version of `do` for event loop (see: core.aio), only call it in the loop thread
+        :param factory: returns future of the execution
+        :return: running future of same key, or a new one from factory
+        """
+        future = self._futures.get(key)
+        if future is not None:
+            self.shared += 1
+            return future
+        future = self._futures[key] = factory()
+        self.executions += 1
+        future.add_done_callback(lambda _: self._futures.pop(key, None))
+        return future
+
+    def stats(self):
+        return {'executions': self.executions, 'shared': self.shared,
+                'in_flight': len(self._flights) + len(self._futures)}
@@ -0,0 +1,433 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+"""
+wire codecs between EntryPoint (client) and WebInterface (server)
+
+the codec of a response is negotiated by `Accept` of request, the codec of a
+POST body is told by its `Content-Type`, json is used when nothing matches
+
+binary format, a header then one tagged value:
+
+    header      'AAB' + version byte
+    N T F       None, True, False
+    i q d       int32, int64, float64 (big endian)
+    L           long out of int64, length-prefixed decimal string
+    s u         str, unicode (utf-8), length-prefixed
+    l m         list, dict: count, then items / key value pairs
+    D t         date as ordinal int32, datetime as length-prefixed iso string
+    C           class definition: id, name, field names, the id is used by `O` later
+    O           dto: class id, then values of fields in declared order
+
+dto with its own storage (DTOList, DTODict) is sent as a `m` of its `to_dict()`,
+a dict with `__cls__` is restored by `from_dict` of the dto class
+"""
+import datetime
+import json
+import struct
+
+import encoder
+import tz
+import utils
+from base import BaseDTO, Serializable
+
+JSON = 'application/json'
+BINARY = 'application/x-aa-binary'
+
+MAGIC = 'AAB'
+VERSION = 1
+HEADER = MAGIC + chr(VERSION)
+
+INT32 = struct.Struct('>i')
+INT64 = struct.Struct('>q')
+UINT16 = struct.Struct('>H')
+UINT32 = struct.Struct('>I')
+DOUBLE = struct.Struct('>d')
+
+INT32_MIN, INT32_MAX = -2 ** 31, 2 ** 31 - 1
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+class CodecError(TypeError):
+    pass
+
+
+class Codec(object):
+    """
+    abstract codec, concrete one is registered by `register`
+    """
+    content_type = None
+
+    def encode(self, o):
+        """
+        :param o: plain data, dto or Serializable
+        :return: str
+        """
+        raise NotImplementedError
+
+    def iter_encode(self, o):
+        """
+        :return: iterable of str chunks, used as body of streaming response
+        """
+        return [self.encode(o)]
+
+    def decode(self, data, typed=False):
+        """
+        :param data: str
+        :param typed: type of payload is known, dates are restored by dto fields
+        :return: plain data, dto restored if codec carries them
+        """
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    content_type = JSON
+
+    def encode(self, o):
+        return encoder.encode(o)
+
+    def iter_encode(self, o):
+        # dto are encoded directly and streamed by chunks (see: core.encoder)
+        return encoder.iter_chunks(o)
+
+    def decode(self, data, typed=False):
+        if typed:
+            return json.loads(data)
+        return utils.json_loads(data)
+
+
+def _has_own_storage(kls):
+    return kls._to_dict.im_func is not BaseDTO._to_dict.im_func
+
+
+class _Writer(object):
+    """
+    state of one encoding, class ids are only valid inside one payload
+    """
+
+    def __init__(self):
+        self.out = []
+        self.class_ids = {}
+
+    def write(self, o):
+        # most common types go first, everything else is dispatched by type
+        t = type(o)
+        if t is str:
+            self.out.append('s' + UINT32.pack(len(o)) + o)
+        elif t is unicode:
+            o = o.encode('utf-8')
+            self.out.append('u' + UINT32.pack(len(o)) + o)
+        elif t is int and INT32_MIN <= o <= INT32_MAX:
+            self.out.append('i' + INT32.pack(o))
+        elif o is None:
+            self.out.append('N')
+        else:
+            writer = _WRITERS.get(t)
+            if writer is None:
+                writer = _find_writer(o)
+            writer(self, o)
+
+    def write_bool(self, o):
+        self.out.append('T' if o else 'F')
+
+    def write_int(self, o):
+        if INT32_MIN <= o <= INT32_MAX:
+            self.out.append('i' + INT32.pack(o))
+        elif INT64_MIN <= o <= INT64_MAX:
+            self.out.append('q' + INT64.pack(o))
+        else:
+            o = str(o)
+            self.out.append('L' + UINT32.pack(len(o)) + o)
+
+    def write_float(self, o):
+        self.out.append('d' + DOUBLE.pack(o))
+
+    def write_str(self, o):
+        self.out.append('s' + UINT32.pack(len(o)) + o)
+
+    def write_unicode(self, o):
+        o = o.encode('utf-8')
+        self.out.append('u' + UINT32.pack(len(o)) + o)
+
+    def write_list(self, o):
+        self.out.append('l' + UINT32.pack(len(o)))
+        write = self.write
+        for item in o:
+            write(item)
+
+    def write_dict(self, o):
+        __cls__ = o.get('__cls__')
+        if __cls__ is not None:
+            # dumped dto, such as elements of DTOList, is written as a row of its class
+            kls = BaseDTO.find(__cls__)
+            if (kls is not None and not _has_own_storage(kls) and len(o) == len(kls._field_names) + 1 and
+                    all(name in o for name in kls._field_names)):
+                return self.write_row(kls, [o[name] for name in kls._field_names])
+        self.out.append('m' + UINT32.pack(len(o)))
+        write = self.write
+        for key, value in o.iteritems():
+            write(key)
+            write(value)
+
+    def write_date(self, o):
+        self.out.append('D' + INT32.pack(o.toordinal()))
+
+    def write_datetime(self, o):
+        o = tz.to_iso_date_str(o)
+        self.out.append('t' + UINT32.pack(len(o)) + o)
+
+    def write_dto(self, o):
+        kls = type(o)
+        if _has_own_storage(kls):
+            return self.write_dict(o.to_dict())
+        if o._raw is not None:
+            o.validate()
+        self.write_row(kls, [getattr(o, name) for name in kls._field_names])
+
+    def write_serializable(self, o):
+        self.write_dto(o.to_dto())
+
+    def write_row(self, kls, values):
+        class_id = self.class_ids.get(kls)
+        if class_id is None:
+            class_id = self.class_ids[kls] = len(self.class_ids)
+            header = ['C', UINT16.pack(class_id), UINT16.pack(len(kls.__name__)), kls.__name__,
+                      UINT16.pack(len(kls._field_names))]
+            for name in kls._field_names:
+                header.append(UINT16.pack(len(name)) + name)
+            self.out.append(''.join(header))
+        self.out.append('O' + UINT16.pack(class_id))
+        write = self.write
+        for value in values:
+            write(value)
+
+
+_WRITERS = {
+    bool: _Writer.write_bool,
+    int: _Writer.write_int,
+    long: _Writer.write_int,
+    float: _Writer.write_float,
+    list: _Writer.write_list,
+    tuple: _Writer.write_list,
+    set: _Writer.write_list,
+    frozenset: _Writer.write_list,
+    dict: _Writer.write_dict,
+    utils.ObjectDict: _Writer.write_dict,
+    datetime.date: _Writer.write_date,
+    datetime.datetime: _Writer.write_datetime,
+}
+
+# checked in order for subclasses, datetime goes before date
+_BASE_WRITERS = (
+    (BaseDTO, _Writer.write_dto),
+    (Serializable, _Writer.write_serializable),
+    (bool, _Writer.write_bool),
+    ((int, long), _Writer.write_int),
+    (float, _Writer.write_float),
+    (str, _Writer.write_str),
+    (unicode, _Writer.write_unicode),
+    ((list, tuple, set, frozenset), _Writer.write_list),
+    (dict, _Writer.write_dict),
+    (datetime.datetime, _Writer.write_datetime),
+    (datetime.date, _Writer.write_date),
+)
+
+
+def _find_writer(o):
+    for base, writer in _BASE_WRITERS:
+        if isinstance(o, base):
+            # dto classes are not cached, there may be too many of them
+            if base is not BaseDTO:
+                _WRITERS[type(o)] = writer
+            return writer
+    raise CodecError('%r cannot be encoded by binary codec' % (o,))
+
+
+class _Reader(object):
+    def __init__(self, data, pos=0):
+        self.data = data
+        self.pos = pos
+        self.classes = {}
+
+    def unpack(self, fmt):
+        value, = fmt.unpack_from(self.data, self.pos)
+        self.pos += fmt.size
+        return value
+
+    def read_bytes(self, size_fmt=UINT32):
+        start = self.pos + size_fmt.size
+        end = start + size_fmt.unpack_from(self.data, self.pos)[0]
+        if end > len(self.data):
+            raise CodecError('binary payload is truncated')
+        self.pos = end
+        return self.data[start:end]
+
+    def read(self):
+        data = self.data
+        pos = self.pos
+        if pos >= len(data):
+            raise CodecError('binary payload is truncated')
+        tag = data[pos]
+        self.pos = pos + 1
+        # most common tags are read inline
+        if tag == 's':
+            return self.read_bytes()
+        elif tag == 'i':
+            self.pos = pos + 5
+            return INT32.unpack_from(data, pos + 1)[0]
+        elif tag == 'O':
+            return self.read_dto()
+        elif tag == 'N':
+            return None
+        elif tag == 'C':
+            self.read_class()
+            return self.read()
+        reader = _READERS.get(tag)
+        if reader is None:
+            raise CodecError('unknown tag %r at %d' % (tag, pos))
+        return reader(self)
+
+    def read_class(self):
+        class_id = self.unpack(UINT16)
+        name = self.read_bytes(UINT16)
+        names = tuple(self.read_bytes(UINT16) for _ in xrange(self.unpack(UINT16)))
+        kls = BaseDTO.find(name)
+        if kls is None:
+            raise CodecError('unknown dto class %s' % name)
+        self.classes[class_id] = (kls, names)
+
+    def read_int64(self):
+        return self.unpack(INT64)
+
+    def read_long(self):
+        return long(self.read_bytes())
+
+    def read_float(self):
+        return self.unpack(DOUBLE)
+
+    def read_unicode(self):
+        return self.read_bytes().decode('utf-8')
+
+    def read_list(self):
+        read = self.read
+        return [read() for _ in xrange(self.unpack(UINT32))]
+
+    def read_dict(self):
+        read = self.read
+        dikt = {}
+        for _ in xrange(self.unpack(UINT32)):
+            key = read()
+            dikt[key] = read()
+        __cls__ = dikt.get('__cls__')
+        if __cls__:
+            kls = BaseDTO.find(__cls__)
+            if kls is None:
+                raise CodecError('unknown dto class %s' % __cls__)
+            return kls.from_dict(dikt)
+        return dikt
+
+    def read_date(self):
+        return datetime.date.fromordinal(self.unpack(INT32))
+
+    def read_datetime(self):
+        return tz.parse_date(self.read_bytes())
+
+    def read_dto(self):
+        try:
+            kls, names = self.classes[self.unpack(UINT16)]
+        except KeyError:
+            raise CodecError('dto class is used before defined')
+        read = self.read
+        # same as json, fields are restored by `from_dict`, unknown fields are dropped
+        return kls.from_dict({name: read() for name in names})
+
+
+_READERS = {
+    'T': lambda reader: True,
+    'F': lambda reader: False,
+    'q': _Reader.read_int64,
+    'L': _Reader.read_long,
+    'd': _Reader.read_float,
+    'u': _Reader.read_unicode,
+    'l': _Reader.read_list,
+    'm': _Reader.read_dict,
+    'D': _Reader.read_date,
+    't': _Reader.read_datetime,
+}
+
+
+class BinaryCodec(Codec):
+    content_type = BINARY
+
+    def encode(self, o):
+        writer = _Writer()
+        writer.out.append(HEADER)
+        writer.write(o)
+        return ''.join(writer.out)
+
+    def decode(self, data, typed=False):
+        if len(data) < len(HEADER) or not data.startswith(MAGIC):
+            raise CodecError('not a binary payload')
+        if data[len(MAGIC)] != chr(VERSION):
+            raise CodecError('binary payload version %d is not supported' % ord(data[len(MAGIC)]))
+        reader = _Reader(data, len(HEADER))
+        try:
+            return reader.read()
+        except CodecError:
+            raise
+        except struct.error:
+            raise CodecError('binary payload is truncated')
+        except (TypeError, ValueError), error:
+            # value which could not be restored, like date out of range or invalid utf-8
+            raise CodecError('binary payload is broken: %s' % error)
+
+
+CODECS = {}
+
+
+def register(codec):
+    """
+    :param codec: Codec instance, replaces the one with same content type
+    """
+    CODECS[codec.content_type] = codec
+    return codec
+
+
+JSON_CODEC = register(JsonCodec())
+BINARY_CODEC = register(BinaryCodec())
+
+
+def _media_type(content_type):
+    return (content_type or '').split(';', 1)[0].strip().lower()
+
+
+def find(content_type):
+    """
+    :param content_type: value of `Content-Type`, parameters are ignored
+    :return: codec, or None if not registered
+    """
+    return CODECS.get(_media_type(content_type))
+
+
+def negotiate(accept):
+    """
+    :param accept: value of `Accept`, like 'application/x-aa-binary, application/json;q=0.5'
+    :return: registered codec with highest quality, json if nothing matches
+    """
+    if not accept:
+        return JSON_CODEC
+    candidates = []
+    for index, item in enumerate(accept.split(',')):
+        parts = item.split(';')
+        quality = 1.0
+        for param in parts[1:]:
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        codec = CODECS.get(_media_type(parts[0]))
+        if codec is not None and quality > 0:
+            candidates.append((-quality, index, codec))
+    if not candidates:
+        return JSON_CODEC
+    return min(candidates)[2]
@@ -0,0 +1,219 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+"""
+code generation for DTO classes
+
+FieldRegisterMeta builds per class functions here, the source is generated from
+the declared fields and exec'ed once when the class is created, so hot paths
+like construction do not loop over field sets on every call
+"""
+import keyword
+import re
+
+from fields import ContainerField, DTOField, List, has_plain_validation
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# names used by generated code, fields of compact DTO cannot take them
+RESERVED_NAMES = {'self', '_unknown', '_raw'}
+
+
+def is_identifier(name):
+    return bool(_IDENTIFIER.match(name)) and not keyword.iskeyword(name)
+
+
+def compile_function(func_name, lines, namespace, filename='<dto>'):
+    """
+    exec generated source and return the function defined in it
+    :param func_name: name of function defined by lines
+    :param lines: source lines
+    :param namespace: globals of generated function
+    :param filename: shown in tracebacks
+    :return: function
+    """
+    code = compile('\n'.join(lines) + '\n', filename, 'exec')
+    exec code in namespace
+    return namespace[func_name]
+
+
+def check_slot_names(kls_name, fields):
+    for field in fields:
+        if not is_identifier(field.name) or field.name in RESERVED_NAMES:
+            raise TypeError('%s.%s cannot be used as slot of compact dto' % (kls_name, field.name))
+
+
+def build_slot_init(kls, fields, freeze=None):
+    """
+    generate __init__ of compact dto, the value of each field is validated
+    and stored to its slot directly
+
+    for Category(market=String(), category_id=Int()) the source is like:
+
+        def __init__(self, market=None, category_id=None, **_unknown):
+            market = _f0(market)
+            _s0(self, market)
+            if category_id is None:
+                category_id = _f1(None)
+            elif not isinstance(category_id, _t1):
+                _f1(category_id)
+            _s1(self, category_id)
+            _sr(self, None)
+
+    :param kls: compact dto class, slots already created
+    :param fields: fields in declared order
+    :param freeze: values of container fields are stored as `freeze(value)` if given
+    :return: function
+    """
+    namespace = {'_fz': freeze}
+    args = ''.join(['%s=None, ' % field.name for field in fields])
+    lines = ['def __init__(self, %s**_unknown):' % args]
+    for index, field in enumerate(fields):
+        name = field.name
+        namespace['_f%d' % index] = field
+        namespace['_s%d' % index] = kls.__dict__[name].__set__
+        if has_plain_validation(field):
+            namespace['_t%d' % index] = field._base_type
+            lines.extend([
+                '    if %s is None:' % name,
+                '        %s = _f%d(None)' % (name, index),
+                '    elif not isinstance(%s, _t%d):' % (name, index),
+                '        _f%d(%s)' % (index, name),
+            ])
+        else:
+            lines.append('    %s = _f%d(%s)' % (name, index, name))
+        if freeze is not None and isinstance(field, ContainerField):
+            lines.append('    %s = _fz(%s)' % (name, name))
+        lines.append('    _s%d(self, %s)' % (index, name))
+    # not a lazy dto (see: BaseDTO.lazy_from_dict)
+    namespace['_sr'] = kls.__dict__['_raw'].__set__
+    lines.append('    _sr(self, None)')
+    return compile_function('__init__', lines, namespace, '<dto %s.__init__>' % kls.__name__)
+
+
+def build_slot_from_row(kls, fields, freeze=None):
+    """
+    generate `_from_valid_row(cls, row)` of compact dto, values in row are validated
+    already and stored to slots directly:
+
+        def _from_valid_row(cls, row):
+            self = _new(cls)
+            _s0(self, row[0])
+            _s1(self, row[1])
+            _sr(self, None)
+            return self
+
+    :param kls: compact dto class, slots already created
+    :param fields: fields in declared order
+    :param freeze: see build_slot_init
+    :return: function
+    """
+    namespace = {'_new': object.__new__, '_sr': kls.__dict__['_raw'].__set__, '_fz': freeze}
+    lines = ['def _from_valid_row(cls, row):', '    self = _new(cls)']
+    for index, field in enumerate(fields):
+        namespace['_s%d' % index] = kls.__dict__[field.name].__set__
+        if freeze is not None and isinstance(field, ContainerField):
+            lines.append('    _s%d(self, _fz(row[%d]))' % (index, index))
+        else:
+            lines.append('    _s%d(self, row[%d])' % (index, index))
+    lines.extend(['    _sr(self, None)', '    return self'])
+    return compile_function('_from_valid_row', lines, namespace, '<dto %s._from_valid_row>' % kls.__name__)
+
+
+def nested_dto(field):
+    """
+    :return: (dto class, is list of dto, element can be none)
+    """
+    if isinstance(field, DTOField) and field.dto_class is not None:
+        return field.dto_class, False, False
+    if isinstance(field, List) and field.element_dto_class is not None:
+        element = field.element_type
+        return field.element_dto_class, True, isinstance(element, DTOField) and element.can_be_none
+    return None, False, False
+
+
+def build_dump(kls, fields, compact=False):
+    """
+    generate `_dump_fields(self)`, it returns a fresh dict of field values and `__cls__`
+    without touching instance state, nested dto and list of dto are dumped directly:
+
+        def _dump_fields(self):
+            _d = self._data
+            v1 = _d['parent']
+            return {'__cls__': 'Category', 'market': _d['market'],
+                    'parent': None if v1 is None else v1.to_dict()}
+
+    :param kls: dto class
+    :param fields: fields in declared order
+    :param compact: read values from slots instead of `_data`
+    :return: function
+    """
+    lines = ['def _dump_fields(self):']
+    if not compact and fields:
+        lines.append('    _d = self._data')
+    items = ['%r: %r' % ('__cls__', kls.__name__)]
+    for index, field in enumerate(fields):
+        if compact:
+            read = 'self.%s' % field.name
+        else:
+            read = '_d[%r]' % field.name
+        dto_class, many, element_none = nested_dto(field)
+        if dto_class is None:
+            items.append('%r: %s' % (field.name, read))
+            continue
+        lines.append('    v%d = %s' % (index, read))
+        if not many:
+            value = 'v%d.to_dict()' % index
+        elif element_none:
+            value = '[e if e is None else e.to_dict() for e in v%d]' % index
+        else:
+            value = '[e.to_dict() for e in v%d]' % index
+        items.append('%r: None if v%d is None else %s' % (field.name, index, value))
+    lines.append('    return {%s}' % ', '.join(items))
+    return compile_function('_dump_fields', lines, {}, '<dto %s._dump_fields>' % kls.__name__)
+
+
+def build_load(kls, fields):
+    """
+    generate `_load_fields(cls, dikt)`, it picks declared fields from a plain dict and
+    rebuilds nested dto directly, values of fields like DateField are restored by
+    their `from_json`, the result is the kwargs of dto constructor:
+
+        def _load_fields(cls, dikt):
+            _g = dikt.get
+            v1 = _g('parent')
+            if isinstance(v1, dict):
+                v1 = _c1.from_dict(v1)
+            return {'market': _g('market'), 'parent': v1}
+
+    :param kls: dto class
+    :param fields: fields in declared order
+    :return: function
+    """
+    namespace = {}
+    lines = ['def _load_fields(cls, dikt):']
+    if fields:
+        lines.append('    _g = dikt.get')
+    items = []
+    for index, field in enumerate(fields):
+        dto_class, many, _ = nested_dto(field)
+        if field.json_conversion:
+            namespace['_j%d' % index] = field.from_json
+            items.append('%r: _j%d(_g(%r))' % (field.name, index, field.name))
+            continue
+        if dto_class is None:
+            items.append('%r: _g(%r)' % (field.name, field.name))
+            continue
+        namespace['_c%d' % index] = dto_class
+        lines.append('    v%d = _g(%r)' % (index, field.name))
+        if many:
+            lines.extend([
+                '    if v%d is not None:' % index,
+                '        v%d = [_c%d.from_dict(e) if isinstance(e, dict) else e for e in v%d]' % (index, index, index),
+            ])
+        else:
+            lines.extend([
+                '    if isinstance(v%d, dict):' % index,
+                '        v%d = _c%d.from_dict(v%d)' % (index, index, index),
+            ])
+        items.append('%r: v%d' % (field.name, index))
+    lines.append('    return {%s}' % ', '.join(items))
+    return compile_function('_load_fields', lines, namespace, '<dto %s._load_fields>' % kls.__name__)
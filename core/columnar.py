@@ -0,0 +1,174 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+"""
+column oriented storage for homogeneous dto list
+
+instead of one dict per element, values are kept as one column per field,
+Int/Bool/Float columns are backed by `array`, the wire format is like:
+
+    {
+        "__cls__": "CategoryList",
+        "__size__": 2,
+        "__columns__": {"market": ["ios", "gp"], "category_id": [100, 101]}
+    }
+
+elements are rebuilt to dto only when they are accessed, it could be changed like a list,
+columns are built again from elements when it is encoded
+"""
+import array
+import collections
+
+from fields import Bool, Float, Int
+
+# typecode of array for field classes, only used when field cannot be None
+ARRAY_TYPECODES = {
+    Int: 'l',
+    Bool: 'b',
+    Float: 'd',
+}
+
+
+def typecode_of(field):
+    if field.can_be_none or field.default is not None:
+        return None
+    return ARRAY_TYPECODES.get(type(field))
+
+
+def make_column(field, values):
+    """
+    :param field: field of the column
+    :param values: list of values
+    :return: array if field type could be packed, otherwise list
+    """
+    typecode = typecode_of(field)
+    if typecode is None:
+        return values
+    # array converts int & bool to float silently, wrong values are kept in list and reported by field on access
+    if field.validate_many(values)[1]:
+        return values
+    try:
+        return array.array(typecode, values)
+    except (OverflowError, TypeError):
+        # long out of C long range, or wrong type which will be reported by field later
+        return values
+
+
+class ColumnList(collections.MutableSequence):
+    """
+    sequence of dto stored by columns, with the methods of list
+
+    elements are rebuilt on first access and kept, columns are sent as they are only
+    if no element is accessed or changed, otherwise they are built again from elements
+    when encoded, so changes of elements or of the list are not lost
+
+    :param dto_class: class of elements
+    :param columns: dict of field name => array/list, values in wire format
+    :param size: number of elements
+    """
+
+    def __init__(self, dto_class, columns, size):
+        self.dto_class = dto_class
+        self.columns = columns
+        # int is the position in columns of element not rebuilt yet, others are dto
+        self._rows = range(size)
+        # no element is rebuilt or changed, columns could be sent as they are
+        self._pristine = True
+
+    @classmethod
+    def from_rows(cls, dto_class, rows):
+        """
+        :param dto_class: class of elements
+        :param rows: list of dto or dict, dto is kept as element, columns are built when encoded
+        :return: ColumnList
+        """
+        column_list = cls(dto_class, {}, 0)
+        column_list.extend(rows)
+        return column_list
+
+    @classmethod
+    def from_columns(cls, dto_class, columns, size):
+        """
+        restore from wire format, elements are not validated until accessed
+        :param dto_class: class of elements
+        :param columns: dict of field name => list
+        :param size: number of elements
+        :return: ColumnList
+        """
+        packed = {}
+        for field in dto_class._field_list:
+            values = columns.get(field.name)
+            if values is None:
+                values = [None] * size
+            elif len(values) != size:
+                raise TypeError('%s column %s should have %d values, but get %d' % (
+                    dto_class.__name__, field.name, size, len(values)))
+            packed[field.name] = make_column(field, values)
+        return cls(dto_class, packed, size)
+
+    def to_columns(self):
+        """
+        :return: dict of field name => list, could be dumped to json
+        """
+        if self._pristine:
+            return {name: column.tolist() if isinstance(column, array.array) else column
+                    for name, column in self.columns.items()}
+        names = self.dto_class._field_names
+        columns = {name: [] for name in names}
+        for row in self._rows:
+            dikt = self.row_dict(row) if type(row) is int else row.to_dict()
+            for name in names:
+                columns[name].append(dikt[name])
+        return columns
+
+    def row_dict(self, index):
+        """
+        :param index: position in columns
+        """
+        dikt = {}
+        for field in self.dto_class._field_list:
+            value = self.columns[field.name][index]
+            if isinstance(field, Bool) and value is not None:
+                value = bool(value)
+            dikt[field.name] = value
+        return dikt
+
+    def _to_row(self, value):
+        if isinstance(value, self.dto_class):
+            return value
+        return self.dto_class.from_dict(value)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in xrange(*index.indices(len(self._rows)))]
+        row = self._rows[index]
+        if type(row) is int:
+            row = self._rows[index] = self.dto_class.from_dict(self.row_dict(row))
+            # element could be changed by caller from now on
+            self._pristine = False
+        return row
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            value = [self._to_row(row) for row in value]
+        else:
+            value = self._to_row(value)
+        self._rows[index] = value
+        self._pristine = False
+
+    def __delitem__(self, index):
+        del self._rows[index]
+        self._pristine = False
+
+    def insert(self, index, value):
+        self._rows.insert(index, self._to_row(value))
+        self._pristine = False
+
+    def extend(self, values):
+        self._rows.extend([self._to_row(row) for row in values])
+        self._pristine = False
+
+    def __iter__(self):
+        for index in xrange(len(self._rows)):
+            yield self[index]
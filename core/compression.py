@@ -0,0 +1,205 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+"""
+negotiated gzip/deflate of bodies
+
+a response is compressed by the coding preferred in `Accept-Encoding` of request,
+a body smaller than `min_size`, or one that would not get smaller, is sent as it is
+
+    interface = FlaskInterface(app)
+    interface.compressor = Compressor(min_size=4096, level=1)
+
+time spent and bytes saved are counted (see: Compressor.stats), level 1 is
+usually enough for json of dto, whose keys repeat on every element
+
+streamed body is compressed chunk by chunk as it is sent (see: Compressor.compress_stream)
+"""
+import threading
+import time
+import zlib
+
+from http_code import BAD_REQUEST, REQUEST_ENTITY_TOO_LARGE, UNSUPPORTED_MEDIA_TYPE
+
+GZIP = 'gzip'
+DEFLATE = 'deflate'
+IDENTITY = 'identity'
+# preferred first when client accepts them equally
+ENCODINGS = (GZIP, DEFLATE)
+
+# bodies smaller than this do not pay off the cpu, and may not fit more packets anyway
+MIN_SIZE = 1024
+LEVEL = 6
+# max bytes a request body is expanded to, a small body of zeros could expand to gigabytes
+MAX_DECOMPRESSED_SIZE = 16 * 1024 * 1024
+
+# window bits of zlib, gzip header & trailer, zlib header & trailer, auto detect of both for decompress
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+_ZLIB_WBITS = zlib.MAX_WBITS
+_AUTO_WBITS = 32 + zlib.MAX_WBITS
+
+
+class UnsupportedEncodingError(ValueError):
+    code = UNSUPPORTED_MEDIA_TYPE
+
+
+class BrokenBodyError(ValueError):
+    code = BAD_REQUEST
+
+
+class BodyTooLargeError(ValueError):
+    code = REQUEST_ENTITY_TOO_LARGE
+
+
+def negotiate(accept_encoding):
+    """
+    :param accept_encoding: value of `Accept-Encoding`, like 'gzip;q=1.0, deflate;q=0.5'
+    :return: supported coding with highest quality, None if nothing matches
+    """
+    if not accept_encoding:
+        return None
+    qualities = {}
+    for item in accept_encoding.split(','):
+        parts = item.split(';')
+        name = parts[0].strip().lower()
+        quality = 1.0
+        for param in parts[1:]:
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name] = quality
+    candidates = []
+    for index, encoding in enumerate(ENCODINGS):
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > 0:
+            candidates.append((-quality, index, encoding))
+    if not candidates:
+        return None
+    return min(candidates)[2]
+
+
+def compress(data, encoding, level=LEVEL):
+    """
+    :return: data compressed by coding, gzip header carries no time, so the output is the same for same data
+    """
+    compressor = _compressobj(encoding, level)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _compressobj(encoding, level):
+    if encoding == GZIP:
+        return zlib.compressobj(level, zlib.DEFLATED, _GZIP_WBITS)
+    elif encoding == DEFLATE:
+        # `deflate` of http is zlib format, not raw deflate
+        return zlib.compressobj(level, zlib.DEFLATED, _ZLIB_WBITS)
+    raise UnsupportedEncodingError('unsupported content encoding %s' % encoding)
+
+
+def decompress(data, encoding, max_size=MAX_DECOMPRESSED_SIZE):
+    """
+    :param encoding: value of `Content-Encoding`
+    :param max_size: BodyTooLargeError if data expands to more bytes
+    """
+    encoding = (encoding or IDENTITY).strip().lower()
+    if encoding == IDENTITY:
+        return data
+    if encoding not in ENCODINGS:
+        raise UnsupportedEncodingError('unsupported content encoding %s' % encoding)
+    try:
+        return _decompress(data, _AUTO_WBITS, max_size)
+    except zlib.error:
+        if encoding != DEFLATE:
+            raise BrokenBodyError('broken %s body' % encoding)
+    # some clients send raw deflate
+    try:
+        return _decompress(data, -zlib.MAX_WBITS, max_size)
+    except zlib.error:
+        raise BrokenBodyError('broken %s body' % encoding)
+
+
+def _decompress(data, wbits, max_size):
+    # at most max_size + 1 bytes are expanded, the rest is left in unconsumed_tail
+    decompressor = zlib.decompressobj(wbits)
+    if len(decompressor.decompress(data, max_size + 1)) > max_size or decompressor.unconsumed_tail:
+        raise BodyTooLargeError('body expands to more than %d bytes' % max_size)
+    # decompressobj of python 2 does not tell a truncated stream, the one shot call does
+    return zlib.decompress(data, wbits)
+
+
+class Compressor(object):
+    """
+    compress bodies over a size threshold and count the cost
+
+    :param min_size: bodies smaller than it are not compressed
+    :param level: 1 (fastest) to 9 (smallest)
+    """
+
+    def __init__(self, min_size=MIN_SIZE, level=LEVEL):
+        self.min_size = min_size
+        self.level = level
+        self._lock = threading.Lock()
+        self.compressed = 0
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    def compress(self, data, encoding):
+        """
+        :return: compressed data, None if data is too small or does not get smaller
+        """
+        if len(data) < self.min_size:
+            with self._lock:
+                self.skipped += 1
+            return None
+        started = time.time()
+        compressed = compress(data, encoding, self.level)
+        elapsed = time.time() - started
+        with self._lock:
+            self.seconds += elapsed
+            if len(compressed) >= len(data):
+                self.skipped += 1
+                return None
+            self.compressed += 1
+            self.bytes_in += len(data)
+            self.bytes_out += len(compressed)
+        return compressed
+
+    def compress_stream(self, chunks, encoding):
+        """
+        :param chunks: iterable of str, body of streamed response
+        :return: generator of compressed pieces, only one chunk is held at a time
+        """
+        compressor = _compressobj(encoding, self.level)
+        bytes_in = bytes_out = 0
+        seconds = 0.0
+        try:
+            for chunk in chunks:
+                started = time.time()
+                data = compressor.compress(chunk)
+                seconds += time.time() - started
+                bytes_in += len(chunk)
+                bytes_out += len(data)
+                # zlib buffers small input, an empty piece would end a chunked body
+                if data:
+                    yield data
+            data = compressor.flush()
+            bytes_out += len(data)
+            yield data
+        finally:
+            with self._lock:
+                self.compressed += 1
+                self.bytes_in += bytes_in
+                self.bytes_out += bytes_out
+                self.seconds += seconds
+
+    def stats(self):
+        """
+        :return: dict, `saved_per_ms` is bytes saved for each millisecond spent on compressing
+        """
+        saved = self.bytes_in - self.bytes_out
+        return {'compressed': self.compressed, 'skipped': self.skipped, 'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out, 'bytes_saved': saved,
+                'ratio': float(self.bytes_out) / self.bytes_in if self.bytes_in else 1.0,
+                'seconds': self.seconds, 'saved_per_ms': saved / (self.seconds * 1000) if self.seconds else 0.0}
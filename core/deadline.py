@@ -0,0 +1,162 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+"""
+deadline of a call, propagated from client to server and on to nested remote calls
+
+client sets how long it waits for a call, the remaining seconds are sent in header
+`X-AA-Timeout` of each remote call (see: EntryPoint.send_remote), and the timeout of
+the request is shortened to fit in
+
+    with deadline.within(2):
+        info = get_app_info(app_id)
+        ranks = get_ranks('ios')
+
+server reads the header when a request arrives (see: core.web_interface), the entry is
+not called if the caller has given up already (see: pingpong.pack_result), and remote
+calls made by the entry share what is left of the budget
+
+seconds left are sent instead of the time of deadline, so clocks of hosts need not agree
+"""
+import math
+import threading
+import time
+
+from http_code import GATEWAY_TIMEOUT
+
+HEADER = 'X-AA-Timeout'
+# timeout of request is not shortened below it, so a call with some budget left still has a chance
+MIN_TIMEOUT = 0.001
+
+
+class DeadlineExceeded(Exception):
+    code = GATEWAY_TIMEOUT
+
+
+class _Local(threading.local):
+    # default of class, reading a missing attribute of threading.local is slow, current() is on every call
+    at = None
+
+
+_local = _Local()
+_lock = threading.Lock()
+_expired = {'count': 0}
+
+
+def current():
+    """
+    :return: time of deadline of current thread, None if there is no deadline
+    """
+    return _local.at
+
+
+def remaining(at=None):
+    """
+    :param at: time of deadline, deadline of current thread if None
+    :return: seconds left, can be negative, None if there is no deadline
+    """
+    if at is None:
+        at = current()
+    if at is None:
+        return None
+    return at - time.time()
+
+
+def check(at=None):
+    """
+    raise DeadlineExceeded if deadline has passed
+    """
+    left = remaining(at)
+    if left is not None and left <= 0:
+        with _lock:
+            _expired['count'] += 1
+        raise DeadlineExceeded('deadline exceeded by %.3f seconds' % -left)
+
+
+def stats():
+    """
+    :return: dict, `expired` is calls dropped for missing their deadline
+    """
+    return {'expired': _expired['count']}
+
+
+def from_header(value):
+    """
+    :param value: seconds left in header, sent by client
+    :return: time of deadline, None if value is missing or broken
+    """
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        return None
+    if seconds != seconds:
+        return None
+    return time.time() + seconds
+
+
+def to_header(left):
+    # rounded down, so that server never gets more time than caller has
+    return '%.3f' % (math.floor(max(left, 0) * 1000) / 1000)
+
+
+def shorten(timeout, left):
+    """
+    :param timeout: timeout of request, seconds or (connect, read)
+    :param left: seconds left of deadline
+    :return: timeout which is not longer than left
+    """
+    left = max(left, MIN_TIMEOUT)
+    if timeout is None:
+        return left
+    if isinstance(timeout, tuple):
+        return tuple(left if part is None else min(part, left) for part in timeout)
+    return min(timeout, left)
+
+
+class Scope(object):
+    """
+    deadline of current thread within the block, an outer deadline which is earlier still applies
+
+    :param at: time of deadline, no deadline is added if None
+    """
+
+    def __init__(self, at):
+        self.at = at
+        self._previous = None
+
+    def __enter__(self):
+        self._previous = current()
+        if self.at is not None:
+            _local.at = self.at if self._previous is None else min(self._previous, self.at)
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        _local.at = self._previous
+
+
+def scoped(iterable, at):
+    """
+    items of iterable are produced within deadline, for a body which is iterated after
+    the scope of request has exited, like a streamed response
+    :param at: time of deadline, no deadline is added if None
+    """
+    iterator = iter(iterable)
+    try:
+        while True:
+            with Scope(at):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            close()
+
+
+def within(seconds):
+    """
+    :param seconds: time allowed for calls in the block
+    """
+    return Scope(time.time() + seconds)
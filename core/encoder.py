@@ -0,0 +1,143 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+"""
+json encoder walks dto directly
+
+containers holding dto are walked in python, everything else is encoded by
+the C encoder of json, frozen dto splices its cached json (see: BaseDTO.to_json)
+"""
+import json
+
+from base import BaseDTO, Serializable, json_default
+
+SEPARATORS = (',', ':')
+# size of chunk yielded by iter_chunks
+CHUNK_SIZE = 8192
+# max number of items encoded by one call of C encoder
+BATCH_SIZE = 256
+
+
+def _key_to_string(key):
+    # same as json.dumps
+    if isinstance(key, basestring):
+        return key
+    elif key is True:
+        return 'true'
+    elif key is False:
+        return 'false'
+    elif key is None:
+        return 'null'
+    elif isinstance(key, (int, long, float)):
+        return json.dumps(key)
+    raise TypeError('key %r is not a string' % (key,))
+
+
+def _need_walk(value):
+    return isinstance(value, (BaseDTO, Serializable, dict, list, tuple, set))
+
+
+class DTOEncoder(object):
+    """
+    :param default: called with object could not be encoded, return an encodable one
+    :param separators: (item separator, key separator)
+    """
+
+    def __init__(self, default=None, separators=SEPARATORS):
+        self.default = default
+        self.item_separator, self.key_separator = separators
+        self._plain = json.JSONEncoder(separators=separators, default=self._default)
+
+    def _default(self, o):
+        if isinstance(o, (BaseDTO, Serializable)) or self.default is None:
+            return json_default(o)
+        return self.default(o)
+
+    def encode(self, o):
+        return ''.join(self.iterencode(o))
+
+    def iterencode(self, o):
+        """
+        :param o: plain data, dto or Serializable
+        :return: generator of json chunks
+        """
+        if isinstance(o, BaseDTO):
+            if o.__frozen__:
+                yield o.to_json()
+            else:
+                yield self._plain.encode(o.to_dict())
+        elif isinstance(o, Serializable):
+            for chunk in self.iterencode(o.to_dto()):
+                yield chunk
+        elif isinstance(o, dict) and any(_need_walk(v) for v in o.itervalues()):
+            yield '{'
+            first = True
+            for key, value in o.iteritems():
+                if first:
+                    first = False
+                    yield self._plain.encode(_key_to_string(key)) + self.key_separator
+                else:
+                    yield self.item_separator + self._plain.encode(_key_to_string(key)) + self.key_separator
+                for chunk in self.iterencode(value):
+                    yield chunk
+            yield '}'
+        elif isinstance(o, (list, tuple, set)) and any(_need_walk(v) for v in o):
+            yield '['
+            for chunk in self._iter_items(o):
+                yield chunk
+            yield ']'
+        else:
+            yield self._plain.encode(o)
+
+    def _iter_items(self, items):
+        """
+        plain items and dicts of non frozen dto are collected and encoded by batch,
+        that saves one call of C encoder per item
+        """
+        item_separator = self.item_separator
+        sep = ''
+        batch = []
+        for value in items:
+            if isinstance(value, BaseDTO) and not value.__frozen__:
+                batch.append(value.to_dict())
+            elif not _need_walk(value):
+                batch.append(value)
+            else:
+                if batch:
+                    yield sep + self._plain.encode(batch)[1:-1]
+                    sep = item_separator
+                    batch = []
+                yield sep
+                sep = item_separator
+                for chunk in self.iterencode(value):
+                    yield chunk
+            if len(batch) >= BATCH_SIZE:
+                yield sep + self._plain.encode(batch)[1:-1]
+                sep = item_separator
+                batch = []
+        if batch:
+            yield sep + self._plain.encode(batch)[1:-1]
+
+
+def iterencode(o, default=None):
+    return DTOEncoder(default).iterencode(o)
+
+
+def encode(o, default=None):
+    return DTOEncoder(default).encode(o)
+
+
+def iter_chunks(o, default=None, chunk_size=CHUNK_SIZE):
+    """
+    join small pieces of iterencode, yield json str about chunk_size long,
+    only one chunk (and one batch of dto dicts) is held in memory at a time
+    """
+    buf = []
+    size = 0
+    for chunk in DTOEncoder(default).iterencode(o):
+        buf.append(chunk)
+        size += len(chunk)
+        if size >= chunk_size:
+            yield ''.join(buf)
+            buf = []
+            size = 0
+    if buf:
+        yield ''.join(buf)
@@ -3,13 +3,51 @@ import inspect
 import urllib
 
 import requests
-from simplejson.scanner import JSONDecodeError
 
+import aio
+import batch
+import codec
+import compression
+import deadline
+import futures
+import http_client
 import pingpong
 import signature
+from base import BaseDTO
+from cache import ResponseCache, SingleFlight, canonical_key
 from fields import String
+from http_code import GATEWAY_TIMEOUT, NDJSON, NOT_MODIFIED
 
 FORCE_POST = '_FORCE_POST'
+# variant of cache key for entry returns string
+TEXT_VARIANT = 'text'
+
+
+class EntryOptions(object):
+    """
+    options of entry, kept apart from args types of expose/register, so that they never
+    take the name of an arg of the entry
+
+    :param cache: ResponseCache for encoded responses, True for a default one (see: core.cache),
+        only for idempotent entry
+    :param single_flight: identical calls at the same time share one execution (see: cache.SingleFlight),
+        not for generator entry, its items can only be read once
+    :param version: function called with converted kwargs, returns version of the data the entry
+        would return, used as ETag of GET, so that unchanged data gets 304 without calling the entry,
+        if it is None, ETag is the hash of body for buffered response (cached or string), streamed
+        response of dto gets no ETag
+    :param stream: only used for client, the remote entry is a generator entry, stub of client is
+        usually a plain function, its items are read with EntryPoint.stream_read_timeout
+    """
+
+    def __init__(self, cache=None, single_flight=False, version=None, stream=False):
+        self.cache = cache
+        self.single_flight = single_flight
+        self.version = version
+        self.stream = stream
+
+
+DEFAULT_OPTIONS = EntryOptions()
 
 
 class EntryPoint(object):
@@ -29,9 +67,28 @@ class EntryPoint(object):
 
     # only used for client
     host = 'http://127.0.0.1:5000'
+    # only used for client, restore dto in response lazily (see: BaseDTO.lazy_from_dict)
+    lazy_decode = False
+    # only used for client, bytes read at a time from streaming response, small one gets items earlier
+    stream_chunk_size = 128
+    # only used for client, read timeout of generator entry (see: EntryOptions.stream), the longest gap
+    # between its items, None to wait for ever, the read timeout of http client is not used for them
+    stream_read_timeout = None
+    # only used for client, codec of request body and preferred codec of response,
+    # set to codec.BINARY_CODEC for internal traffic (see: core.codec)
+    wire_codec = codec.JSON_CODEC
+    # only used for client, HttpClient of remote calls, None for the shared one (see: core.http_client)
+    http_client = None
+    # only used for client, ResponseCache of (etag, result) for GET calls, the etag is sent as
+    # `If-None-Match` and result is reused on 304, results are shared by callers, so only for
+    # entries whose results are not changed by callers, ttl of the cache should be None
+    conditional_cache = None
+    # only used for client, compression.Compressor of POST body, server should accept `Content-Encoding`,
+    # responses are compressed by server if it supports, and decompressed by http client
+    request_compressor = None
 
     def __init__(self, function, arg_fields, path=None, methods=None, key=None,
-                 retype=None, client_mode=False, on_class=False):
+                 retype=None, client_mode=False, on_class=False, options=None):
         """
         :param function:
         :param arg_fields:
@@ -41,6 +98,7 @@ class EntryPoint(object):
         :param retype:
         :param client_mode:
         :param on_class: if open this flag, will ignore first argument (cls/self)
+        :param options: EntryOptions, cache, single flight and version hook of entry
         :return:
         """
         self.methods = methods
@@ -56,6 +114,12 @@ class EntryPoint(object):
         self.client_mode = client_mode
         self.on_class = on_class
         self.path_args = set([fname for _, fname, _, _ in self.url._formatter_parser() if fname])
+        options = options or DEFAULT_OPTIONS
+        self.cache = ResponseCache() if options.cache is True else options.cache
+        self.single_flight = SingleFlight() if options.single_flight else None
+        self.version = options.version
+        self.streams = options.stream or (inspect.isgeneratorfunction(function) and
+                                          not aio.is_coroutine_function(function))
 
     def __str__(self):
         if self.client_mode:
@@ -76,30 +140,181 @@ class EntryPoint(object):
         """
         kwargs = self.convert_arg_dict(kwargs, direction='from_string')
         print ">>> Call From request", kwargs
+        # coroutine returns at once, its running task is shared by the web interface
+        if self.single_flight is not None and not aio.is_coroutine_function(self.original_callable):
+            key = self.flight_key(kwargs)
+            if key is not None:
+                return self.single_flight.do(key, lambda: self.original_callable(**kwargs))
         return self.original_callable(**kwargs)
 
+    def flight_key(self, kwargs):
+        """
+        :param kwargs: converted kwargs
+        :return: key of single flight, None if args could not be canonicalized
+        """
+        try:
+            return canonical_key(kwargs)
+        except (TypeError, ValueError):
+            return None
+
+    def cache_key(self, kwargs, variant):
+        """
+        :param kwargs: kwargs restores from request, converted like call_from_request
+        :param variant: format of response, such as content type
+        :return: key in cache, same for equal args no matter how they are sent
+        """
+        # omitted args share the key of the default values they are called with
+        args = dict(self.signature.default_values)
+        args.update(self.convert_arg_dict(kwargs, direction='from_string'))
+        return canonical_key(variant, args)
+
+    def invalidate_cache(self, **kwargs):
+        """
+        drop cached responses of kwargs in all formats, or all responses if no kwargs
+        """
+        if self.cache is None:
+            return
+        if not kwargs:
+            return self.cache.invalidate()
+        for variant in codec.CODECS.keys() + [TEXT_VARIANT]:
+            self.cache.invalidate(self.cache_key(kwargs, variant))
+
     def call_remote(self, *args, **kwargs):
+        force_post = kwargs.pop(FORCE_POST, False)
         arg_dict = self.build_arg_dict(args, kwargs)
+        # inside a batch the call is sent later with the others, a future is returned (see: core.batch)
+        pending = batch.current()
+        if pending is not None:
+            return pending.add(self, arg_dict)
+        return self.send_remote(arg_dict, force_post)
+
+    def call_remote_async(self, *args, **kwargs):
+        """
+        send the call in thread of executor (see: core.futures), args are converted at once,
+        seconds of timeout can be given by kwarg futures.TIMEOUT, deadline of caller applies too
+        :return: futures.ThreadFuture
+        """
         force_post = kwargs.pop(FORCE_POST, False)
+        timeout = kwargs.pop(futures.TIMEOUT, None)
+        arg_dict = self.build_arg_dict(args, kwargs)
+        return futures.get_executor().submit(self.send_remote, arg_dict, force_post, timeout, deadline.current())
+
+    def call_remote_aio(self, *args, **kwargs):
+        """
+        same as call_remote_async, for coroutines of event loop (see: core.aio)
+
+            info, ranks = yield [get_app_info.call_remote_aio(1), get_ranks.call_remote_aio('ios')]
+
+        :return: aio.Future resolved in the loop thread
+        """
+        force_post = kwargs.pop(FORCE_POST, False)
+        timeout = kwargs.pop(futures.TIMEOUT, None)
+        arg_dict = self.build_arg_dict(args, kwargs)
+        return aio.run_in_executor(self.send_remote, arg_dict, force_post, timeout, deadline.current())
+
+    def send_remote(self, arg_dict, force_post=False, timeout=None, deadline_at=None):
+        """
+        :param arg_dict: args converted by build_arg_dict
+        :param timeout: seconds of connect and each read, default of http client if None
+        :param deadline_at: time of deadline, deadline of current thread if None (see: core.deadline)
+        :return: result restored from response
+        """
+        if deadline_at is None:
+            deadline_at = deadline.current()
+        cache_key = cached = None
         path_arg_dict = {}
         for path_arg in self.path_args:
             path_arg_dict[path_arg] = arg_dict.pop(path_arg)
         url = self.url.format(**path_arg_dict)
+        wire = self.wire_codec
+        headers = {'Accept': wire.content_type}
+        if timeout is None and self.streams:
+            timeout = (http_client.connect_timeout(getattr(self.client, 'timeout', None)), self.stream_read_timeout)
+        left = deadline.remaining(deadline_at)
+        if left is not None:
+            # no request is sent if there is no time left, the rest of budget goes to server
+            deadline.check(deadline_at)
+            headers[deadline.HEADER] = deadline.to_header(left)
+            timeout = deadline.shorten(getattr(self.client, 'timeout', None) if timeout is None else timeout, left)
+        options = {} if timeout is None else {'timeout': timeout}
+        # stream the body, so that NDJSON of generator entry can be consumed lazily
         if force_post or not self.support_get:
             print '>>> Call Remote :', arg_dict, url
-            response = requests.post(url, json=arg_dict)
+            headers['Content-Type'] = wire.content_type
+            body = wire.encode(arg_dict)
+            if self.request_compressor is not None:
+                compressed = self.request_compressor.compress(body, compression.GZIP)
+                if compressed is not None:
+                    body = compressed
+                    headers['Content-Encoding'] = compression.GZIP
+            response = self.send_request('POST', url, deadline_at, data=body, headers=headers, stream=True, **options)
         else:
             print '>>> Call Remote :', arg_dict, url
             url = url + '?' + urllib.urlencode(arg_dict)
-            response = requests.get(url)
+            cache = self.conditional_cache
+            if cache is not None:
+                cache_key = canonical_key(url, wire.content_type)
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    headers['If-None-Match'] = cached[0]
+            response = self.send_request('GET', url, deadline_at, headers=headers, stream=True, **options)
         status_code = response.status_code
+        if status_code == NOT_MODIFIED and cached is not None:
+            response.close()
+            return cached[1]
+        content_type = response.headers.get('Content-Type', '')
+        if content_type.startswith(NDJSON):
+            return self.iter_stream(response)
         if isinstance(self.retype, String):
-            return response.content
+            result = response.content
+        else:
+            data = self.loads(response.content, content_type)
+            if isinstance(data, dict) and data.get('code') == GATEWAY_TIMEOUT:
+                # server dropped the call, or a nested call of it ran out of time
+                raise deadline.DeadlineExceeded(data.get('error', {}).get('msg') or 'deadline exceeded on server')
+            result = pingpong.unpack_result(data, dto_type=self.retype, lazy=self.lazy_decode)
+        etag = response.headers.get('ETag')
+        if cache_key is not None and etag and not etag.startswith('W/'):
+            cache.set(cache_key, (etag, result), len(response.content))
+        return result
+
+    def send_request(self, method, url, deadline_at=None, **kwargs):
+        """
+        send request by http client, timeout caused by deadline is raised as DeadlineExceeded
+        """
         try:
-            data = response.json()
-            return pingpong.unpack_result(data, dto_type=self.retype)
-        except JSONDecodeError:
-            raise Exception('Not Json Data: %s' % response.content)
+            return self.client.request(method, url, **kwargs)
+        except requests.Timeout:
+            if deadline_at is not None and deadline.remaining(deadline_at) <= 0:
+                raise deadline.DeadlineExceeded('no response from %s before deadline' % url)
+            raise
+
+    @property
+    def client(self):
+        return self.http_client or http_client.get_client()
+
+    def loads(self, content, content_type=codec.JSON):
+        """
+        :param content: body of response
+        :param content_type: codec of body, json if it is unknown
+        """
+        wire = codec.find(content_type) or codec.JSON_CODEC
+        try:
+            # if retype is dto, dates are restored by its fields, no need to scan every string
+            return wire.decode(content, typed=self.retype_is_dto)
+        except (ValueError, codec.CodecError):
+            raise Exception('Not Json Data: %s' % content)
+
+    def iter_stream(self, response):
+        """
+        lazy iterator of items streamed by generator entry, each line is decoded when it arrives
+        """
+        records = (self.loads(line) for line in response.iter_lines(chunk_size=self.stream_chunk_size) if line)
+        try:
+            for item in pingpong.unpack_stream(records, lazy=self.lazy_decode):
+                yield item
+        finally:
+            response.close()
 
     def call_original(self, *args, **kwargs):
         return self.original_callable(*args, **kwargs)
@@ -156,3 +371,7 @@ class EntryPoint(object):
     @property
     def retype_is_string(self):
         return isinstance(self.retype, String)
+
+    @property
+    def retype_is_dto(self):
+        return isinstance(self.retype, type) and issubclass(self.retype, BaseDTO)
@@ -1,14 +1,21 @@
 # Copyright (c) 2017 App Annie Inc. All rights reserved.
 import datetime
+import types
 
 import tz
 
 
 class BaseField(object):
     _base_type = (object,)
+    # value in decoded json need from_json to restore
+    json_conversion = False
+    # increase on every field created, keep the declared order of fields in dto
+    _creation_counter = 0
 
     def __init__(self, name, can_be_none, default):
         self.name = name
+        self.creation_order = BaseField._creation_counter
+        BaseField._creation_counter += 1
         self._cls = None
         self.can_be_none = can_be_none
         self.default = default
@@ -33,6 +40,38 @@ class BaseField(object):
             self._validate(value)
         return value
 
+    def validate_many(self, values):
+        """
+        validate values of this field in a single pass, errors are collected instead of raised
+        :param values: list of values
+        :return: (values, errors), values with None replaced by default, errors is dict of index => message
+        """
+        values = list(values)
+        errors = {}
+        base_type = self._base_type
+        # None or wrong type, rare in valid batch, go through __call__ for default & error message
+        slow = [index for index, value in enumerate(values) if value is None or not isinstance(value, base_type)]
+        for index in slow:
+            value = values[index]
+            if value is None and (self.default is not None or self.can_be_none):
+                values[index] = self.default
+                continue
+            try:
+                values[index] = self(value)
+            except (TypeError, ValueError), error:
+                errors[index] = str(error)
+        if not has_plain_validation(self):
+            checked = set(slow)
+            validate = self._validate
+            for index, value in enumerate(values):
+                if index in checked:
+                    continue
+                try:
+                    validate(value)
+                except (TypeError, ValueError), error:
+                    errors[index] = str(error)
+        return values, errors
+
     def _accept_none_value(self, value):
         if not self.can_be_none and value is None:
             raise TypeError('%s cannot be None' % self)
@@ -40,6 +79,12 @@ class BaseField(object):
     def _validate(self, value):
         return value
 
+    def from_json(self, value):
+        """
+        restore value from decoded json, only called if json_conversion is True
+        """
+        return value
+
     def to_string(self, value):
         self._validate(value)
         return str(value)
@@ -57,6 +102,15 @@ class BaseField(object):
         raise Exception('%s convert from string %s failed: %s' % (self, value, error))
 
 
+def has_plain_validation(field):
+    """
+    field only checks the base type, no extra validation on value
+    """
+    field_cls = type(field)
+    return (field_cls.__call__.im_func is BaseField.__call__.im_func and
+            field_cls._validate.im_func is BaseField._validate.im_func)
+
+
 class Number(BaseField):
     _base_type = (long, int, float)
 
@@ -107,31 +161,97 @@ class ContainerField(BaseField):
         self.can_be_empty = can_be_empty
 
 
+def _exact_types(element_type):
+    """
+    types of element which can be accepted without checking it one by one,
+    instance of subclass is not in this set and will be checked by slow path
+    :return: set of types, empty set means no fast path
+    """
+    if isinstance(element_type, BaseField):
+        if not has_plain_validation(element_type):
+            return set()
+        base_types = element_type._base_type
+        if not isinstance(base_types, tuple):
+            base_types = (base_types,)
+        exact = set(base_types)
+        if element_type.can_be_none or element_type.default is not None:
+            exact.add(types.NoneType)
+    elif isinstance(element_type, type):
+        exact = {element_type}
+    else:
+        return set()
+    if basestring in exact:
+        exact.discard(basestring)
+        exact.update((str, unicode))
+    if object in exact:
+        return set()
+    return exact
+
+
+def compile_checker(element_type):
+    """
+    compile checker of container elements, it raises TypeError on first invalid element
+
+    element_type can be None (any value), a field (nested container works recursively
+    by its own checker) or a python type, homogeneous elements of primitive fields are
+    checked in one step by comparing the set of their types, only mixed containers
+    fall back to checking element by element
+    :param element_type: None/BaseField/type
+    :return: function(elements)
+    """
+    if element_type is None:
+        return lambda elements: None
+
+    if isinstance(element_type, BaseField):
+        check_one = element_type
+    else:
+        def check_one(item):
+            if not isinstance(item, element_type):
+                raise TypeError('should be %s ' % element_type)
+
+    def check_each(elements):
+        for elem in elements:
+            check_one(elem)
+
+    exact = _exact_types(element_type)
+    if not exact:
+        return check_each
+
+    def check_fast(elements):
+        if not set(map(type, elements)) <= exact:
+            check_each(elements)
+
+    return check_fast
+
+
 class List(ContainerField):
     _base_type = list
 
     def __init__(self, element_type=None, name=None, can_be_none=False, can_be_empty=False, default=None):
         super(List, self).__init__(name, can_be_none, can_be_empty)
         self.element_type = element_type
-        if not isinstance(element_type, BaseField):
-            def _element_field(item):
-                if not isinstance(item, element_type):
-                    raise TypeError('should be %s ' % element_type)
-
-            self._element_field = _element_field
-        else:
-            self._element_field = element_type
+        self._check_elements = compile_checker(element_type)
 
     def _validate(self, value):
-        for elem in value:
-            try:
-                self._element_field(elem)
-            except TypeError, e:
-                raise TypeError('%s, element type error: %s' % (self, e.message))
+        try:
+            self._check_elements(value)
+        except TypeError, e:
+            raise TypeError('%s, element type error: %s' % (self, e.message))
 
     def from_dict(self, dikt):
         return [self.element_type.from_dict(item) for item in dikt['__list__']]
 
+    @property
+    def element_dto_class(self):
+        """
+        dto class of elements, None if elements are not dto
+        """
+        if isinstance(self.element_type, DTOField):
+            return self.element_type.dto_class
+        if isinstance(self.element_type, type) and hasattr(self.element_type, '_field_dict'):
+            return self.element_type
+        return None
+
     def to_dict(self):
         pass
 
@@ -149,13 +269,32 @@ class Dict(ContainerField):
     _base_type = dict
 
     def __init__(self, name=None, key=None, value=None, can_be_none=False, can_be_empty=False, default=None):
+        """
+        :param key: type of keys, None/BaseField/type
+        :param value: type of values, None/BaseField/type
+        """
         super(Dict, self).__init__(name, can_be_none, can_be_empty)
         self.key = key
         self.value = value
+        self._check_keys = compile_checker(key)
+        self._check_values = compile_checker(value)
+
+    def _validate(self, value):
+        if self.key is not None:
+            try:
+                self._check_keys(value.keys())
+            except TypeError, e:
+                raise TypeError('%s, key type error: %s' % (self, e.message))
+        if self.value is not None:
+            try:
+                self._check_values(value.values())
+            except TypeError, e:
+                raise TypeError('%s, value type error: %s' % (self, e.message))
 
 
 class DateField(BaseField):
     _base_type = datetime.date
+    json_conversion = True
 
     def __init__(self, name=None, default=None, format=tz.YYYY_MM_DD, can_be_none=False):
         super(DateField, self).__init__(name, can_be_none, default)
@@ -165,7 +304,20 @@ class DateField(BaseField):
         return self(tz.string_to_date(value, self.format))
 
     def to_string(self, value):
-        return value.date_to_string(self.format)
+        return tz.date_to_string(value, self.format)
+
+    def from_json(self, value):
+        """
+        date in json is `_date:YYYY-MM-DD` (see: utils.EnhancedEncoder) or string in format of field
+        """
+        if isinstance(value, basestring):
+            try:
+                if value.startswith(tz.JSON_DATE_PREFIX):
+                    return tz.string_to_date(value[len(tz.JSON_DATE_PREFIX):])
+                return tz.string_to_date(value, self.format)
+            except ValueError:
+                raise TypeError('%s cannot restore date from %r' % (self, value))
+        return value
 
 
 class DTOField(BaseField):
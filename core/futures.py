@@ -0,0 +1,213 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+"""
+futures of remote calls run in threads, and fan-out of many calls with a concurrency limit
+
+    future = get_app_info.call_remote_async(app_id)
+    ...
+    app = future.result(timeout=5)
+
+    apps, ranks = futures.gather([(get_app_info, (app_id,)), (get_ranks, (), {'market': 'ios'})],
+                                 max_concurrency=10, timeout=5)
+
+in coroutines of event loop (see: core.aio), use `EntryPoint.call_remote_aio` and `aio.gather` instead
+"""
+import sys
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+import aio
+
+# threads of the shared executor
+MAX_WORKERS = 32
+# default calls in flight of gather
+MAX_CONCURRENCY = 10
+# kwarg of remote call for seconds of timeout (see: EntryPoint.call_remote_async)
+TIMEOUT = '_TIMEOUT'
+
+
+class TimeoutError(Exception):
+    pass
+
+
+class ThreadFuture(aio.Future):
+    """
+    future set by another thread, `result` waits for it
+    """
+
+    def __init__(self):
+        super(ThreadFuture, self).__init__()
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+
+    def wait(self, timeout=None):
+        """
+        :return: True if done, False on timeout
+        """
+        return self._event.wait(timeout)
+
+    def result(self, timeout=None):
+        if not self._event.wait(timeout):
+            raise TimeoutError('result is not ready in %s seconds' % timeout)
+        return super(ThreadFuture, self).result()
+
+    def exception(self, timeout=None):
+        if not self._event.wait(timeout):
+            raise TimeoutError('result is not ready in %s seconds' % timeout)
+        return super(ThreadFuture, self).exception()
+
+    def add_done_callback(self, callback):
+        with self._lock:
+            if not self._done:
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _finish(self):
+        with self._lock:
+            if self._done:
+                raise RuntimeError('result is already set')
+            self._done = True
+            callbacks, self._callbacks = self._callbacks, []
+        self._event.set()
+        for callback in callbacks:
+            callback(self)
+
+
+class Executor(object):
+    """
+    run functions in a pool of threads
+
+    :param max_workers: number of threads, calls over it wait in queue
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS):
+        self.max_workers = max_workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPool(self.max_workers)
+        return self._pool
+
+    def submit(self, func, *args, **kwargs):
+        """
+        :return: ThreadFuture of func(*args, **kwargs)
+        """
+        future = ThreadFuture()
+
+        def run():
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                future.set_exc_info(sys.exc_info())
+            else:
+                future.set_result(result)
+
+        self.pool.apply_async(run)
+        return future
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.terminate()
+
+
+_default_executor = None
+_default_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    :return: executor of remote calls shared by process
+    """
+    global _default_executor
+    if _default_executor is None:
+        with _default_lock:
+            if _default_executor is None:
+                _default_executor = Executor()
+    return _default_executor
+
+
+def set_executor(executor):
+    global _default_executor
+    _default_executor = executor
+
+
+def gather(calls, max_concurrency=MAX_CONCURRENCY, timeout=None, return_exceptions=False):
+    """
+    call remote entries concurrently, at most `max_concurrency` of them at the same time
+
+    :param calls: list of (entry, args) or (entry, args, kwargs)
+    :param timeout: seconds of each call from its start, it is also the timeout of its request,
+        a call timed out still holds its slot until its thread is done
+    :param return_exceptions: errors are put in results instead of raising the first one
+    :return: results in the same order of calls
+    """
+    calls = [(tuple(call) + ({},))[:3] for call in calls]
+    count = len(calls)
+    results = [None] * count
+    done = [False] * count
+    deadlines = {}
+    state = {'next': 0, 'running': 0, 'finished': 0, 'error': None}
+    condition = threading.Condition(threading.RLock())
+
+    def release(index, future):
+        # slot is only free when the call is really over, timed out or not
+        with condition:
+            state['running'] -= 1
+            condition.notify()
+        finish(index, future)
+
+    def finish(index, future=None, error=None):
+        with condition:
+            if done[index]:
+                return
+            done[index] = True
+            deadlines.pop(index, None)
+            state['finished'] += 1
+            if future is not None:
+                error = future.exception()
+                results[index] = error if error is not None else future._result
+            else:
+                results[index] = error
+            if error is not None and not return_exceptions and state['error'] is None:
+                state['error'] = future._exc_info if future is not None else (type(error), error, None)
+            condition.notify()
+
+    def start(index):
+        entry, args, kwargs = calls[index]
+        try:
+            future = entry.call_remote_async(*args, **dict(kwargs, **{TIMEOUT: timeout}))
+        except Exception, error:
+            finish(index, error=error)
+            return
+        state['running'] += 1
+        if timeout is not None:
+            deadlines[index] = time.time() + timeout
+        future.add_done_callback(lambda f: release(index, f))
+
+    with condition:
+        while state['finished'] < count:
+            if state['error'] is not None:
+                break
+            while state['running'] < max_concurrency and state['next'] < count:
+                state['next'] += 1
+                start(state['next'] - 1)
+            now = time.time()
+            for index, deadline in deadlines.items():
+                if deadline <= now:
+                    finish(index, error=TimeoutError('call %d is not done in %s seconds' % (index, timeout)))
+            if state['finished'] >= count or state['error'] is not None:
+                break
+            wait = min(deadlines.values()) - now if deadlines else None
+            condition.wait(None if wait is None else max(wait, 0.001))
+    if state['error'] is not None:
+        exc_info = state['error']
+        raise exc_info[0], exc_info[1], exc_info[2]
+    return results
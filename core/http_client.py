@@ -0,0 +1,142 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+"""
+pooled http client shared by remote entries (see: EntryPoint.call_remote)
+
+each host gets a session with its own pool of keep-alive connections, so that
+calls to the same service reuse tcp connections instead of opening one per call
+
+    http_client.set_client(HttpClient(pool_size=32, timeout=(1, 10)))
+
+sessions are created on first use and can be used by many threads at the same
+time, a thread waits for a free connection only if pool_block is set, otherwise
+an extra connection is opened and dropped after use
+"""
+import threading
+import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# connections kept alive per host
+POOL_SIZE = 10
+# (connect, read) seconds, read timeout is for each read of body, not the whole response,
+# calls of generator entries only take the connect one (see: EntryPoint.stream_read_timeout, EntryOptions.stream)
+TIMEOUT = (3.05, 60)
+
+
+class HttpClient(object):
+    """
+    :param pool_size: max keep-alive connections per host
+    :param pool_block: wait for a free connection when all are busy, instead of opening an extra one
+    :param timeout: default timeout of requests, seconds or (connect, read)
+    :param max_retries: retries of failed connection, requests are not retried once sent
+    """
+
+    def __init__(self, pool_size=POOL_SIZE, pool_block=False, timeout=TIMEOUT, max_retries=0):
+        self.pool_size = pool_size
+        self.pool_block = pool_block
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.errors = 0
+
+    def session(self, url):
+        """
+        :return: session of the host of url
+        """
+        parts = urlparse.urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        session = self._sessions.get(key)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(key)
+                if session is None:
+                    session = self._sessions[key] = self.create_session()
+        return session
+
+    def create_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, pool_block=self.pool_block,
+                              max_retries=self.max_retries)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def request(self, method, url, **kwargs):
+        """
+        same as requests.request, on the pooled session of host
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        try:
+            return self.session(url).request(method, url, **kwargs)
+        except requests.RequestException:
+            with self._lock:
+                self.errors += 1
+            raise
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def _pools(self):
+        for (scheme, netloc), session in self._sessions.items():
+            pools = session.get_adapter(scheme + '://').poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    yield netloc, pool
+
+    def stats(self):
+        """
+        :return: dict, `connections` is tcp connections opened, `reused` is requests sent on a
+            kept-alive one (pool hit), many connections for few requests means the pool is too
+            small or the server closes them
+        """
+        hosts = {}
+        for netloc, pool in self._pools():
+            host = hosts.setdefault(netloc, {'requests': 0, 'connections': 0})
+            host['requests'] += pool.num_requests
+            host['connections'] += pool.num_connections
+        for host in hosts.values():
+            host['reused'] = max(0, host['requests'] - host['connections'])
+        total_requests = sum(host['requests'] for host in hosts.values())
+        total_connections = sum(host['connections'] for host in hosts.values())
+        return {'requests': total_requests, 'connections': total_connections,
+                'reused': max(0, total_requests - total_connections), 'errors': self.errors, 'hosts': hosts}
+
+    def close(self):
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            session.close()
+
+
+def connect_timeout(timeout):
+    """
+    :param timeout: seconds or (connect, read)
+    """
+    return timeout[0] if isinstance(timeout, tuple) else timeout
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def get_client():
+    """
+    :return: default client of process
+    """
+    global _default_client
+    if _default_client is None:
+        with _default_lock:
+            if _default_client is None:
+                _default_client = HttpClient()
+    return _default_client
+
+
+def set_client(client):
+    global _default_client
+    _default_client = client
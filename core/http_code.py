@@ -1,5 +1,15 @@
 # Copyright (c) 2017 App Annie Inc. All rights reserved.
 
+NOT_MODIFIED = 304
+BAD_REQUEST = 400
 NOT_FOUND = 404
+METHOD_NOT_ALLOWED = 405
+REQUEST_ENTITY_TOO_LARGE = 413
+UNSUPPORTED_MEDIA_TYPE = 415
 OK = 200
 INTERNAL_ERROR = 500
+SERVICE_UNAVAILABLE = 503
+GATEWAY_TIMEOUT = 504
+
+# content type of streaming response, one json record per line
+NDJSON = 'application/x-ndjson'
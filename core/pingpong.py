@@ -1,9 +1,11 @@
 # Copyright (c) 2017 App Annie Inc. All rights reserved.
 
+import collections
 import traceback
 
+import deadline
 import utils
-from base import BaseDTO, Serializable
+from base import BaseDTO, DTOList, Serializable
 from fields import String
 from http_code import *
 
@@ -20,59 +22,149 @@ def handle_error(error):
     return Error(msg=str(error), traceback='\n'.join(traceback.format_exception_only(type(error), error)))
 
 
-def pack_result(callback):
+def pack_result(callback, plain=True):
     """
     get the packer which could
     convert entry result to plain dict, add code and error information
     :param entry:
+    :param plain: if False, keep dto in result, they are encoded by encoder (see: core.encoder),
+        conversions which could fail are still done here (see: prepare)
     :return: response dict
     """
 
     response = utils.ObjectDict()
     response.code = OK
+    at = deadline.current()
     try:
+        # caller has given up, no need to call the entry (see: core.deadline)
+        if at is not None:
+            deadline.check(at)
         result = callback()
-        response.data = to_dict(result)
+        response.data = to_dict(result) if plain else prepare(result)
     except Exception, error:
-        traceback.print_exc()
+        # missed deadline is expected under load, its traceback would flood the log
+        if not isinstance(error, deadline.DeadlineExceeded):
+            traceback.print_exc()
         response.code = getattr(error, 'code', INTERNAL_ERROR)
         response.error = handle_error(error).to_dict()
     finally:
         return response
 
 
-def unpack_result(response_dict, dto_type=None):
+def prepare(something):
+    """
+    run what could raise before result is encoded, so the error gets into response:
+    Serializable is converted to dto, lazy dto is validated, json of frozen dto is built,
+    only the plain walk of dto is left to encoder
+
+    the walk of dto which is not frozen still runs while a streamed body is sent
+    (see: encoder.iter_chunks), a value inside which json could not encode is found
+    after status 200 is sent, the body is cut there instead of getting the error response
+    """
+    if isinstance(something, BaseDTO):
+        if something.__frozen__:
+            something.to_json()
+            return something
+        something.validate()
+        if isinstance(something, DTOList) and isinstance(something.__list__, list):
+            for element in something.__list__:
+                prepare(element)
+        return something
+    elif isinstance(something, Serializable):
+        return prepare(something.to_dto())
+    elif isinstance(something, dict):
+        return {k: prepare(v) for k, v in something.iteritems()}
+    elif isinstance(something, (list, tuple, set)):
+        return [prepare(thing) for thing in something]
+    return something
+
+
+def is_stream(result):
+    """
+    entry returns generator or iterator, its items will be streamed one by one
+    """
+    return isinstance(result, collections.Iterator) and not isinstance(result, (BaseDTO, basestring))
+
+
+def pack_stream(iterator):
+    """
+    wrap each item of a streaming result as a record, the last record carries code and error:
+
+        {"data": <item>}
+        {"data": <item>}
+        {"code": 200}
+
+    :param iterator: result of entry
+    :return: generator of record dict, dto inside is not converted (see: core.encoder)
+    """
+    try:
+        for item in iterator:
+            yield {'data': item}
+    except Exception, error:
+        traceback.print_exc()
+        yield {'code': getattr(error, 'code', INTERNAL_ERROR), 'error': handle_error(error).to_dict()}
+    else:
+        yield {'code': OK}
+
+
+def unpack_stream(records, lazy=False):
+    """
+    restore items from records of pack_stream, error in the last record is raised
+    :param records: iterable of decoded record dict
+    :param lazy: see from_dict
+    :return: generator of items
+    """
+    for record in records:
+        if 'data' in record:
+            yield from_dict(record['data'], lazy=lazy)
+            continue
+        error = record.get('error')
+        if error:
+            Error.from_dict(error).reraise()
+        return
+    raise Exception('stream is broken before the last record')
+
+
+def unpack_result(response_dict, dto_type=None, lazy=False):
     error = response_dict.get('error')
 
     if error:
-        error = Error.from_dict(error)
+        if not isinstance(error, Error):
+            error = Error.from_dict(error)
         error.reraise()
     data = response_dict['data']
-    return from_dict(data)
+    return from_dict(data, lazy=lazy)
 
 
 def to_dict(something):
-    if isinstance(something, (list, set)):
+    # dto goes first, it is the most common value of results
+    if isinstance(something, BaseDTO):
+        return something.to_dict()
+    elif isinstance(something, (list, set)):
         return [to_dict(thing) for thing in something]
     elif isinstance(something, dict):
         return {k: to_dict(v) for k, v in something.items()}
     elif isinstance(something, Serializable):
         return something.to_dto().to_dict()
-    elif isinstance(something, BaseDTO):
-        return something.to_dict()
     else:
         return something
 
 
-def from_dict(something):
+def from_dict(something, lazy=False):
+    """
+    :param something: plain data
+    :param lazy: restore dto by `lazy_from_dict`, fields are validated on access
+    """
     if isinstance(something, (list, set)):
-        return [from_dict(thing) for thing in something]
+        return [from_dict(thing, lazy) for thing in something]
     elif isinstance(something, dict):
         __cls__ = something.get('__cls__')
         if __cls__:
             cls = BaseDTO.find(__cls__)
+            if lazy:
+                return cls.lazy_from_dict(something)
             return cls.from_dict(something)
         else:
-            return {k: from_dict(v) for k, v in something.items()}
+            return {k: from_dict(v, lazy) for k, v in something.items()}
     else:
         return something
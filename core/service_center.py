@@ -1,7 +1,8 @@
 # Copyright (c) 2017 App Annie Inc. All rights reserved.
 from application.core.signature import is_classmethod
+import batch
 from base import ServiceBaseMeta
-from entry_point import EntryPoint
+from entry_point import EntryOptions, EntryPoint
 from signature import is_method
 
 
@@ -9,7 +10,8 @@ class WebServiceCenter(object):
     _entry_points_ = {}
 
     @classmethod
-    def expose(cls, path=None, methods=None, key=None, retype=None, client_mode=False, on_class=False, **args_types):
+    def expose(cls, path=None, methods=None, key=None, retype=None, client_mode=False, on_class=False, options=None,
+               **args_types):
         """
         :param path: url patter for this entry
         :param methods: should be GET or POST, some entry can only support POST due to the
@@ -18,6 +20,12 @@ class WebServiceCenter(object):
             function & class
         :param retype: return type, this type is only used for schema definition, if specified DTO
             of Field type of retype, client can restore it after get response json data.
+        :param options: EntryOptions, cache of responses, single flight of identical calls and version
+            hook for ETag of the entry, for example:
+
+                @expose(options=EntryOptions(cache=ResponseCache(ttl=300), single_flight=True), market=str)
+                def get_categories(market):
+                    pass
         :param args_types: input params signature, this is very useful for send & handle request, basically
             every callable entry points has some arguments, and we have many ways to transport it on
             http, here we only support GET and POST method, in GET method, we pack and encode all params
@@ -53,7 +61,7 @@ class WebServiceCenter(object):
                 entry = EntryPoint(f, args_types,
                                    path=path, methods=methods,
                                    key=key, retype=retype,
-                                   client_mode=client_mode, on_class=oc)
+                                   client_mode=client_mode, on_class=oc, options=options)
                 cls.add_entry(entry)
                 return entry
 
@@ -82,9 +90,9 @@ class WebServiceCenter(object):
         return decorator
 
     @classmethod
-    def remote(cls, path=None, methods=None, key=None, retype=None, on_class=False, **args_types):
+    def remote(cls, path=None, methods=None, key=None, retype=None, on_class=False, options=None, **args_types):
         return cls.expose(path=path, methods=methods, key=key, retype=retype,
-                          client_mode=True, on_class=on_class, **args_types)
+                          client_mode=True, on_class=on_class, options=options, **args_types)
 
     @classmethod
     def add_entry(cls, ep):
@@ -100,25 +108,28 @@ class WebServiceCenter(object):
     def bind_web_interface(cls, web_interface):
         for entry in cls._entry_points_.values():
             web_interface.register(entry)
+        # calls sent together by client (see: core.batch)
+        web_interface.register(EntryPoint(batch.dispatcher(cls._entry_points_), {}, path=batch.BATCH_PATH,
+                                          key=batch.BATCH_KEY))
 
     @classmethod
     def register(cls, function, path=None, methods=None, key=None, retype=None, client_mode=False, on_class=False,
-                 **args_types):
+                 options=None, **args_types):
         on_class_method = is_classmethod(function)
         on_method = is_method(function)
         on_class = on_class_method or on_method or on_class
         entry = EntryPoint(function, args_types,
                            path=path, methods=methods,
                            key=key, retype=retype,
-                           client_mode=client_mode, on_class=on_class)
+                           client_mode=client_mode, on_class=on_class, options=options)
         cls.add_entry(entry)
         return entry
 
     @classmethod
     def register_remote(cls, function, path=None, methods=None, key=None, retype=None,
-                        on_class=False,
+                        on_class=False, options=None,
                         **args_types):
-        entry = cls.register(function, path, methods, key, retype, True, on_class, **args_types)
+        entry = cls.register(function, path, methods, key, retype, True, on_class, options, **args_types)
         entry.signature.replace_original(entry)
 
 # alias
@@ -0,0 +1,6 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+"""
+tests of core, run with tests of the app from root of repo by
+
+    python -m unittest discover
+"""
@@ -0,0 +1,344 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+import copy
+import datetime
+import json
+import pickle
+import unittest
+
+from ..base import BaseDTO
+from ..fields import DateField, Dict, DTOField, Int, List, String
+
+
+class Compact(BaseDTO):
+    __compact__ = True
+
+    market = String()
+    category_id = Int()
+    tags = List(element_type=String(), can_be_none=True)
+
+
+class Positive(Int):
+
+    def _validate(self, value):
+        if value <= 0:
+            raise ValueError('%s should be positive' % self)
+
+
+class Row(BaseDTO):
+    name = String()
+    count = Positive()
+
+
+class Holder(BaseDTO):
+    row = DTOField(dto_class=Row, can_be_none=True)
+
+
+class FrozenTag(BaseDTO):
+    __frozen__ = True
+
+    name = String()
+
+
+class Frozen(BaseDTO):
+    __compact__ = True
+    __frozen__ = True
+
+    market = String()
+    tags = List(element_type=String())
+    main = DTOField(dto_class=FrozenTag, can_be_none=True)
+
+
+class Interned(BaseDTO):
+    __compact__ = True
+    __frozen__ = True
+    __intern__ = 16
+
+    market = String()
+    tags = List(element_type=String())
+
+
+class FrozenPlain(BaseDTO):
+    __frozen__ = True
+
+    tags = List(element_type=String())
+    extra = Dict(can_be_none=True)
+
+
+class SerialParent(BaseDTO):
+    name = String()
+
+
+class SerialChild(BaseDTO):
+    count = Int(default=3)
+    day = DateField(can_be_none=True)
+    parent = DTOField(dto_class=SerialParent, can_be_none=True)
+    parents = List(element_type=DTOField(dto_class=SerialParent, can_be_none=True), can_be_empty=True)
+    extra = Dict(can_be_none=True)
+
+
+class SerialCompactChild(BaseDTO):
+    __compact__ = True
+
+    count = Int(default=3)
+    day = DateField(can_be_none=True)
+    parent = DTOField(dto_class=SerialParent, can_be_none=True)
+    parents = List(element_type=DTOField(dto_class=SerialParent, can_be_none=True), can_be_empty=True)
+    extra = Dict(can_be_none=True)
+
+
+def make_frozen(market='ios'):
+    return Frozen(market=market, tags=['a', 'b'], main=FrozenTag(name='x'))
+
+
+class CompactDTOTest(unittest.TestCase):
+
+    def test_values_are_kept_in_slots(self):
+        dto = Compact(market='ios', category_id=1)
+        self.assertFalse(hasattr(dto, '__dict__'))
+        self.assertEqual(dto.market, 'ios')
+        self.assertEqual(dto.category_id, 1)
+        self.assertIsNone(dto.tags)
+
+    def test_positional_args_follow_declared_order(self):
+        dto = Compact('gp', 2, ['a'])
+        self.assertEqual((dto.market, dto.category_id, dto.tags), ('gp', 2, ['a']))
+
+    def test_values_are_validated(self):
+        self.assertRaises(TypeError, Compact, market='ios', category_id='1')
+        self.assertRaises(TypeError, Compact, market=None, category_id=1)
+        dto = Compact(market='ios', category_id=1)
+        with self.assertRaises(TypeError):
+            dto.category_id = 'x'
+        dto.category_id = 3
+        self.assertEqual(dto.category_id, 3)
+
+    def test_dict_round_trip(self):
+        dto = Compact(market='ios', category_id=1, tags=['a', 'b'])
+        dikt = dto.to_dict()
+        self.assertEqual(dikt, {'__cls__': 'Compact', 'market': 'ios', 'category_id': 1, 'tags': ['a', 'b']})
+        self.assertEqual(Compact.from_dict(dikt).to_dict(), dikt)
+
+    def test_field_name_should_be_identifier(self):
+        with self.assertRaises(TypeError):
+            class BadSlotName(BaseDTO):
+                __compact__ = True
+                value = Int(name='not identifier')
+
+    def test_compact_cannot_define_init(self):
+        with self.assertRaises(TypeError):
+            class CompactWithInit(BaseDTO):
+                __compact__ = True
+                value = Int()
+
+                def __init__(self, **kwargs):
+                    pass
+
+
+
+class ValidateManyTest(unittest.TestCase):
+
+    def test_valid_rows(self):
+        kwargs_list, errors = Row.validate_many([{'name': 'a', 'count': 1}, {'name': 'b', 'count': 2}])
+        self.assertEqual(errors, {})
+        self.assertEqual(kwargs_list, [{'name': 'a', 'count': 1}, {'name': 'b', 'count': 2}])
+
+    def test_errors_are_collected_per_row(self):
+        kwargs_list, errors = Row.validate_many([{'name': 'a', 'count': 'x'}, {'name': 'b', 'count': 2},
+                                                 {'name': None, 'count': 0}])
+        self.assertEqual(sorted(errors), [0, 2])
+        self.assertEqual(len(errors[2]), 2)
+        self.assertEqual(kwargs_list, [None, {'name': 'b', 'count': 2}, None])
+
+    def test_row_which_is_not_dict_gets_one_error(self):
+        kwargs_list, errors = Row.validate_many([['a', 1], {'name': 'b', 'count': 2}])
+        self.assertEqual(len(errors[0]), 1)
+        self.assertIn('should be dict', errors[0][0])
+        self.assertEqual(kwargs_list[1], {'name': 'b', 'count': 2})
+
+    def test_from_dicts_builds_nested_dto(self):
+        dtos, errors = Holder.from_dicts([{'row': {'name': 'a', 'count': 1}}, {'row': {'name': 'b', 'count': -1}},
+                                          {'row': None}])
+        self.assertEqual(sorted(errors), [1])
+        self.assertEqual(dtos[0].row.name, 'a')
+        self.assertIsNone(dtos[1])
+        self.assertIsNone(dtos[2].row)
+
+
+class FrozenDTOTest(unittest.TestCase):
+
+    def test_cannot_be_changed(self):
+        dto = make_frozen()
+        with self.assertRaises(TypeError):
+            dto.market = 'gp'
+
+    def test_hash_and_eq_by_values(self):
+        self.assertEqual(make_frozen(), make_frozen())
+        self.assertEqual(hash(make_frozen()), hash(make_frozen()))
+        self.assertNotEqual(make_frozen('ios'), make_frozen('gp'))
+        self.assertEqual(len({make_frozen(), make_frozen(), make_frozen('gp')}), 2)
+
+    def test_dict_is_cached_and_read_only(self):
+        dto = make_frozen()
+        dikt = dto.to_dict()
+        self.assertIs(dto.to_dict(), dikt)
+        self.assertIs(dikt['main'], dto.main.to_dict())
+        self.assertRaises(TypeError, dikt.__setitem__, 'market', 'gp')
+        self.assertRaises(TypeError, dikt.update, {'market': 'gp'})
+        self.assertRaises(TypeError, dikt['tags'].append, 'c')
+        self.assertRaises(TypeError, dikt['main'].pop, 'name')
+        self.assertEqual(dto.to_dict()['market'], 'ios')
+
+    def test_copy_of_dict_is_plain(self):
+        dikt = make_frozen().to_dict()
+        for copied in (copy.deepcopy(dikt), pickle.loads(pickle.dumps(dikt, 2))):
+            self.assertIs(type(copied), dict)
+            self.assertIs(type(copied['tags']), list)
+            copied['tags'].append('c')
+            copied['main']['name'] = 'y'
+            self.assertEqual(copied['tags'], ['a', 'b', 'c'])
+        self.assertEqual(dikt['tags'], ['a', 'b'])
+        self.assertEqual(dikt['main']['name'], 'x')
+
+    def test_dict_and_json_round_trip(self):
+        dto = make_frozen()
+        self.assertEqual(Frozen.from_dict(dto.to_dict()), dto)
+        self.assertEqual(json.loads(dto.to_json()), dto.to_dict())
+        self.assertEqual(Frozen.from_dict(json.loads(dto.to_json())), dto)
+
+
+class InternTest(unittest.TestCase):
+
+    def test_same_values_share_instance(self):
+        dto = Interned(market='ios', tags=['a'])
+        self.assertIs(Interned(market='ios', tags=['a']), dto)
+        self.assertIs(Interned('ios', ['a']), dto)
+        self.assertIsNot(Interned(market='gp', tags=['a']), dto)
+
+    def test_every_way_of_building_is_interned(self):
+        dto = Interned(market='ios', tags=['a'])
+        dikt = {'market': 'ios', 'tags': ['a']}
+        self.assertIs(Interned.from_dict(dikt), dto)
+        self.assertIs(Interned.lazy_from_dict(dikt), dto)
+        dtos, errors = Interned.from_dicts([dikt, dict(dikt)])
+        self.assertEqual(errors, {})
+        self.assertIs(dtos[0], dto)
+        self.assertIs(dtos[1], dto)
+
+    def test_should_be_frozen(self):
+        with self.assertRaises(TypeError):
+            class InternedNotFrozen(BaseDTO):
+                __intern__ = 16
+                market = String()
+
+
+class FrozenContainerTest(unittest.TestCase):
+
+    def assert_read_only(self, dto, tags):
+        tags.append('changed')
+        self.assertEqual(dto.tags, ['a'])
+        self.assertRaises(TypeError, dto.tags.append, 'b')
+
+    def test_arguments_are_copied(self):
+        for kls in (Frozen, FrozenPlain):
+            tags = ['a']
+            self.assert_read_only(kls(tags=tags, market='ios'), tags)
+        extra = {'k': [1]}
+        dto = FrozenPlain(tags=['a'], extra=extra)
+        extra['k'].append(2)
+        self.assertEqual(dto.extra, {'k': [1]})
+        self.assertRaises(TypeError, dto.extra.__setitem__, 'k', 3)
+
+    def test_bulk_and_lazy_values_are_copied(self):
+        for kls in (Frozen, FrozenPlain):
+            tags = ['a']
+            dtos, errors = kls.from_dicts([{'market': 'ios', 'tags': tags}])
+            self.assert_read_only(dtos[0], tags)
+            tags = ['a']
+            dto = kls.lazy_from_dict({'market': 'ios', 'tags': tags})
+            # raw dict is owned by lazy dto, values are copied when the field is read
+            self.assertEqual(dto.tags, ['a'])
+            self.assert_read_only(dto, tags)
+
+
+class SerializerTest(unittest.TestCase):
+
+    def make(self, kls):
+        return kls(count=1, day=datetime.date(2017, 1, 2), parent=SerialParent(name='a'),
+                   parents=[SerialParent(name='b'), None], extra={'k': [1]})
+
+    def test_dump(self):
+        for kls in (SerialChild, SerialCompactChild):
+            dikt = self.make(kls).to_dict()
+            self.assertEqual(dikt, {'__cls__': kls.__name__, 'count': 1, 'day': datetime.date(2017, 1, 2),
+                                    'parent': {'__cls__': 'SerialParent', 'name': 'a'},
+                                    'parents': [{'__cls__': 'SerialParent', 'name': 'b'}, None],
+                                    'extra': {'k': [1]}})
+
+    def test_dump_is_fresh_dict(self):
+        for kls in (SerialChild, SerialCompactChild):
+            dto = self.make(kls)
+            dikt = dto.to_dict()
+            dikt['count'] = 2
+            dikt['parents'].append(None)
+            self.assertEqual(dto.count, 1)
+            self.assertEqual(len(dto.to_dict()['parents']), 2)
+
+    def test_load(self):
+        for kls in (SerialChild, SerialCompactChild):
+            dto = kls.from_dict(self.make(kls).to_dict())
+            self.assertIsInstance(dto.parent, SerialParent)
+            self.assertEqual([type(parent) for parent in dto.parents], [SerialParent, type(None)])
+            self.assertEqual(dto.to_dict(), self.make(kls).to_dict())
+
+    def test_load_defaults_and_unknown_keys(self):
+        for kls in (SerialChild, SerialCompactChild):
+            dto = kls.from_dict({'parents': [], 'unknown': 1})
+            self.assertEqual(dto.count, 3)
+            self.assertIsNone(dto.parent)
+            self.assertNotIn('unknown', dto.to_dict())
+
+    def test_load_validates(self):
+        for kls in (SerialChild, SerialCompactChild):
+            with self.assertRaises(TypeError):
+                kls.from_dict({'parents': [], 'count': 'a'})
+            with self.assertRaises(TypeError):
+                kls.from_dict({'parents': [{'name': 1}]})
+            with self.assertRaises(TypeError):
+                kls.from_dict({})
+
+
+class LazyTest(unittest.TestCase):
+
+    def test_field_is_validated_on_access(self):
+        for kls in (SerialChild, SerialCompactChild):
+            dto = kls.lazy_from_dict({'count': 'a', 'parents': []})
+            self.assertEqual(dto.parents, [])
+            with self.assertRaises(TypeError):
+                dto.count
+            # a bad field not accessed does not break the others
+            self.assertIsNone(kls.lazy_from_dict({'count': 'a', 'parents': []}).parent)
+
+    def test_nested_dto_is_lazy(self):
+        for kls in (SerialChild, SerialCompactChild):
+            dto = kls.lazy_from_dict({'parent': {'name': 1}, 'parents': [{'name': 'b'}, None]})
+            self.assertIsInstance(dto.parent, SerialParent)
+            self.assertEqual(dto.parents[0].name, 'b')
+            with self.assertRaises(TypeError):
+                dto.parent.name
+
+    def test_validate(self):
+        for kls in (SerialChild, SerialCompactChild):
+            dto = kls.lazy_from_dict({'parents': [{'name': 'b'}], 'day': '_date:2017-01-02'})
+            self.assertIs(dto.validate(), dto)
+            self.assertEqual(dto.day, datetime.date(2017, 1, 2))
+            self.assertEqual(dto.to_dict(), kls.from_dict(dto.to_dict()).to_dict())
+            with self.assertRaises(TypeError):
+                kls.lazy_from_dict({'parents': [{'name': 1}]}).validate()
+            with self.assertRaises(TypeError):
+                kls.lazy_from_dict({'parents': [], 'count': 'a'}).to_dict()
+
+    def test_assigned_field_is_not_loaded(self):
+        for kls in (SerialChild, SerialCompactChild):
+            dto = kls.lazy_from_dict({'count': 'a', 'parents': []})
+            dto.count = 5
+            self.assertEqual(dto.validate().count, 5)
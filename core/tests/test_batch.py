@@ -0,0 +1,143 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+import threading
+import unittest
+
+from .. import aio, batch
+from ..batch import Batch
+from ..entry_point import EntryPoint
+from ..fields import Int, String
+from ..http_client import HttpClient
+from ..web_interface import AsyncInterface
+
+
+def batch_add(a, b):
+    return a + b
+
+
+def batch_fail(a):
+    raise ValueError('failed %s' % a)
+
+
+def batch_count(n):
+    for i in range(n):
+        yield i
+
+
+def batch_text(name):
+    return 'hello %s' % name
+
+
+@aio.coroutine
+def batch_coroutine():
+    yield aio.sleep(0)
+
+
+def stub(*args, **kwargs):
+    pass
+
+
+def make_entries():
+    entries = [EntryPoint(batch_add, {'a': Int(), 'b': Int()}, key='batch_add'),
+               EntryPoint(batch_fail, {'a': Int()}, key='batch_fail'),
+               EntryPoint(batch_count, {'n': Int()}, key='batch_count'),
+               EntryPoint(batch_text, {'name': String()}, key='batch_text', retype=String()),
+               EntryPoint(batch_coroutine, {}, key='batch_coroutine'),
+               EntryPoint(batch_add, {}, key='batch_remote', client_mode=True)]
+    return {entry.key: entry for entry in entries}
+
+
+class DispatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.entries = make_entries()
+        self.dispatch = batch.dispatcher(self.entries)
+
+    def codes(self, calls):
+        return [response['code'] for response in self.dispatch(calls)]
+
+    def test_each_call_is_packed_apart(self):
+        responses = self.dispatch([{'key': 'batch_add', 'args': {'a': '1', 'b': '2'}},
+                                   {'key': 'batch_fail', 'args': {'a': '1'}},
+                                   {'key': 'batch_count', 'args': {'n': '3'}},
+                                   {'key': 'batch_text', 'args': {'name': 'x'}}])
+        self.assertEqual([response['code'] for response in responses], [200, 500, 200, 200])
+        self.assertEqual(responses[0]['data'], 3)
+        self.assertEqual(responses[1]['error']['msg'], 'failed 1')
+        self.assertEqual(responses[2]['data'], [0, 1, 2])
+        self.assertEqual(responses[3]['data'], 'hello x')
+
+    def test_unknown_and_malformed_calls(self):
+        calls = [{'key': 'no_such_entry'}, {'key': 'batch_remote'}, {'key': ['batch_add']}, 'batch_add',
+                 {'key': 'batch_add', 'args': [1, 2]}, {'key': 'batch_coroutine'},
+                 {'key': 'batch_add', 'args': {'a': '1', 'b': '2'}}]
+        self.assertEqual(self.codes(calls), [404, 404, 404, 400, 400, 500, 200])
+
+    def test_entries_added_later_are_found(self):
+        self.entries['batch_later'] = EntryPoint(batch_add, {}, key='batch_later')
+        self.assertEqual(self.dispatch([{'key': 'batch_later', 'args': {'a': 1, 'b': 2}}])[0]['data'], 3)
+
+
+class BatchTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        entries = make_entries()
+        cls.interface = AsyncInterface(port=0, loop=aio.EventLoop())
+        for entry in entries.values():
+            if not entry.client_mode:
+                cls.interface.register(entry)
+        cls.interface.register(EntryPoint(batch.dispatcher(entries), {}, path=batch.BATCH_PATH, key=batch.BATCH_KEY))
+        cls.interface.listen()
+        thread = threading.Thread(target=cls.interface.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def setUp(self):
+        client = HttpClient()
+        self.add = self.remote('batch_add', {'a': Int(), 'b': Int()}, client)
+        self.fail = self.remote('batch_fail', {'a': Int()}, client)
+
+    def remote(self, key, fields, client):
+        def call(a, b=None):
+            pass
+
+        entry = EntryPoint(call, fields, key=key, client_mode=True)
+        entry.host = 'http://127.0.0.1:%d' % self.interface.port
+        entry.http_client = client
+        return entry
+
+    def test_calls_are_sent_together(self):
+        with Batch() as pending:
+            first = self.add(1, 2)
+            failed = self.fail(1)
+            last = self.add(3, 4)
+            self.assertFalse(first.done())
+        self.assertEqual(pending.requests, 1)
+        self.assertEqual(first.result(), 3)
+        self.assertEqual(last.result(), 7)
+        with self.assertRaises(Exception) as raised:
+            failed.result()
+        self.assertIn('failed 1', str(raised.exception))
+
+    def test_reading_result_sends_batch(self):
+        with Batch() as pending:
+            first = self.add(1, 2)
+            self.assertEqual(first.result(), 3)
+            second = self.add(2, 2)
+        self.assertEqual(pending.requests, 2)
+        self.assertEqual(second.result(), 4)
+
+    def test_split_by_max_size(self):
+        with Batch(max_size=2) as pending:
+            results = [self.add(i, i) for i in range(5)]
+        self.assertEqual(pending.requests, 3)
+        self.assertEqual([future.result() for future in results], [0, 2, 4, 6, 8])
+
+    def test_error_in_batch_cancels_calls(self):
+        with self.assertRaises(KeyError):
+            with Batch() as pending:
+                future = self.add(1, 2)
+                raise KeyError('stop')
+        self.assertEqual(pending.requests, 0)
+        with self.assertRaises(aio.CancelledError):
+            future.result()
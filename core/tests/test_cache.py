@@ -0,0 +1,314 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+import json
+import threading
+import time
+import unittest
+
+import flask
+import requests
+
+from .. import aio
+from ..base import BaseDTO
+from ..cache import ResponseCache, SingleFlight, canonical_key
+from ..entry_point import EntryOptions, EntryPoint
+from ..fields import Int, String
+from ..web_interface import AsyncInterface, FlaskInterface
+
+calls = []
+released = threading.Event()
+# loop of interface, coroutine entries sleep in it
+flight_loop = aio.EventLoop()
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CacheRank(BaseDTO):
+    market = String()
+    rank = Int()
+
+
+def cache_ranks(market, n=2):
+    calls.append((market, n))
+    if market == 'bad':
+        raise ValueError('no such market')
+    return [CacheRank(market=market, rank=i) for i in range(n)]
+
+
+def cache_text(name):
+    calls.append(name)
+    return 'hello %s' % name
+
+
+def flight_load(n):
+    calls.append(n)
+    released.wait(5)
+    return n * 2
+
+
+@aio.coroutine
+def flight_wait(n):
+    calls.append(n)
+    yield flight_loop.sleep(0.2)
+    raise aio.Return(n * 2)
+
+
+def wait_for(condition, timeout=5):
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        time.sleep(0.01)
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+
+    def test_lru(self):
+        cache = ResponseCache(max_entries=2, clock=self.clock)
+        cache.set('a', 'x')
+        cache.set('b', 'x')
+        self.assertEqual(cache.get('a'), 'x')
+        cache.set('c', 'x')
+        # b is the least recently used one
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 'x')
+        self.assertEqual(cache.get('c'), 'x')
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_ttl(self):
+        cache = ResponseCache(ttl=10, clock=self.clock)
+        cache.set('a', 'xyz')
+        self.clock.now += 9
+        self.assertEqual(cache.get('a'), 'xyz')
+        self.clock.now += 1
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats(), {'size': 0, 'bytes': 0, 'hits': 1, 'misses': 1, 'evictions': 0,
+                                         'expirations': 1})
+        cache = ResponseCache(ttl=None, clock=self.clock)
+        cache.set('a', 'xyz')
+        self.clock.now += 10 ** 6
+        self.assertEqual(cache.get('a'), 'xyz')
+
+    def test_bytes(self):
+        cache = ResponseCache(max_bytes=10, clock=self.clock)
+        cache.set('a', 'x' * 4)
+        cache.set('b', 'x' * 4)
+        self.assertEqual(cache.bytes, 8)
+        cache.set('a', 'x' * 2)
+        self.assertEqual(cache.bytes, 6)
+        cache.set('c', 'x' * 6)
+        # b is evicted to fit c in, a was updated later
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.bytes, 8)
+        # too large to be stored at all
+        cache.set('d', 'x' * 11)
+        self.assertIsNone(cache.get('d'))
+        self.assertEqual(len(cache), 2)
+        cache.set('e', ('type', 'body'), size=10)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.bytes, 10)
+
+    def test_invalidate(self):
+        cache = ResponseCache(clock=self.clock)
+        for key in ('a1', 'a2', 'b1'):
+            cache.set(key, 'xx')
+        cache.invalidate('a1')
+        self.assertIsNone(cache.get('a1'))
+        cache.invalidate_if(lambda key: key.startswith('a'))
+        self.assertEqual((len(cache), cache.bytes), (1, 2))
+        cache.invalidate()
+        self.assertEqual((len(cache), cache.bytes), (0, 0))
+
+    def test_canonical_key(self):
+        self.assertEqual(canonical_key({'a': 1, 'b': [1, 2]}), canonical_key({'b': [1, 2], 'a': 1}))
+        self.assertNotEqual(canonical_key('a', 1), canonical_key('a', '1'))
+        with self.assertRaises(TypeError):
+            canonical_key(object())
+
+
+class CachedEntryTest(unittest.TestCase):
+
+    def setUp(self):
+        del calls[:]
+        app = flask.Flask(__name__)
+        interface = FlaskInterface(app)
+        self.ranks = EntryPoint(cache_ranks, {'market': String(), 'n': Int(default=2)}, key='cache_ranks',
+                                options=EntryOptions(cache=ResponseCache(ttl=None)))
+        self.text = EntryPoint(cache_text, {'name': String()}, key='cache_text', retype=String(),
+                               options=EntryOptions(cache=True))
+        interface.register(self.ranks)
+        interface.register(self.text)
+        self.client = app.test_client()
+
+    def get(self, path, **headers):
+        return self.client.get(path, headers=headers)
+
+    def test_hit_sends_stored_body(self):
+        first = self.get('/invoke/cache_ranks?market=ios&n=3')
+        second = self.get('/invoke/cache_ranks?n=3&market=ios')
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual([rank['rank'] for rank in json.loads(second.data)['data']], [0, 1, 2])
+        self.assertEqual(calls, [('ios', 3)])
+        self.assertEqual(self.ranks.cache.stats()['hits'], 1)
+
+    def test_key_by_args_and_format(self):
+        self.get('/invoke/cache_ranks?market=ios')
+        # same args after conversion
+        self.client.post('/invoke/cache_ranks', data='{"market": "ios", "n": 2}', content_type='application/json')
+        self.get('/invoke/cache_ranks?market=gp')
+        binary = self.get('/invoke/cache_ranks?market=ios', Accept='application/x-aa-binary')
+        self.assertEqual(binary.mimetype, 'application/x-aa-binary')
+        self.assertEqual(calls, [('ios', 2), ('gp', 2), ('ios', 2)])
+
+    def test_compressed_variant(self):
+        plain = self.get('/invoke/cache_ranks?market=ios&n=500')
+        gzipped = self.get('/invoke/cache_ranks?market=ios&n=500', **{'Accept-Encoding': 'gzip'})
+        self.assertEqual(gzipped.headers.get('Content-Encoding'), 'gzip')
+        self.assertIsNone(plain.headers.get('Content-Encoding'))
+        self.assertEqual(len(calls), 1)
+
+    def test_errors_are_not_stored(self):
+        for i in range(2):
+            self.assertEqual(self.get('/invoke/cache_ranks?market=bad').status_code, 500)
+        self.assertEqual(calls, [('bad', 2), ('bad', 2)])
+        self.assertEqual(len(self.ranks.cache), 0)
+
+    def test_text(self):
+        self.assertEqual(self.get('/invoke/cache_text?name=x').data, 'hello x')
+        self.assertEqual(self.get('/invoke/cache_text?name=x').data, 'hello x')
+        self.assertEqual(calls, ['x'])
+
+    def test_invalidate_cache(self):
+        self.get('/invoke/cache_ranks?market=ios')
+        self.get('/invoke/cache_ranks?market=ios', Accept='application/x-aa-binary')
+        self.get('/invoke/cache_ranks?market=gp')
+        self.ranks.invalidate_cache(market='ios', n=2)
+        self.assertEqual(len(self.ranks.cache), 1)
+        self.get('/invoke/cache_ranks?market=ios')
+        self.ranks.invalidate_cache()
+        self.get('/invoke/cache_ranks?market=gp')
+        self.assertEqual(calls, [('ios', 2), ('ios', 2), ('gp', 2), ('ios', 2), ('gp', 2)])
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def setUp(self):
+        released.clear()
+        self.flight = SingleFlight()
+
+    def run_all(self, keys, func):
+        results = [None] * len(keys)
+
+        def run(i):
+            try:
+                results[i] = self.flight.do(keys[i], func)
+            except Exception, error:
+                results[i] = error
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(len(keys))]
+        for thread in threads:
+            thread.start()
+        # the leader is held till all the others wait for it
+        wait_for(lambda: self.flight.stats()['shared'] + self.flight.stats()['executions'] == len(keys))
+        released.set()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_calls_share_one_execution(self):
+        def load():
+            released.wait(5)
+            return object()
+
+        results = self.run_all(['a'] * 5, load)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(self.flight.stats(), {'executions': 1, 'shared': 4, 'in_flight': 0})
+        # nothing is kept after the execution
+        self.assertIsNot(self.flight.do('a', object), results[0])
+
+    def test_keys_run_apart(self):
+        def load():
+            released.wait(5)
+            return object()
+
+        results = self.run_all(['a', 'b', 'a', 'b'], load)
+        self.assertEqual(self.flight.stats()['executions'], 2)
+        self.assertIs(results[0], results[2])
+        self.assertIs(results[1], results[3])
+        self.assertIsNot(results[0], results[1])
+
+    def test_error_is_raised_in_all(self):
+        def fail():
+            released.wait(5)
+            raise ValueError('failed')
+
+        results = self.run_all(['a'] * 3, fail)
+        self.assertIsInstance(results[0], ValueError)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(self.flight.stats()['in_flight'], 0)
+
+    def test_share(self):
+        first = self.flight.share('a', aio.Future)
+        self.assertIs(self.flight.share('a', aio.Future), first)
+        self.assertIsNot(self.flight.share('b', aio.Future), first)
+        self.assertEqual(self.flight.stats(), {'executions': 2, 'shared': 1, 'in_flight': 2})
+        first.set_result(1)
+        self.assertIsNot(self.flight.share('a', aio.Future), first)
+
+
+class SingleFlightEntryTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        options = EntryOptions(single_flight=True)
+        cls.load = EntryPoint(flight_load, {'n': Int()}, key='flight_load', options=options)
+        cls.wait = EntryPoint(flight_wait, {'n': Int()}, key='flight_wait', options=options)
+        cls.interface = AsyncInterface(port=0, loop=flight_loop)
+        cls.interface.register(cls.load)
+        cls.interface.register(cls.wait)
+        cls.interface.listen()
+        thread = threading.Thread(target=cls.interface.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def setUp(self):
+        del calls[:]
+        released.clear()
+
+    def get_all(self, paths, started):
+        results = [None] * len(paths)
+
+        def get(i):
+            url = 'http://127.0.0.1:%d%s' % (self.interface.port, paths[i])
+            results[i] = requests.get(url, timeout=5).json()['data']
+
+        threads = [threading.Thread(target=get, args=(i,)) for i in range(len(paths))]
+        for thread in threads:
+            thread.start()
+        wait_for(started)
+        released.set()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_requests_share_one_call(self):
+        flight = self.load.single_flight
+        executions = flight.executions
+        results = self.get_all(['/invoke/flight_load?n=2', '/invoke/flight_load?n=02',
+                                '/invoke/flight_load?n=3', '/invoke/flight_load?n=2'],
+                               lambda: flight.shared + flight.executions - executions == 4)
+        self.assertEqual(results, [4, 4, 6, 4])
+        self.assertEqual(sorted(calls), [2, 3])
+
+    def test_coroutine_shares_task(self):
+        results = self.get_all(['/invoke/flight_wait?n=1'] * 3, lambda: True)
+        self.assertEqual(results, [2, 2, 2])
+        self.assertEqual(calls, [1])
@@ -0,0 +1,152 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+import datetime
+import unittest
+
+from .. import codec
+from ..base import BaseDTO, DTOList
+from ..codec import BINARY_CODEC, HEADER, INT32, JSON_CODEC, UINT16, UINT32, CodecError
+from ..fields import DateField, DTOField, Int, List, String
+
+
+class CodecParent(BaseDTO):
+    name = String()
+
+
+class CodecCategory(BaseDTO):
+    market = String()
+    category_id = Int()
+    start_date = DateField()
+    tags = List(element_type=String(), can_be_empty=True)
+    parent = DTOField(dto_class=CodecParent, can_be_none=True)
+
+
+class CodecCategoryList(DTOList):
+    __type__ = CodecCategory
+
+
+def make_category(category_id=1, parent=None):
+    return CodecCategory(market='ios', category_id=category_id, start_date=datetime.date(2017, 1, 2),
+                         tags=['a', 'b'], parent=parent)
+
+
+def round_trip(o):
+    return BINARY_CODEC.decode(BINARY_CODEC.encode(o))
+
+
+class BinaryCodecTest(unittest.TestCase):
+
+    def test_plain_values(self):
+        values = [None, True, False, 0, -1, 2 ** 31 - 1, -2 ** 31, 2 ** 31, -2 ** 63, 2 ** 63, -2 ** 70,
+                  1.5, '', 'abc', u'\u4e2d\u6587', datetime.date(2017, 1, 2)]
+        for value in values:
+            decoded = round_trip(value)
+            self.assertEqual(decoded, value)
+            self.assertIs(type(decoded) is bool, type(value) is bool)
+        self.assertEqual(round_trip({'a': [1, 'b', None], u'c': {'d': 2.5}}), {'a': [1, 'b', None], u'c': {'d': 2.5}})
+        self.assertEqual(round_trip((1, 2)), [1, 2])
+
+    def test_dto(self):
+        categories = [make_category(1, CodecParent(name='root')), make_category(2), make_category(3)]
+        decoded = round_trip(categories)
+        self.assertEqual([type(category) for category in decoded], [CodecCategory] * 3)
+        self.assertEqual([category.to_dict() for category in decoded], [category.to_dict() for category in categories])
+        self.assertEqual(decoded[0].parent.name, 'root')
+        self.assertEqual(decoded[0].start_date, datetime.date(2017, 1, 2))
+
+    def test_class_is_defined_once(self):
+        data = BINARY_CODEC.encode([make_category(i) for i in range(10)])
+        self.assertEqual(data.count('CodecCategory'), 1)
+
+    def test_dto_list_and_dumped_dto(self):
+        dto_list = CodecCategoryList([make_category(1), make_category(2)])
+        decoded = round_trip(dto_list)
+        self.assertIsInstance(decoded, CodecCategoryList)
+        self.assertEqual(decoded.to_dict(), dto_list.to_dict())
+        # dict dumped from dto is restored as dto, like json with `__cls__`
+        decoded = round_trip(make_category(1).to_dict())
+        self.assertIsInstance(decoded, CodecCategory)
+
+    def test_not_encodable(self):
+        with self.assertRaises(CodecError):
+            BINARY_CODEC.encode({'a': object()})
+
+    def test_malformed(self):
+        data = BINARY_CODEC.encode([make_category(1), make_category(2)])
+        name = 'CodecCategory'
+        broken = [
+            '',
+            'AA',
+            'XYZ' + data[3:],
+            HEADER[:-1] + chr(99) + data[len(HEADER):],
+            HEADER + '?',
+            data[:len(data) // 2],
+            data[:-1],
+            HEADER + 's' + UINT32.pack(100) + 'abc',
+            data.replace(name, 'CodecNoSuch'),
+            # row of class which is not defined in the payload
+            HEADER + 'O' + UINT16.pack(7),
+            HEADER + 'l' + UINT32.pack(2 ** 31),
+            # values which could not be restored
+            HEADER + 'D' + INT32.pack(0),
+            HEADER + 'L' + UINT32.pack(3) + 'abc',
+            HEADER + 'u' + UINT32.pack(2) + '\xff\xfe',
+            HEADER + 't' + UINT32.pack(3) + 'abc',
+        ]
+        for payload in broken:
+            with self.assertRaises(CodecError):
+                BINARY_CODEC.decode(payload)
+
+
+class JsonCodecTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        data = JSON_CODEC.encode({'items': [make_category(1)], 'day': datetime.date(2017, 1, 2)})
+        decoded = JSON_CODEC.decode(data)
+        self.assertEqual(decoded['items'][0]['category_id'], 1)
+        # dates are restored by prefix when type of payload is unknown
+        self.assertEqual(decoded['day'], datetime.date(2017, 1, 2))
+
+    def test_malformed(self):
+        for payload in ('', '{"a": ', '[1, 2', 'nope'):
+            with self.assertRaises(ValueError):
+                JSON_CODEC.decode(payload)
+
+    def test_typed_dates_are_restored_by_fields(self):
+        data = JSON_CODEC.encode(make_category(1, CodecParent(name='_date:2017-01-02')))
+        dikt = JSON_CODEC.decode(data, typed=True)
+        self.assertEqual(dikt['start_date'], '_date:2017-01-02')
+        category = CodecCategory.from_dict(dikt)
+        self.assertEqual(category.start_date, datetime.date(2017, 1, 2))
+        # strings of fields not declared as date are left as they are
+        self.assertEqual(category.parent.name, '_date:2017-01-02')
+        self.assertEqual(CodecCategory.lazy_from_dict(dikt).start_date, datetime.date(2017, 1, 2))
+
+    def test_date_field_from_json(self):
+        field = DateField()
+        self.assertEqual(field.from_json('_date:2017-01-02'), datetime.date(2017, 1, 2))
+        self.assertEqual(field.from_json('2017-01-02'), datetime.date(2017, 1, 2))
+        self.assertEqual(DateField(format='%Y%m%d').from_json('20170102'), datetime.date(2017, 1, 2))
+        self.assertEqual(field.from_json(datetime.date(2017, 1, 2)), datetime.date(2017, 1, 2))
+        for value in ('_date:2017-13-01', 'tomorrow'):
+            with self.assertRaises(TypeError):
+                field.from_json(value)
+
+    def test_untyped_keeps_other_strings(self):
+        decoded = JSON_CODEC.decode('{"a": "x", "b": ["y"], "c": "_date:bad", '
+                                    '"d": {"e": "_date:2017-01-02"}}')
+        self.assertEqual(decoded, {'a': 'x', 'b': ['y'], 'c': '_date:bad',
+                                   'd': {'e': datetime.date(2017, 1, 2)}})
+        self.assertEqual(JSON_CODEC.decode('{"a": "x", "b": 1}'), {'a': 'x', 'b': 1})
+
+
+class NegotiateTest(unittest.TestCase):
+
+    def test_negotiate(self):
+        self.assertIs(codec.negotiate(None), JSON_CODEC)
+        self.assertIs(codec.negotiate('application/x-aa-binary'), BINARY_CODEC)
+        self.assertIs(codec.negotiate('application/x-aa-binary;q=0.5, application/json'), JSON_CODEC)
+        self.assertIs(codec.negotiate('application/json;q=0.5, application/x-aa-binary'), BINARY_CODEC)
+        self.assertIs(codec.negotiate('application/x-aa-binary;q=0'), JSON_CODEC)
+        self.assertIs(codec.negotiate('text/html'), JSON_CODEC)
+        self.assertIs(codec.find('application/json; charset=utf-8'), JSON_CODEC)
+        self.assertIsNone(codec.find('text/plain'))
@@ -0,0 +1,92 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+import array
+import json
+import unittest
+
+from ..base import BaseDTO, DTOList
+from ..columnar import ColumnList
+from ..fields import Bool, DTOField, Float, Int, String
+
+
+class ColumnParent(BaseDTO):
+    name = String()
+
+
+class ColumnCategory(BaseDTO):
+    market = String()
+    category_id = Int()
+    is_main = Bool()
+    score = Float(None, False, None)
+    parent = DTOField(dto_class=ColumnParent, can_be_none=True)
+
+
+class ColumnCategoryList(DTOList):
+    __type__ = ColumnCategory
+    __columnar__ = True
+
+
+def make_category(market='ios', category_id=1):
+    return ColumnCategory(market=market, category_id=category_id, is_main=True, score=0.5,
+                          parent=ColumnParent(name='root'))
+
+
+def round_trip(dto_list):
+    return ColumnCategoryList.from_dict(json.loads(json.dumps(dto_list.to_dict())))
+
+
+class ColumnListTest(unittest.TestCase):
+
+    def test_wire_format_is_columns(self):
+        dikt = ColumnCategoryList([make_category('ios', 1), make_category('gp', 2)]).to_dict()
+        self.assertEqual(dikt['__size__'], 2)
+        self.assertNotIn('__list__', dikt)
+        self.assertEqual(dikt['__columns__']['market'], ['ios', 'gp'])
+        self.assertEqual(dikt['__columns__']['category_id'], [1, 2])
+        self.assertEqual(dikt['__columns__']['parent'], [{'__cls__': 'ColumnParent', 'name': 'root'}] * 2)
+
+    def test_round_trip(self):
+        restored = round_trip(ColumnCategoryList([make_category('ios', 1), make_category('gp', 2)]))
+        self.assertIsInstance(restored.__list__, ColumnList)
+        self.assertEqual([c.market for c in restored], ['ios', 'gp'])
+        self.assertIs(restored[1].is_main, True)
+        self.assertEqual(restored[0].parent.name, 'root')
+        self.assertEqual(restored.to_dict(), round_trip(restored).to_dict())
+
+    def test_numeric_columns_are_packed(self):
+        restored = round_trip(ColumnCategoryList([make_category()]))
+        self.assertIsInstance(restored.__list__.columns['category_id'], array.array)
+        self.assertIsInstance(restored.__list__.columns['score'], array.array)
+
+    def test_wrong_values_are_reported_on_access(self):
+        columns = {'market': ['ios'], 'category_id': [1], 'is_main': [True], 'score': [1], 'parent': [None]}
+        column_list = ColumnList.from_columns(ColumnCategory, columns, 1)
+        self.assertIsInstance(column_list.columns['score'], list)
+        self.assertRaises(TypeError, lambda: column_list[0])
+
+    def test_column_size_is_checked(self):
+        self.assertRaises(TypeError, ColumnList.from_columns, ColumnCategory, {'market': ['ios']}, 2)
+
+    def test_rows_are_kept(self):
+        original = make_category()
+        dto_list = ColumnCategoryList([original])
+        self.assertIs(dto_list[0], original)
+        original.market = 'changed'
+        self.assertEqual(dto_list.to_dict()['__columns__']['market'], ['changed'])
+
+    def test_change_of_decoded_element_is_sent(self):
+        restored = round_trip(ColumnCategoryList([make_category('ios', 1), make_category('gp', 2)]))
+        restored[0].market = 'changed'
+        self.assertIs(restored[0], restored[0])
+        self.assertEqual(restored.to_dict()['__columns__']['market'], ['changed', 'gp'])
+        self.assertEqual(round_trip(restored)[0].market, 'changed')
+
+    def test_list_methods(self):
+        restored = round_trip(ColumnCategoryList([make_category('ios', 1), make_category('gp', 2)]))
+        restored.__list__.append(make_category('mac', 3))
+        restored.__list__.extend([{'market': 'tv', 'category_id': 4, 'is_main': False, 'score': 1.0}])
+        del restored.__list__[0]
+        restored.__list__.insert(0, make_category('web', 5))
+        self.assertEqual(len(restored), 4)
+        self.assertEqual([c.market for c in restored], ['web', 'gp', 'mac', 'tv'])
+        self.assertEqual(round_trip(restored).to_dict()['__columns__']['category_id'], [5, 2, 3, 4])
+        self.assertRaises(TypeError, restored.__list__.append, {'market': 'tv'})
@@ -0,0 +1,44 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+import unittest
+import zlib
+
+from .. import compression
+from ..compression import BodyTooLargeError, BrokenBodyError, UnsupportedEncodingError
+
+BODY = '{"items": [%s]}' % ', '.join(['"item"'] * 200)
+
+
+class DecompressTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        for encoding in compression.ENCODINGS:
+            self.assertEqual(compression.decompress(compression.compress(BODY, encoding), encoding), BODY)
+        self.assertEqual(compression.decompress(BODY, None), BODY)
+        self.assertEqual(compression.decompress(BODY, 'identity'), BODY)
+
+    def test_raw_deflate(self):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        raw = compressor.compress(BODY) + compressor.flush()
+        self.assertEqual(compression.decompress(raw, 'deflate'), BODY)
+        with self.assertRaises(BrokenBodyError):
+            compression.decompress(raw, 'gzip')
+
+    def test_size_bound(self):
+        data = compression.compress(BODY, compression.GZIP)
+        self.assertEqual(compression.decompress(data, 'gzip', len(BODY)), BODY)
+        with self.assertRaises(BodyTooLargeError):
+            compression.decompress(data, 'gzip', len(BODY) - 1)
+
+    def test_bomb_is_not_expanded(self):
+        bomb = compression.compress('\0' * (64 * 1024 * 1024), compression.GZIP)
+        with self.assertRaises(BodyTooLargeError):
+            compression.decompress(bomb, 'gzip', 1024)
+
+    def test_broken_and_unsupported(self):
+        data = compression.compress(BODY, compression.GZIP)
+        with self.assertRaises(BrokenBodyError):
+            compression.decompress(data[:-10], 'gzip')
+        with self.assertRaises(BrokenBodyError):
+            compression.decompress('not compressed', 'deflate')
+        with self.assertRaises(UnsupportedEncodingError):
+            compression.decompress(data, 'br')
@@ -0,0 +1,161 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+import json
+import threading
+import time
+import unittest
+
+import flask
+import requests
+
+from .. import aio, deadline
+from ..deadline import DeadlineExceeded
+from ..entry_point import EntryPoint
+from ..http_client import HttpClient
+from ..web_interface import AsyncInterface, FlaskInterface
+
+called = []
+
+
+def deadline_left():
+    called.append(1)
+    return deadline.remaining()
+
+
+def deadline_slow():
+    time.sleep(0.5)
+    return 'late'
+
+
+def stub():
+    pass
+
+
+class DeadlineTest(unittest.TestCase):
+
+    def test_header(self):
+        self.assertIsNone(deadline.from_header(None))
+        self.assertIsNone(deadline.from_header(''))
+        self.assertIsNone(deadline.from_header('soon'))
+        self.assertIsNone(deadline.from_header('nan'))
+        self.assertAlmostEqual(deadline.from_header('2.5'), time.time() + 2.5, places=1)
+        # never more time than caller has
+        self.assertEqual(deadline.to_header(1.23456), '1.234')
+        self.assertEqual(deadline.to_header(-1), '0.000')
+
+    def test_shorten(self):
+        self.assertEqual(deadline.shorten(None, 2), 2)
+        self.assertEqual(deadline.shorten(5, 2), 2)
+        self.assertEqual(deadline.shorten(1, 2), 1)
+        self.assertEqual(deadline.shorten((3, 10), 2), (2, 2))
+        self.assertEqual(deadline.shorten((1, None), 2), (1, 2))
+        self.assertEqual(deadline.shorten(5, -1), deadline.MIN_TIMEOUT)
+
+    def test_scope(self):
+        self.assertIsNone(deadline.current())
+        with deadline.within(10):
+            outer = deadline.current()
+            with deadline.within(20):
+                # an outer deadline which is earlier still applies
+                self.assertEqual(deadline.current(), outer)
+            with deadline.within(1):
+                self.assertLess(deadline.current(), outer)
+            with deadline.Scope(None):
+                self.assertEqual(deadline.current(), outer)
+            self.assertEqual(deadline.current(), outer)
+        self.assertIsNone(deadline.current())
+
+    def test_check(self):
+        deadline.check()
+        deadline.check(time.time() + 1)
+        expired = deadline.stats()['expired']
+        with self.assertRaises(DeadlineExceeded):
+            deadline.check(time.time() - 1)
+        self.assertEqual(deadline.stats()['expired'], expired + 1)
+
+    def test_scoped_iterable(self):
+        at = time.time() + 10
+        seen = []
+
+        def items():
+            for i in range(2):
+                seen.append(deadline.current())
+                yield i
+
+        self.assertEqual(list(deadline.scoped(items(), at)), [0, 1])
+        self.assertEqual(seen, [at, at])
+        self.assertIsNone(deadline.current())
+
+
+class PropagationTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.interface = AsyncInterface(port=0, loop=aio.EventLoop())
+        cls.interface.register(EntryPoint(deadline_left, {}, key='deadline_left'))
+        cls.interface.register(EntryPoint(deadline_slow, {}, key='deadline_slow'))
+        cls.interface.register(EntryPoint(lambda: cls.remote('deadline_left')(), {}, key='deadline_nested'))
+        cls.interface.listen()
+        thread = threading.Thread(target=cls.interface.serve_forever)
+        thread.daemon = True
+        thread.start()
+        cls.base = 'http://127.0.0.1:%d' % cls.interface.port
+
+    @classmethod
+    def remote(cls, key):
+        entry = EntryPoint(stub, {}, key=key, client_mode=True)
+        entry.host = 'http://127.0.0.1:%d' % cls.interface.port
+        entry.http_client = HttpClient(timeout=(1, 5))
+        return entry
+
+    def test_remaining_seconds_are_sent(self):
+        self.assertIsNone(self.remote('deadline_left')())
+        with deadline.within(2):
+            left = self.remote('deadline_left')()
+        self.assertGreater(left, 1)
+        self.assertLessEqual(left, 2)
+
+    def test_nested_call_shares_budget(self):
+        with deadline.within(2):
+            left = self.remote('deadline_nested')()
+        self.assertGreater(left, 1)
+        self.assertLess(left, 2)
+
+    def test_expired_call_is_not_sent(self):
+        del called[:]
+        with deadline.within(0.01):
+            time.sleep(0.02)
+            with self.assertRaises(DeadlineExceeded):
+                self.remote('deadline_left')()
+        self.assertEqual(called, [])
+
+    def test_expired_request_is_not_called(self):
+        del called[:]
+        r = requests.get(self.base + '/invoke/deadline_left', headers={deadline.HEADER: '0'}, timeout=5)
+        self.assertEqual(r.status_code, 504)
+        self.assertEqual(called, [])
+
+    def test_slow_response_raises_deadline_exceeded(self):
+        start = time.time()
+        with deadline.within(0.2):
+            with self.assertRaises(DeadlineExceeded):
+                self.remote('deadline_slow')()
+        self.assertLess(time.time() - start, 0.45)
+
+
+class FlaskDeadlineTest(unittest.TestCase):
+
+    def setUp(self):
+        app = flask.Flask(__name__)
+        FlaskInterface(app).register(EntryPoint(deadline_left, {}, key='deadline_left'))
+        self.client = app.test_client()
+
+    def test_header_is_read(self):
+        del called[:]
+        response = self.client.get('/invoke/deadline_left', headers={deadline.HEADER: '0'})
+        self.assertEqual(response.status_code, 504)
+        self.assertEqual(called, [])
+        response = self.client.get('/invoke/deadline_left', headers={deadline.HEADER: '5'})
+        self.assertEqual(response.status_code, 200)
+        left = json.loads(response.data)['data']
+        self.assertGreater(left, 4)
+        self.assertLessEqual(left, 5)
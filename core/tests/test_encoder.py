@@ -0,0 +1,96 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+import datetime
+import json
+import unittest
+
+from .. import encoder, pingpong
+from ..base import BaseDTO, Serializable, json_default
+from ..fields import DateField, DTOField, Int, List, String
+
+
+class EncoderTag(BaseDTO):
+    name = String()
+
+
+class EncoderItem(BaseDTO):
+    item_id = Int()
+    day = DateField(can_be_none=True)
+    tags = List(element_type=DTOField(dto_class=EncoderTag), can_be_empty=True)
+
+
+class EncoderFrozen(BaseDTO):
+    __compact__ = True
+    __frozen__ = True
+
+    item_id = Int()
+    tags = List(element_type=String(), can_be_empty=True)
+
+
+class EncoderModel(Serializable):
+
+    def __init__(self, item_id):
+        self.item_id = item_id
+
+    def to_dto(self):
+        return EncoderItem(item_id=self.item_id, tags=[])
+
+
+def make_item(item_id):
+    return EncoderItem(item_id=item_id, day=datetime.date(2017, 1, 2),
+                       tags=[EncoderTag(name='t%d' % i) for i in range(2)])
+
+
+def by_dict(o):
+    # reference, the whole tree of dicts is built before encoding
+    return json.dumps(pingpong.to_dict(o), default=json_default)
+
+
+class EncoderTest(unittest.TestCase):
+
+    def assertSameJson(self, o):
+        self.assertEqual(json.loads(encoder.encode(o)), json.loads(by_dict(o)))
+
+    def test_same_as_encoding_dicts(self):
+        cases = [
+            1, 'a', None, [], {}, [1, 'a', None],
+            make_item(1),
+            [make_item(i) for i in range(3)],
+            {'data': [make_item(1), 2, {'a': make_item(3)}], 'code': 200},
+            [1, make_item(2), [make_item(3)], 4, None],
+            {1: make_item(1), True: [make_item(2)], None: 3},
+            EncoderFrozen(item_id=1, tags=['a']),
+            [EncoderFrozen(item_id=i, tags=[]) for i in range(3)],
+            {'model': EncoderModel(1), 'models': [EncoderModel(2)]},
+            EncoderModel(3),
+            [datetime.date(2017, 1, 2), make_item(1)],
+        ]
+        for o in cases:
+            self.assertSameJson(o)
+
+    def test_more_items_than_batch(self):
+        items = [make_item(i) if i % 7 else {'n': make_item(i)} for i in range(encoder.BATCH_SIZE * 2 + 3)]
+        self.assertSameJson(items)
+        self.assertSameJson(range(encoder.BATCH_SIZE + 1) + [make_item(1)])
+
+    def test_compact(self):
+        self.assertEqual(encoder.encode({'a': [make_item(1)]}), json.dumps({'a': [make_item(1)]},
+                                                                           default=json_default,
+                                                                           separators=(',', ':')))
+
+    def test_default(self):
+        with self.assertRaises(TypeError):
+            encoder.encode([make_item(1), object()])
+        self.assertEqual(encoder.encode([make_item(1), object()], default=lambda o: 'obj')[-7:], ',"obj"]')
+        with self.assertRaises(TypeError):
+            encoder.encode({(1, 2): make_item(1)})
+
+    def test_chunks(self):
+        items = [make_item(i) for i in range(1000)]
+        chunks = list(encoder.iter_chunks(items, chunk_size=1024))
+        # dicts of dto are encoded by batch, a chunk never holds more than one batch
+        batch_size = len(encoder.encode(items[:encoder.BATCH_SIZE]))
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) <= batch_size + 1024 for chunk in chunks))
+        self.assertTrue(all(len(chunk) >= 1024 for chunk in chunks[:-1]))
+        self.assertEqual(''.join(chunks), encoder.encode(items))
+        self.assertEqual(list(encoder.iter_chunks(1)), ['1'])
@@ -0,0 +1,113 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+import logging
+import threading
+import time
+import unittest
+
+import requests
+
+from .. import aio, web_interface
+from ..cache import ResponseCache, SingleFlight
+from ..entry_point import EntryOptions, EntryPoint
+from ..fields import Int
+from ..http_client import HttpClient
+from ..web_interface import AsyncInterface
+
+
+def report(cache, version):
+    return cache + version
+
+
+def gappy(n):
+    for i in range(n):
+        time.sleep(0.5)
+        yield i
+
+
+def gappy_stub(n):
+    pass
+
+
+class _Records(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class EntryOptionsTest(unittest.TestCase):
+
+    def test_default_options(self):
+        entry = EntryPoint(report, {'cache': Int(), 'version': Int()})
+        self.assertIsNone(entry.cache)
+        self.assertIsNone(entry.single_flight)
+        self.assertIsNone(entry.version)
+
+    def test_args_named_like_options_stay_args(self):
+        entry = EntryPoint(report, {'cache': Int(), 'version': Int()},
+                           options=EntryOptions(cache=True, single_flight=True))
+        self.assertIsInstance(entry.cache, ResponseCache)
+        self.assertIsInstance(entry.single_flight, SingleFlight)
+        self.assertEqual(entry.call_from_request(cache='1', version='2'), 3)
+
+    def test_version_etag(self):
+        interface = AsyncInterface(port=0)
+        entry = EntryPoint(report, {'cache': Int(), 'version': Int()},
+                           options=EntryOptions(version=lambda cache, version: version))
+        etag = interface.version_etag(entry, {'cache': '1', 'version': '2'}, None)
+        self.assertIsNotNone(etag)
+        self.assertEqual(etag, interface.version_etag(entry, {'cache': '1', 'version': '2'}, None))
+        self.assertNotEqual(etag, interface.version_etag(entry, {'cache': '1', 'version': '3'}, None))
+
+    def test_failed_version_hook_is_logged(self):
+        def broken(cache, version):
+            raise KeyError(version)
+
+        interface = AsyncInterface(port=0)
+        entry = EntryPoint(report, {'cache': Int(), 'version': Int()}, options=EntryOptions(version=broken))
+        handler = _Records()
+        web_interface.log.addHandler(handler)
+        try:
+            self.assertIsNone(interface.version_etag(entry, {'cache': '1', 'version': '2'}, None))
+            # invalid args are left to the entry
+            self.assertIsNone(interface.version_etag(entry, {'cache': 'x', 'version': '2'}, None))
+        finally:
+            web_interface.log.removeHandler(handler)
+        self.assertEqual(len(handler.records), 1)
+        self.assertEqual(handler.records[0].levelno, logging.ERROR)
+
+
+class RemoteStreamTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.interface = AsyncInterface(port=0, loop=aio.EventLoop())
+        cls.interface.register(EntryPoint(gappy, {'n': Int()}, key='entry_gappy'))
+        cls.interface.listen()
+        thread = threading.Thread(target=cls.interface.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def remote(self, options=None):
+        entry = EntryPoint(gappy_stub, {'n': Int()}, key='entry_gappy', client_mode=True, options=options)
+        entry.host = 'http://127.0.0.1:%d' % self.interface.port
+        # items come slower than read timeout of http client
+        entry.http_client = HttpClient(timeout=(1, 0.2))
+        return entry
+
+    def test_stream_read_timeout_of_stub(self):
+        entry = self.remote(EntryOptions(stream=True))
+        self.assertTrue(entry.streams)
+        self.assertEqual(list(entry(2)), [0, 1])
+        entry.stream_read_timeout = 0.2
+        with self.assertRaises(requests.RequestException):
+            list(entry(2))
+
+    def test_stub_without_stream_takes_read_timeout_of_client(self):
+        entry = self.remote()
+        self.assertFalse(entry.streams)
+        with self.assertRaises(requests.RequestException):
+            list(entry(2))
@@ -0,0 +1,165 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+import threading
+import unittest
+
+import flask
+from werkzeug.serving import make_server
+
+from ..base import BaseDTO
+from ..cache import ResponseCache
+from ..entry_point import EntryOptions, EntryPoint
+from ..fields import Int, String
+from ..http_client import HttpClient
+from ..web_interface import FlaskInterface
+
+calls = []
+versions = {'ios': 1}
+
+
+class EtagCategory(BaseDTO):
+    market = String()
+    category_id = Int()
+
+
+def etag_categories(market):
+    calls.append(market)
+    return [EtagCategory(market=market, category_id=i) for i in range(3)]
+
+
+def etag_text(name):
+    calls.append(name)
+    return 'hello %s' % name
+
+
+def etag_count(n):
+    for i in range(n):
+        yield i
+
+
+def etag_fail(market):
+    raise ValueError(market)
+
+
+def stub(market):
+    pass
+
+
+def make_app():
+    app = flask.Flask(__name__)
+    interface = FlaskInterface(app)
+    version = EntryOptions(version=lambda market: versions.get(market))
+    interface.register(EntryPoint(etag_categories, {'market': String()}, key='etag_versioned', options=version))
+    interface.register(EntryPoint(etag_categories, {'market': String()}, key='etag_plain'))
+    interface.register(EntryPoint(etag_categories, {'market': String()}, key='etag_cached',
+                                  options=EntryOptions(cache=True)))
+    interface.register(EntryPoint(etag_text, {'name': String()}, key='etag_text', retype=String()))
+    interface.register(EntryPoint(etag_count, {'n': Int()}, key='etag_count'))
+    interface.register(EntryPoint(etag_fail, {'market': String()}, key='etag_fail'))
+    return app
+
+
+class ConditionalGetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = make_app().test_client()
+        versions['ios'] = 1
+        del calls[:]
+
+    def get(self, path, etag=None, **headers):
+        if etag is not None:
+            headers['If-None-Match'] = '"%s"' % etag
+        return self.client.get(path, headers=headers)
+
+    def test_version_hook(self):
+        response = self.get('/invoke/etag_versioned?market=ios')
+        etag = response.get_etag()[0]
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(calls, ['ios'])
+        # unchanged data is not fetched again
+        response = self.get('/invoke/etag_versioned?market=ios', etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, '')
+        self.assertEqual(response.get_etag()[0], etag)
+        self.assertEqual(calls, ['ios'])
+        versions['ios'] = 2
+        response = self.get('/invoke/etag_versioned?market=ios', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.get_etag()[0], etag)
+        self.assertEqual(calls, ['ios', 'ios'])
+
+    def test_etag_differs_by_args_and_accept(self):
+        etag = self.get('/invoke/etag_versioned?market=ios').get_etag()[0]
+        self.assertNotEqual(self.get('/invoke/etag_versioned?market=gp').get_etag()[0], etag)
+        binary = self.get('/invoke/etag_versioned?market=ios', Accept='application/x-aa-binary')
+        self.assertNotEqual(binary.get_etag()[0], etag)
+        self.assertEqual(self.get('/invoke/etag_versioned?market=ios', etag,
+                                  Accept='application/x-aa-binary').status_code, 200)
+
+    def test_no_version_gives_no_etag_of_hook(self):
+        versions.pop('ios')
+        response = self.get('/invoke/etag_versioned?market=ios')
+        self.assertEqual(response.status_code, 200)
+        # streamed body of dto is not hashed
+        self.assertIsNone(response.get_etag()[0])
+
+    def test_buffered_body_gets_hash(self):
+        for path in ('/invoke/etag_text?name=x', '/invoke/etag_cached?market=ios'):
+            response = self.get(path)
+            etag = response.get_etag()[0]
+            self.assertIsNotNone(etag)
+            self.assertEqual(self.get(path).get_etag()[0], etag)
+            self.assertEqual(self.get(path, etag).status_code, 304)
+
+    def test_streamed_error_and_post_get_no_etag(self):
+        self.assertIsNone(self.get('/invoke/etag_plain?market=ios').get_etag()[0])
+        self.assertIsNone(self.get('/invoke/etag_count?n=3').get_etag()[0])
+        response = self.get('/invoke/etag_fail?market=ios')
+        self.assertEqual(response.status_code, 500)
+        self.assertIsNone(response.get_etag()[0])
+        response = self.client.post('/invoke/etag_text', data='{"name": "x"}', content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.get_etag()[0])
+
+
+class ConditionalCacheTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = make_server('127.0.0.1', 0, make_app(), threaded=True)
+        thread = threading.Thread(target=cls.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        versions['ios'] = 1
+        del calls[:]
+
+    def remote(self, key):
+        entry = EntryPoint(stub, {'market': String()}, key=key, client_mode=True, retype=EtagCategory)
+        entry.host = 'http://127.0.0.1:%d' % self.server.server_port
+        entry.http_client = HttpClient()
+        entry.conditional_cache = ResponseCache(max_entries=8)
+        return entry
+
+    def test_result_is_reused_on_304(self):
+        entry = self.remote('etag_versioned')
+        first = entry('ios')
+        self.assertEqual([category.category_id for category in first], [0, 1, 2])
+        self.assertIs(entry('ios'), first)
+        self.assertEqual(calls, ['ios'])
+        versions['ios'] = 2
+        second = entry('ios')
+        self.assertIsNot(second, first)
+        self.assertEqual(calls, ['ios', 'ios'])
+
+    def test_hash_of_buffered_body(self):
+        # short body is buffered by compressor before it is sent, so it gets the hash as ETag,
+        # entry is still called, the result is not decoded again
+        entry = self.remote('etag_plain')
+        first = entry('ios')
+        self.assertIs(entry('ios'), first)
+        self.assertEqual(calls, ['ios', 'ios'])
@@ -0,0 +1,89 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+import unittest
+
+from ..base import BaseDTO
+from ..fields import Bool, Dict, DTOField, Float, Int, List, Number, String, compile_checker
+
+
+class FieldTag(BaseDTO):
+    name = String()
+
+
+class SmallInt(int):
+    pass
+
+
+def check_each(element_type, elements):
+    """
+    reference of checker, each element is checked by itself
+    """
+    for elem in elements:
+        if isinstance(element_type, type):
+            if not isinstance(elem, element_type):
+                raise TypeError(elem)
+        else:
+            element_type(elem)
+
+
+class CompileCheckerTest(unittest.TestCase):
+
+    CASES = [
+        (Int(), [[], [1, 2L], [1, True], [SmallInt(1)], [1, None], [1, 1.5], [1, '1']]),
+        (Int(can_be_none=True), [[1, None], [None], [1, 'a']]),
+        (Int(default=0), [[1, None]]),
+        (Float(None, False, None), [[1.5, 2.5], [1.5, 1]]),
+        (Number(None, False, None), [[1, 2L, 1.5], [1, 'a']]),
+        (String(), [['a', u'b'], ['a', 1], ['a', None]]),
+        (String(choices=['a', 'b']), [['a', 'b'], ['a', 'c']]),
+        (Bool(), [[True, False], [True, 1]]),
+        (DTOField(dto_class=FieldTag), [[FieldTag(name='a')], [FieldTag(name='a'), {'name': 'a'}]]),
+        (List(element_type=Int()), [[[1], [2, 3]], [[1], ['a']], [[1], None]]),
+        (int, [[1, 2], [1, SmallInt(2)], [1, 'a']]),
+        (basestring, [['a', u'b'], ['a', 1]]),
+    ]
+
+    def test_same_as_checking_each(self):
+        for element_type, cases in self.CASES:
+            check = compile_checker(element_type)
+            for elements in cases:
+                try:
+                    check_each(element_type, elements)
+                except (TypeError, ValueError):
+                    with self.assertRaises(TypeError, msg='%r %r' % (element_type, elements)):
+                        check(elements)
+                else:
+                    check(elements)
+
+    def test_any_element(self):
+        compile_checker(None)([1, 'a', None, object()])
+
+
+class ContainerFieldTest(unittest.TestCase):
+
+    def test_list(self):
+        field = List(element_type=Int())
+        self.assertEqual(field([1, 2]), [1, 2])
+        with self.assertRaises(TypeError) as raised:
+            field([1, 'a'])
+        self.assertIn('element type error', str(raised.exception))
+        with self.assertRaises(TypeError):
+            field((1, 2))
+
+    def test_dict(self):
+        field = Dict(key=String(), value=List(element_type=Int()))
+        self.assertEqual(field({'a': [1]}), {'a': [1]})
+        with self.assertRaises(TypeError) as raised:
+            field({1: [1]})
+        self.assertIn('key type error', str(raised.exception))
+        with self.assertRaises(TypeError) as raised:
+            field({'a': ['b']})
+        self.assertIn('value type error', str(raised.exception))
+        self.assertEqual(Dict()({1: object}), {1: object})
+
+    def test_validate_many(self):
+        values, errors = List(element_type=Int()).validate_many([[1], None, [1, 'a'], 'a'])
+        self.assertEqual(values[0], [1])
+        self.assertEqual(sorted(errors), [1, 2, 3])
+        values, errors = Int(default=7).validate_many([1, None, 'a'])
+        self.assertEqual(values[:2], [1, 7])
+        self.assertEqual(sorted(errors), [2])
@@ -0,0 +1,115 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+import threading
+import time
+import unittest
+
+from .. import futures
+from ..futures import Executor, ThreadFuture, TimeoutError
+
+
+class FakeEntry(object):
+    """
+    remote entry of gather, calls run in executor, seconds slept and results are given by args
+    """
+
+    def __init__(self, executor):
+        self.executor = executor
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        self.started = {}
+        self.ended = {}
+
+    def call_remote_async(self, key, seconds=0, error=None, **kwargs):
+        kwargs.pop(futures.TIMEOUT)
+        if error == 'start':
+            raise ValueError('not started %s' % key)
+        return self.executor.submit(self.run, key, seconds, error)
+
+    def run(self, key, seconds, error):
+        with self.lock:
+            self.started[key] = time.time()
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            time.sleep(seconds)
+            if error is not None:
+                raise ValueError('failed %s' % key)
+            return key
+        finally:
+            with self.lock:
+                self.running -= 1
+                self.ended[key] = time.time()
+
+
+class GatherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = Executor(max_workers=8)
+        self.entry = FakeEntry(self.executor)
+
+    def tearDown(self):
+        self.executor.close()
+
+    def test_results_in_order_within_concurrency(self):
+        calls = [(self.entry, (i, 0.05 * (i % 3))) for i in range(12)]
+        self.assertEqual(futures.gather(calls, max_concurrency=3), range(12))
+        self.assertEqual(self.entry.max_running, 3)
+
+    def test_kwargs(self):
+        self.assertEqual(futures.gather([(self.entry, ('a',), {'seconds': 0.01}), (self.entry, ('b',))]), ['a', 'b'])
+
+    def test_first_error_is_raised(self):
+        calls = [(self.entry, ('a', 0.2)), (self.entry, ('b', 0, 'fail')), (self.entry, ('c', 0.2))]
+        start = time.time()
+        with self.assertRaises(ValueError):
+            futures.gather(calls)
+        # no need to wait for the others
+        self.assertLess(time.time() - start, 0.15)
+
+    def test_return_exceptions(self):
+        calls = [(self.entry, ('a',)), (self.entry, ('b', 0, 'fail')), (self.entry, ('c', 0, 'start'))]
+        results = futures.gather(calls, return_exceptions=True)
+        self.assertEqual(results[0], 'a')
+        self.assertIsInstance(results[1], ValueError)
+        self.assertIsInstance(results[2], ValueError)
+
+    def test_timeout(self):
+        calls = [(self.entry, ('slow', 0.5)), (self.entry, ('fast',))]
+        start = time.time()
+        results = futures.gather(calls, timeout=0.1, return_exceptions=True)
+        self.assertLess(time.time() - start, 0.4)
+        self.assertIsInstance(results[0], TimeoutError)
+        self.assertEqual(results[1], 'fast')
+        with self.assertRaises(TimeoutError):
+            futures.gather(calls, timeout=0.1)
+
+    def test_timed_out_call_holds_its_slot(self):
+        calls = [(self.entry, ('slow', 0.3)), (self.entry, ('next',))]
+        results = futures.gather(calls, max_concurrency=1, timeout=0.1, return_exceptions=True)
+        self.assertIsInstance(results[0], TimeoutError)
+        self.assertEqual(results[1], 'next')
+        # the next call is started only when the thread of timed out one is over
+        self.assertGreaterEqual(self.entry.started['next'], self.entry.ended['slow'])
+        self.assertEqual(self.entry.max_running, 1)
+
+    def test_empty(self):
+        self.assertEqual(futures.gather([]), [])
+
+
+class ThreadFutureTest(unittest.TestCase):
+
+    def test_result_timeout_and_callbacks(self):
+        future = ThreadFuture()
+        with self.assertRaises(TimeoutError):
+            future.result(timeout=0.01)
+        seen = []
+        future.add_done_callback(seen.append)
+        threading.Timer(0.05, future.set_result, [1]).start()
+        self.assertEqual(future.result(timeout=1), 1)
+        self.assertEqual(seen, [future])
+        # callback added after done is called at once
+        future.add_done_callback(seen.append)
+        self.assertEqual(seen, [future, future])
+        with self.assertRaises(RuntimeError):
+            future.set_result(2)
@@ -0,0 +1,125 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+import socket
+import threading
+import time
+import unittest
+
+import requests
+
+from .. import aio, http_client
+from ..entry_point import EntryPoint
+from ..fields import Int
+from ..http_client import HttpClient
+from ..web_interface import AsyncInterface
+
+
+def pool_add(a, b):
+    return a + b
+
+
+def pool_slow():
+    time.sleep(0.1)
+    return 1
+
+
+def stub(a, b):
+    pass
+
+
+def start_interface():
+    interface = AsyncInterface(port=0, loop=aio.EventLoop())
+    interface.register(EntryPoint(pool_add, {'a': Int(), 'b': Int()}, key='pool_add'))
+    interface.register(EntryPoint(pool_slow, {}, key='pool_slow'))
+    interface.listen()
+    thread = threading.Thread(target=interface.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return 'http://127.0.0.1:%d' % interface.port
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class HttpClientTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.hosts = [start_interface(), start_interface()]
+
+    def get_all(self, client, n):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            client.get(self.hosts[0] + '/invoke/pool_slow').json()['data'])) for i in range(n)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(results, [1] * n)
+
+    def test_connection_is_reused(self):
+        client = HttpClient()
+        for i in range(5):
+            self.assertEqual(client.get(self.hosts[0] + '/invoke/pool_add?a=%d&b=1' % i).json()['data'], i + 1)
+        stats = client.stats()
+        self.assertEqual((stats['requests'], stats['connections'], stats['reused']), (5, 1, 4))
+
+    def test_pool_per_host(self):
+        client = HttpClient()
+        for host in self.hosts * 2:
+            client.post(host + '/invoke/pool_add', json={'a': 1, 'b': 2})
+        self.assertIs(client.session(self.hosts[0] + '/a'), client.session(self.hosts[0] + '/b'))
+        self.assertIsNot(client.session(self.hosts[0]), client.session(self.hosts[1]))
+        hosts = client.stats()['hosts']
+        self.assertEqual(sorted(hosts), sorted(host[len('http://'):] for host in self.hosts))
+        for host in hosts.values():
+            self.assertEqual(host, {'requests': 2, 'connections': 1, 'reused': 1})
+
+    def test_blocking_pool_holds_its_size(self):
+        client = HttpClient(pool_size=2, pool_block=True)
+        self.get_all(client, 6)
+        self.assertEqual(client.stats()['connections'], 2)
+
+    def test_extra_connections_without_block(self):
+        client = HttpClient(pool_size=2)
+        self.get_all(client, 6)
+        # connections over the pool size are opened for busy time and dropped after
+        self.assertGreater(client.stats()['connections'], 2)
+        self.get_all(client, 2)
+        self.assertEqual(client.stats()['reused'], 2)
+
+    def test_errors(self):
+        client = HttpClient(timeout=1)
+        with self.assertRaises(requests.ConnectionError):
+            client.get('http://127.0.0.1:%d/' % free_port())
+        self.assertEqual(client.stats()['errors'], 1)
+
+    def test_close(self):
+        client = HttpClient()
+        client.get(self.hosts[0] + '/invoke/pool_add?a=1&b=1')
+        session = client.session(self.hosts[0])
+        client.close()
+        self.assertEqual(client.stats()['requests'], 0)
+        self.assertIsNot(client.session(self.hosts[0]), session)
+
+    def test_remote_entries_share_default_client(self):
+        client = HttpClient()
+        default = http_client.get_client()
+        http_client.set_client(client)
+        try:
+            entries = [EntryPoint(stub, {'a': Int(), 'b': Int()}, key='pool_add', client_mode=True) for i in range(2)]
+            for entry in entries:
+                entry.host = self.hosts[0]
+                self.assertEqual(entry(1, 2), 3)
+        finally:
+            http_client.set_client(default)
+        self.assertEqual(client.stats()['reused'], 1)
+
+    def test_connect_timeout(self):
+        self.assertEqual(http_client.connect_timeout((1, 5)), 1)
+        self.assertEqual(http_client.connect_timeout(2), 2)
+        self.assertIsNone(http_client.connect_timeout(None))
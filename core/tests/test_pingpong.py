@@ -0,0 +1,137 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+import json
+import threading
+import time
+import unittest
+
+import flask
+
+from .. import aio, encoder, pingpong
+from ..base import BaseDTO
+from ..entry_point import EntryOptions, EntryPoint
+from ..fields import Int, String
+from ..http_client import HttpClient
+from ..http_code import NDJSON
+from ..web_interface import AsyncInterface, FlaskInterface
+
+released = threading.Event()
+
+
+class StreamRow(BaseDTO):
+    row_id = Int()
+    name = String()
+
+
+def stream_rows(n):
+    for i in range(n):
+        yield StreamRow(row_id=i, name='r%d' % i)
+        if i == 0:
+            # the rest is held until the client has got the first one
+            released.wait(5)
+
+
+def stream_broken(n):
+    for i in range(n):
+        yield i
+    raise ValueError('broken after %d' % n)
+
+
+def stub(n):
+    pass
+
+
+def records_of(iterator):
+    # records as they are sent and decoded
+    return [json.loads(encoder.encode(record)) for record in pingpong.pack_stream(iterator)]
+
+
+class PackStreamTest(unittest.TestCase):
+
+    def test_is_stream(self):
+        self.assertTrue(pingpong.is_stream(iter([])))
+        self.assertTrue(pingpong.is_stream(stream_broken(1)))
+        for result in ([], 'a', {}, None, StreamRow(row_id=1, name='a')):
+            self.assertFalse(pingpong.is_stream(result))
+
+    def test_round_trip(self):
+        records = records_of(StreamRow(row_id=i, name='a') for i in range(3))
+        self.assertEqual(records[-1], {'code': 200})
+        rows = list(pingpong.unpack_stream(records))
+        self.assertEqual([row.row_id for row in rows], [0, 1, 2])
+        self.assertIsInstance(rows[0], StreamRow)
+        lazy = list(pingpong.unpack_stream(records, lazy=True))
+        self.assertEqual([row.row_id for row in lazy], [0, 1, 2])
+
+    def test_error_is_the_last_record(self):
+        records = records_of(stream_broken(2))
+        self.assertEqual(records[:2], [{'data': 0}, {'data': 1}])
+        self.assertEqual(records[-1]['code'], 500)
+        items = pingpong.unpack_stream(records)
+        self.assertEqual([next(items), next(items)], [0, 1])
+        with self.assertRaises(Exception) as raised:
+            next(items)
+        self.assertIn('broken after 2', str(raised.exception))
+
+    def test_stream_without_last_record(self):
+        with self.assertRaises(Exception) as raised:
+            list(pingpong.unpack_stream([{'data': 0}]))
+        self.assertIn('broken', str(raised.exception))
+
+
+class FlaskStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        app = flask.Flask(__name__)
+        interface = FlaskInterface(app)
+        interface.register(EntryPoint(stream_broken, {'n': Int()}, key='stream_broken'))
+        self.client = app.test_client()
+
+    def test_records_are_lines(self):
+        response = self.client.get('/invoke/stream_broken?n=2', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, NDJSON)
+        self.assertIsNone(response.headers.get('Content-Encoding'))
+        records = [json.loads(line) for line in response.data.splitlines()]
+        self.assertEqual(records[:2], [{'data': 0}, {'data': 1}])
+        self.assertEqual(records[2]['code'], 500)
+        self.assertEqual(len(records), 3)
+
+
+class RemoteStreamTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # body is chunked, each line is read by client once its chunk arrives
+        cls.interface = AsyncInterface(port=0, loop=aio.EventLoop())
+        cls.interface.register(EntryPoint(stream_rows, {'n': Int()}, key='stream_rows'))
+        cls.interface.register(EntryPoint(stream_broken, {'n': Int()}, key='stream_broken'))
+        cls.interface.listen()
+        thread = threading.Thread(target=cls.interface.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def remote(self, key):
+        entry = EntryPoint(stub, {'n': Int()}, key=key, client_mode=True, options=EntryOptions(stream=True))
+        entry.host = 'http://127.0.0.1:%d' % self.interface.port
+        entry.http_client = HttpClient(timeout=(1, 5))
+        return entry
+
+    def test_items_arrive_before_entry_ends(self):
+        released.clear()
+        start = time.time()
+        rows = self.remote('stream_rows')(3)
+        try:
+            first = next(rows)
+            self.assertFalse(released.is_set())
+            self.assertLess(time.time() - start, 1)
+        finally:
+            released.set()
+        self.assertEqual((first.row_id, first.name), (0, 'r0'))
+        self.assertEqual([row.row_id for row in rows], [1, 2])
+
+    def test_error_is_raised_after_items(self):
+        items = self.remote('stream_broken')(2)
+        self.assertEqual([next(items), next(items)], [0, 1])
+        with self.assertRaises(Exception) as raised:
+            next(items)
+        self.assertIn('broken after 2', str(raised.exception))
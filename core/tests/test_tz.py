@@ -0,0 +1,36 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+import datetime
+import unittest
+
+from .. import tz
+
+
+class ParseYYYYMMDDTest(unittest.TestCase):
+
+    def test_valid_dates(self):
+        self.assertEqual(tz.parse_yyyy_mm_dd('2017-01-05'), datetime.date(2017, 1, 5))
+        self.assertEqual(tz.parse_yyyy_mm_dd(u'1999-12-31'), datetime.date(1999, 12, 31))
+        # short form accepted by strptime
+        self.assertEqual(tz.parse_yyyy_mm_dd('2017-1-5'), datetime.date(2017, 1, 5))
+
+    def test_same_inputs_as_strptime_are_rejected(self):
+        for dt_string in ('2017-+1-05', '2017- 1-05', '2017-01-5 ', ' 2017-01-5', '+017-01-05', '2017-02-30',
+                          '2017/01/05', '20170105', ''):
+            self.assertRaises(ValueError, tz.parse_yyyy_mm_dd, dt_string)
+
+
+class DateCodecTest(unittest.TestCase):
+
+    def test_dates_in_and_out_of_window(self):
+        codec = tz.DateCodec(datetime.date(2017, 1, 1), datetime.date(2017, 12, 31))
+        for date in (datetime.date(2017, 6, 1), datetime.date(1990, 6, 1)):
+            dt_string = codec.date_to_string(date)
+            self.assertEqual(dt_string, date.strftime(tz.YYYY_MM_DD))
+            self.assertEqual(codec.string_to_date(dt_string), date)
+        self.assertEqual(codec.strings_to_dates(['2017-06-01', '1990-06-01']),
+                         [datetime.date(2017, 6, 1), datetime.date(1990, 6, 1)])
+        self.assertRaises(ValueError, codec.string_to_date, '2017-06-+1')
+
+    def test_datetime_keeps_its_own_format(self):
+        codec = tz.DateCodec()
+        self.assertEqual(codec.date_to_string(datetime.datetime(2017, 6, 1, 12)), '2017-06-01')
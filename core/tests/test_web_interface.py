@@ -0,0 +1,193 @@
+# Copyright (c) 2017 App Annie Inc. All rights reserved.
+import json
+import socket
+import threading
+import time
+import unittest
+
+import flask
+import requests
+
+from .. import aio, compression
+from ..base import BaseDTO
+from ..entry_point import EntryPoint
+from ..fields import Int, String
+from ..web_interface import AsyncInterface, FlaskInterface
+
+produced = [0]
+
+
+def web_flood(n):
+    for i in range(n):
+        produced[0] += 1
+        # lines are long, so that buffers of socket are soon filled by a reader which does not read
+        yield 'x' * 100000
+
+
+def web_echo(items):
+    return len(items)
+
+
+class WebBodyItem(BaseDTO):
+    name = String()
+
+
+class WebBodyDecoder(json.JSONDecoder):
+    # restores tagged dto like protocols.DTOJsonDecoder
+
+    def __init__(self, *args, **kwargs):
+        json.JSONDecoder.__init__(self, object_hook=self.object_hook, *args, **kwargs)
+
+    def object_hook(self, dikt):
+        if '__cls__' in dikt:
+            return BaseDTO.find(dikt.pop('__cls__')).from_dict(dikt)
+        return dikt
+
+
+def web_item_name(item):
+    return item.name if isinstance(item, WebBodyItem) else 'plain'
+
+
+ITEM = json.dumps({'item': {'__cls__': 'WebBodyItem', 'name': 'x'}})
+
+
+class AsyncInterfaceTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # few threads in executor, so a stream holding one of them would be seen
+        cls.interface = AsyncInterface(port=0, loop=aio.EventLoop(max_workers=2))
+        cls.interface.max_body_size = 1000
+        cls.interface.stream_high_water = 16 * 1024
+        cls.interface.register(EntryPoint(web_flood, {'n': Int()}, key='web_flood'))
+        cls.interface.register(EntryPoint(web_echo, {}, key='web_echo'))
+        cls.interface.register(EntryPoint(web_item_name, {}, key='web_item_name'))
+        cls.interface.listen()
+        thread = threading.Thread(target=cls.interface.serve_forever)
+        thread.daemon = True
+        thread.start()
+        cls.base = 'http://127.0.0.1:%d' % cls.interface.port
+
+    def open_stream(self, n):
+        sock = socket.create_connection(('127.0.0.1', self.interface.port))
+        sock.sendall('GET /invoke/web_flood?n=%d HTTP/1.1\r\nHost: x\r\n\r\n' % n)
+        return sock
+
+    def read_stream(self, sock):
+        data = []
+        while not ''.join(data[-2:]).endswith('\r\n0\r\n\r\n'):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            data.append(chunk)
+        return ''.join(data)
+
+    def test_request_and_errors(self):
+        r = requests.post(self.base + '/invoke/web_echo', json={'items': ['a'] * 10}, timeout=5)
+        self.assertEqual(r.json()['data'], 10)
+        r = requests.post(self.base + '/invoke/web_echo', json={'items': ['a'] * 1000}, timeout=5)
+        self.assertEqual(r.status_code, 413)
+        r = requests.get(self.base + '/invoke/no_such_entry', timeout=5)
+        self.assertEqual(r.status_code, 404)
+
+    def post(self, path, body, encoding=None):
+        headers = {'Content-Type': 'application/json'}
+        if encoding is not None:
+            headers['Content-Encoding'] = encoding
+        return requests.post(self.base + path, data=body, headers=headers, timeout=5)
+
+    def test_body(self):
+        body = json.dumps({'items': ['a'] * 5})
+        self.assertEqual(self.post('/invoke/web_echo', body).json()['data'], 5)
+        self.assertEqual(self.post('/invoke/web_echo', compression.compress(body, 'gzip'), 'gzip').json()['data'], 5)
+        for body, encoding, code in (('{"items": [', None, 400),
+                                     ('["a"]', None, 400),
+                                     (compression.compress(body, 'gzip')[:-10], 'gzip', 400),
+                                     (compression.compress(body, 'gzip'), 'br', 415),
+                                     (compression.compress(json.dumps({'items': ['x' * 5000]}), 'gzip'), 'gzip', 413)):
+            r = self.post('/invoke/web_echo', body, encoding)
+            self.assertEqual(r.status_code, code)
+            self.assertEqual(r.json()['code'], code)
+
+    def test_body_decoder(self):
+        self.assertEqual(self.post('/invoke/web_item_name', ITEM).json()['data'], 'plain')
+        self.interface.json_decoder = WebBodyDecoder
+        try:
+            self.assertEqual(self.post('/invoke/web_item_name', ITEM).json()['data'], 'x')
+            self.assertEqual(self.post('/invoke/web_item_name', compression.compress(ITEM, 'gzip'), 'gzip')
+                             .json()['data'], 'x')
+        finally:
+            del self.interface.json_decoder
+
+    def test_stream(self):
+        r = requests.get(self.base + '/invoke/web_flood?n=10', timeout=5)
+        records = [json.loads(line) for line in r.content.splitlines()]
+        self.assertEqual(len(records), 11)
+        self.assertEqual(records[0]['data'], 'x' * 100000)
+        self.assertEqual(records[-1]['code'], 200)
+
+    def test_slow_reader_pauses_stream(self):
+        produced[0] = 0
+        sock = self.open_stream(500)
+        time.sleep(0.5)
+        paused = produced[0]
+        time.sleep(0.5)
+        self.assertEqual(produced[0], paused)
+        self.assertLess(paused, 500)
+        body = self.read_stream(sock)
+        sock.close()
+        self.assertEqual(produced[0], 500)
+        # the last record, before the last chunk
+        self.assertTrue(body.endswith('\n\r\n0\r\n\r\n'))
+        last = body[:-len('\n\r\n0\r\n\r\n')].rsplit('\n', 1)[-1]
+        self.assertEqual(json.loads(last)['code'], 200)
+
+    def test_slow_readers_do_not_hold_executor(self):
+        socks = [self.open_stream(500) for i in range(5)]
+        try:
+            time.sleep(0.5)
+            r = requests.post(self.base + '/invoke/web_echo', json={'items': ['a']}, timeout=5)
+            self.assertEqual(r.json()['data'], 1)
+        finally:
+            for sock in socks:
+                sock.close()
+
+    def test_closed_reader_stops_stream(self):
+        produced[0] = 0
+        sock = self.open_stream(10000)
+        time.sleep(0.3)
+        sock.close()
+        time.sleep(0.5)
+        stopped = produced[0]
+        time.sleep(0.3)
+        self.assertEqual(produced[0], stopped)
+        self.assertLess(stopped, 10000)
+
+
+class FlaskBodyTest(unittest.TestCase):
+
+    def setUp(self):
+        app = flask.Flask(__name__)
+        app.json_decoder = WebBodyDecoder
+        interface = FlaskInterface(app)
+        interface.register(EntryPoint(web_item_name, {}, key='web_item_name'))
+        interface.register(EntryPoint(web_echo, {}, key='web_echo'))
+        self.client = app.test_client()
+
+    def post(self, path, body, encoding=None):
+        headers = {} if encoding is None else {'Content-Encoding': encoding}
+        response = self.client.post(path, data=body, headers=headers, content_type='application/json')
+        return response.status_code, json.loads(response.data)
+
+    def test_compressed_body_is_decoded_by_the_same_decoder(self):
+        self.assertEqual(self.post('/invoke/web_item_name', ITEM)[1]['data'], 'x')
+        self.assertEqual(self.post('/invoke/web_item_name', compression.compress(ITEM, 'gzip'), 'gzip')[1]['data'], 'x')
+        self.assertEqual(self.post('/invoke/web_item_name', compression.compress(ITEM, 'deflate'), 'deflate')[1]['data'],
+                         'x')
+
+    def test_broken_body(self):
+        for body, encoding in (('{"items": [', None), ('["a"]', None),
+                               (compression.compress('{"items": [', 'gzip'), 'gzip')):
+            status, response = self.post('/invoke/web_echo', body, encoding)
+            self.assertEqual(status, 400)
+            self.assertEqual(response['code'], 400)
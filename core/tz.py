@@ -9,6 +9,9 @@ import pytz
 STD_TIMEZONE = pytz.timezone('US/Pacific')
 ISO_FORMAT = "%Y-%m-%dT%H:%M:%S.%f%z"
 YYYY_MM_DD = "%Y-%m-%d"
+# prefix of date/datetime string in json (see: utils.EnhancedEncoder)
+JSON_DATE_PREFIX = '_date:'
+JSON_DATETIME_PREFIX = '_dt:'
 
 
 def current_date(utc=True):
@@ -65,11 +68,103 @@ def parse_date(dt_string):
         raise TypeError('%s is not correct type' % dt_string)
 
 
+def parse_yyyy_mm_dd(dt_string):
+    """
+    hand written parser of `YYYY-MM-DD`, much faster than strptime
+    :raise ValueError: not a valid date
+    """
+    # int() would take sign and spaces too, like `2017-+1-05` or `2017-01-5 `, which strptime rejects
+    if (len(dt_string) == 10 and dt_string[4] == '-' and dt_string[7] == '-' and
+            (dt_string[:4] + dt_string[5:7] + dt_string[8:]).isdigit()):
+        try:
+            return datetime.date(int(dt_string[:4]), int(dt_string[5:7]), int(dt_string[8:]))
+        except ValueError:
+            pass
+    # let strptime accept the same as before, like `2017-1-1`, or raise its error
+    return datetime.datetime.strptime(dt_string, YYYY_MM_DD).date()
+
+
+class DateCodec(object):
+    """
+    codec between date and `YYYY-MM-DD` string
+
+    dates in window [start, end] are looked up in precomputed tables, which are built
+    on first use, dates out of window are handled by parse_yyyy_mm_dd and strftime
+    """
+
+    def __init__(self, start=datetime.date(2000, 1, 1), end=datetime.date(2030, 12, 31)):
+        self.start = start
+        self.end = end
+        self._string_to_date = None
+        self._date_to_string = None
+
+    def _build(self):
+        string_to_date = {}
+        date_to_string = {}
+        one_day = datetime.timedelta(days=1)
+        date = self.start
+        while date <= self.end:
+            dt_string = date.strftime(YYYY_MM_DD)
+            string_to_date[dt_string] = date
+            date_to_string[date] = dt_string
+            date += one_day
+        self._string_to_date = string_to_date
+        self._date_to_string = date_to_string
+
+    def string_to_date(self, dt_string):
+        if self._string_to_date is None:
+            self._build()
+        date = self._string_to_date.get(dt_string)
+        if date is None:
+            date = parse_yyyy_mm_dd(dt_string)
+        return date
+
+    def date_to_string(self, date):
+        if self._date_to_string is None:
+            self._build()
+        dt_string = None
+        if type(date) is datetime.date:
+            dt_string = self._date_to_string.get(date)
+        if dt_string is None:
+            dt_string = date.strftime(YYYY_MM_DD)
+        return dt_string
+
+    def strings_to_dates(self, dt_strings):
+        if self._string_to_date is None:
+            self._build()
+        get = self._string_to_date.get
+        return [get(dt_string) or parse_yyyy_mm_dd(dt_string) for dt_string in dt_strings]
+
+    def dates_to_strings(self, dates):
+        return [self.date_to_string(date) for date in dates]
+
+
+DATE_CODEC = DateCodec()
+
+
+def set_date_window(start, end):
+    """
+    change window of precomputed dates, tables will be rebuilt on next use
+    """
+    global DATE_CODEC
+    DATE_CODEC = DateCodec(start, end)
+
+
 def string_to_date(dt_string, format=YYYY_MM_DD):
+    if format == YYYY_MM_DD:
+        return DATE_CODEC.string_to_date(dt_string)
     return datetime.datetime.strptime(dt_string, format).date()
 
 
+def strings_to_dates(dt_strings, format=YYYY_MM_DD):
+    if format == YYYY_MM_DD:
+        return DATE_CODEC.strings_to_dates(dt_strings)
+    return [string_to_date(dt_string, format) for dt_string in dt_strings]
+
+
 def date_to_string(date, format=YYYY_MM_DD):
+    if format == YYYY_MM_DD:
+        return DATE_CODEC.date_to_string(date)
     return date.strftime(format)
 
 
@@ -50,17 +50,72 @@ def memoize(f):
     return memodict(f)
 
 
+class GenerationCache(object):
+    """
+    bounded cache with approximate LRU eviction
+
+    keys live in two generations, when the young one is full, the old one is dropped
+    and the young one becomes old, keys hit in the old generation are promoted,
+    all operations are plain dict operations
+    """
+    _MISSING = object()
+
+    def __init__(self, size):
+        self.size = size
+        self._generation_size = max(size // 2, 1)
+        self.young = {}
+        self.old = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        value = self.young.get(key, self._MISSING)
+        if value is self._MISSING:
+            value = self.old.pop(key, self._MISSING)
+            if value is self._MISSING:
+                self.misses += 1
+                return default
+            self.set(key, value)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        if len(self.young) >= self._generation_size:
+            self.old = self.young
+            self.young = {}
+        self.young[key] = value
+
+    def clear(self):
+        self.young = {}
+        self.old = {}
+
+    def __len__(self):
+        return len(self.young) + len(self.old)
+
+    def stats(self):
+        return {'size': len(self), 'hits': self.hits, 'misses': self.misses}
+
+
+def datetime_to_json(o):
+    """
+    :return: json string of date or datetime, None for other types
+    """
+    if isinstance(o, datetime.datetime):
+        return tz.JSON_DATETIME_PREFIX + tz.to_iso_date_str(o)
+    elif isinstance(o, datetime.date):
+        return tz.JSON_DATE_PREFIX + tz.date_to_string(o)
+    return None
+
+
 class EnhancedEncoder(json.JSONEncoder):
     DATE_FORMAT = '_date:%Y-%m-%d'
     DATE_TIME_FORMAT = '_'
 
     def default(self, o):
-        if isinstance(o, datetime.datetime):
-            return '_dt:' + tz.to_iso_date_str(o)
-        elif isinstance(o, datetime.date):
-            return o.strftime(self.DATE_FORMAT)
-
-        return json.JSONEncoder.default(self, o)
+        value = datetime_to_json(o)
+        if value is None:
+            return json.JSONEncoder.default(self, o)
+        return value
 
 
 def load_with_datetime(pairs, format=EnhancedEncoder.DATE_FORMAT):
@@ -68,23 +123,34 @@ def load_with_datetime(pairs, format=EnhancedEncoder.DATE_FORMAT):
     d = {}
     for k, v in pairs:
         if isinstance(v, basestring):
-            if v.startswith('_date:'):
+            if v.startswith(tz.JSON_DATE_PREFIX):
                 # optimize for perf
                 try:
-                    d[k] = datetime.datetime.strptime(v, format).date()
+                    if format == EnhancedEncoder.DATE_FORMAT:
+                        v = tz.string_to_date(v[6:])
+                    else:
+                        v = datetime.datetime.strptime(v, format).date()
                 except ValueError:
-                    d[k] = v
-            if v.startswith('_dt:'):
+                    pass
+            elif v.startswith(tz.JSON_DATETIME_PREFIX):
                 try:
-                    d[k] = tz.parse_date(v[4:])
-                except ValueError:
-                    d[k] = v
-        else:
-            d[k] = v
+                    v = tz.parse_date(v[4:])
+                except TypeError:
+                    pass
+        d[k] = v
     return d
 
 
 def json_loads(data):
+    """
+    decode json without schema, dates are restored by prefix (see: EnhancedEncoder)
+    if the prefix is not in data at all, it is a single pass of C decoder without any hook
+
+    when the type of payload is known, use json.loads and restore dates by dto
+    fields (see: BaseDTO.from_dict), that only converts fields declared as date
+    """
+    if tz.JSON_DATE_PREFIX not in data and tz.JSON_DATETIME_PREFIX not in data:
+        return json.loads(data)
     return json.loads(data, object_pairs_hook=load_with_datetime)
 
 
@@ -1,12 +1,38 @@
 # Copyright (c) 2017 App Annie Inc. All rights reserved.
 
+import asynchat
+import asyncore
+import collections
+import hashlib
+import itertools
+import json
+import logging
 import re
+import socket
+import urllib
+import urlparse
+from BaseHTTPServer import BaseHTTPRequestHandler
 
 import flask
 
+import aio
+import codec
+import compression
+import deadline
+import encoder
 import pingpong
+import utils
+from cache import canonical_key
+from entry_point import TEXT_VARIANT
 from http_code import *
 
+# max bytes of request body, larger one gets 413
+MAX_BODY_SIZE = 16 * 1024 * 1024
+# bytes of stream queued for a client before the next line is read (see: AsyncInterface.pull)
+STREAM_HIGH_WATER = 256 * 1024
+
+log = logging.getLogger(__name__)
+
 
 class UnknownResponseObject(Exception):
     code = INTERNAL_ERROR
@@ -16,15 +42,44 @@ class NotFoundError(Exception):
     code = NOT_FOUND
 
 
+class MethodNotAllowedError(Exception):
+    code = METHOD_NOT_ALLOWED
+
+
+class BadBodyError(ValueError):
+    code = BAD_REQUEST
+
+
 class WebInterface(object):
     """
     Abstract wrapper for web frameworks, concrete implement should
     depends on each platform (Django,Flask, Tornado .etc)
     """
+    # decoder class of json body, like protocols.DTOJsonDecoder, None to decode by codec (see: codec.JsonCodec)
+    json_decoder = None
 
     def register(self, entry):
         pass
 
+    def decode_body(self, body, content_type):
+        """
+        body of POST, decoded the same way whether it was compressed or not
+        :param body: str, decompressed
+        :param content_type: value of `Content-Type`, json if codec of it is not registered
+        :return: dict of args
+        """
+        body_codec = codec.find(content_type) or codec.JSON_CODEC
+        try:
+            if body_codec is codec.JSON_CODEC and self.json_decoder is not None:
+                args = json.loads(body, cls=self.json_decoder)
+            else:
+                args = body_codec.decode(body)
+        except (ValueError, codec.CodecError), error:
+            raise BadBodyError('body is not valid %s: %s' % (body_codec.content_type, error))
+        if not isinstance(args, dict):
+            raise BadBodyError('body should be an object of args')
+        return args
+
     def render_response_to_client(self, response):
         """
         this method can return response to WebFrame
@@ -33,12 +88,65 @@ class WebInterface(object):
         """
         pass
 
+    def response_cache_key(self, entry, args, accept):
+        """
+        :param args: args restores from request
+        :param accept: `Accept` of request, responses in each codec are cached apart
+        :return: key in cache of entry, None if entry has no cache or args are invalid
+        """
+        if entry.cache is None:
+            return None
+        try:
+            return entry.cache_key(args, self.response_variant(entry, accept))
+        except Exception:
+            # invalid args are reported by the entry itself
+            return None
+
+    def response_variant(self, entry, accept):
+        """
+        :return: format of response, responses of the same args differ by it
+        """
+        return TEXT_VARIANT if entry.retype_is_string else codec.negotiate(accept).content_type
+
+    def version_etag(self, entry, args, accept, encoding=None):
+        """
+        :param args: args restores from request
+        :param encoding: content coding of response, compressed response has its own ETag
+        :return: ETag by version hook of entry, None if entry has no hook or the hook gives no version
+        """
+        if entry.version is None:
+            return None
+        try:
+            kwargs = entry.convert_arg_dict(args, direction='from_string')
+        except Exception:
+            # invalid args are reported by the entry itself
+            return None
+        try:
+            version = entry.version(**kwargs)
+        except Exception:
+            # response is still served, only without ETag
+            log.exception('version hook of %s failed', entry.key)
+            return None
+        if version is None:
+            return None
+        return make_etag(canonical_key(entry.key, self.response_variant(entry, accept), encoding, version, kwargs))
+
 
 class FlaskInterface(WebInterface):
+    # compressor of responses by `Accept-Encoding`, None to send them as they are (see: core.compression)
+    compressor = compression.Compressor()
+    # max bytes a compressed request body expands to, larger one gets 413
+    max_body_size = MAX_BODY_SIZE
+
     def __init__(self, flask_app):
         self.app = flask_app
         self.request = flask.request
 
+    @property
+    def json_decoder(self):
+        # json body is decoded like request.json of the app
+        return self.app.json_decoder
+
     def register(self, entry):
         """
         :param entry: EntryPoint
@@ -56,24 +164,621 @@ class FlaskInterface(WebInterface):
         else:
             render_resp = self.render_response_to_client
 
-        def flask_entry(**path_args):
-            args = self.input_args(path_args)
-            response = pingpong.pack_result(callback=lambda: entry.call_from_request(**args))
+        def render(args):
+            if entry.cache is not None:
+                return self.render_cached(entry, args)
+            response = pingpong.pack_result(callback=lambda: entry.call_from_request(**args),
+                                            plain=entry.retype_is_string)
+            if pingpong.is_stream(response.get('data')):
+                return self.render_stream_to_client(response.data)
             return render_resp(response)
 
+        def flask_entry(**path_args):
+            # budget of caller applies to the entry and remote calls made by it (see: core.deadline)
+            at = deadline.from_header(self.request.headers.get(deadline.HEADER))
+            with deadline.Scope(at):
+                response = handle(path_args)
+            if at is not None and response.is_streamed:
+                # streamed body is produced after the view returns, out of the scope above
+                response.response = deadline.scoped(response.response, at)
+            return response
+
+        def handle(path_args):
+            try:
+                args = self.input_args(path_args)
+            except Exception, error:
+                # body could not be read, answered in error response like errors of entry
+                response = pingpong.pack_result(callback=lambda: _raise(error))
+                return self.compress_response(self.render_response_to_client(response))
+            if self.request.method != 'GET':
+                return self.compress_response(flask.make_response(render(args)))
+            # conditional GET, unchanged data gets 304 without calling the entry if it has version hook
+            etag = self.version_etag(entry, args, self.request.headers.get('Accept'), self.response_encoding())
+            if etag is not None and etag in self.request.if_none_match:
+                return self.render_not_modified(etag)
+            return self.make_conditional(self.compress_response(flask.make_response(render(args))), etag)
+
         flask_entry.func_name = entry.key
         decorator(flask_entry)
 
     def input_args(self, path_args):
         entry_point_arg_dict = {k: v for k, v in self.request.args.items()}
         entry_point_arg_dict.update(path_args)
-        if self.request.method == 'POST':
-            entry_point_arg_dict.update(self.request.json)
+        body = self.request.get_data() if self.request.method == 'POST' else None
+        if body:
+            # compressed body (see: EntryPoint.request_compressor)
+            body = compression.decompress(body, self.request.headers.get('Content-Encoding'), self.max_body_size)
+            entry_point_arg_dict.update(self.decode_body(body, self.request.content_type))
         print '>>> [%s]Path Args:%s, Query Args:%s' % (self.request.method, path_args, entry_point_arg_dict)
         return entry_point_arg_dict
 
+    def response_encoding(self):
+        """
+        :return: content coding negotiated by `Accept-Encoding`, None if responses are not compressed
+        """
+        if self.compressor is None:
+            return None
+        return compression.negotiate(self.request.headers.get('Accept-Encoding'))
+
+    def compress_response(self, response):
+        """
+        compress body of response by negotiated coding, NDJSON stream and cached body, which has
+        its own compressed variants (see: render_precompressed), are sent as they are
+        """
+        if self.compressor is None or response.mimetype == NDJSON or getattr(response, 'precompressed', False):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self.response_encoding()
+        if encoding is None or 'Content-Encoding' in response.headers:
+            return response
+        if response.is_streamed:
+            return self.compress_stream(response, encoding)
+        compressed = self.compressor.compress(response.get_data(), encoding)
+        if compressed is not None:
+            response.set_data(compressed)
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+    def compress_stream(self, response, encoding):
+        """
+        chunks are read till the body reaches min size of compressor, a shorter body is sent
+        as it is, a longer one is compressed chunk by chunk while it is sent, with no Content-Length
+        """
+        chunks = response.iter_encoded()
+        head = []
+        size = 0
+        for chunk in chunks:
+            head.append(chunk)
+            size += len(chunk)
+            if size >= self.compressor.min_size:
+                break
+        else:
+            # whole body is buffered, left as it is by compressor for being short
+            response.set_data(''.join(head))
+            return self.compress_response(response)
+        response.response = self.compressor.compress_stream(itertools.chain(head, chunks), encoding)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
     def render_response_to_client(self, response):
-        return flask.jsonify(response), response.code
+        # codec is negotiated by `Accept` of request, json by default (see: core.codec)
+        wire = codec.negotiate(self.request.headers.get('Accept'))
+        response, chunks = self.encode_response(wire, response)
+        return flask.Response(chunks, status=response.code, mimetype=wire.content_type)
+
+    def encode_response(self, wire, response):
+        """
+        the first chunk is encoded before status and headers are sent, so an error found early
+        gets into error response instead of a truncated body (see: pingpong.prepare)
+        :return: (response, chunks), response is the error response if encoding fails
+        """
+        try:
+            chunks = iter(wire.iter_encode(response))
+            first = next(chunks, '')
+        except Exception, error:
+            response = pingpong.pack_result(callback=lambda: _raise(error))
+            return response, wire.iter_encode(response)
+        return response, itertools.chain((first,), chunks)
+
+    def render_cached(self, entry, args):
+        """
+        send encoded response in cache of entry, on miss the entry is called and its
+        successful response is encoded at once and stored
+        """
+        key = self.response_cache_key(entry, args, self.request.headers.get('Accept'))
+        if key is not None:
+            hit = entry.cache.get(key)
+            if hit is not None:
+                content_type, body, compressed = hit
+                return self.render_precompressed(content_type, body, compressed)
+        response = pingpong.pack_result(callback=lambda: entry.call_from_request(**args),
+                                        plain=entry.retype_is_string)
+        if pingpong.is_stream(response.get('data')):
+            return self.render_stream_to_client(response.data)
+        if entry.retype_is_string:
+            content_type, body = 'text/html', response.data or response.error
+            if not isinstance(body, basestring):
+                return body
+        else:
+            wire = codec.negotiate(self.request.headers.get('Accept'))
+            try:
+                body = ''.join(wire.iter_encode(response))
+            except Exception, error:
+                response = pingpong.pack_result(callback=lambda: _raise(error))
+                body = wire.encode(response)
+            content_type = wire.content_type
+        if key is not None and response.code == OK:
+            # compressed variants are stored along, filled by the first request of each coding
+            compressed = {}
+            entry.cache.set(key, (content_type, body, compressed), len(body))
+            return self.render_precompressed(content_type, body, compressed)
+        return flask.Response(body, status=response.code, mimetype=content_type)
+
+    def render_precompressed(self, content_type, body, compressed):
+        """
+        :param compressed: dict of coding => compressed body of cached response, '' if it is not worth it
+        """
+        response = flask.Response(body, status=OK, mimetype=content_type)
+        # variants are compressed once per entry of cache, not by compress_response on each hit
+        response.precompressed = True
+        encoding = self.response_encoding()
+        if encoding is None:
+            return response
+        variant = compressed.get(encoding)
+        if variant is None:
+            variant = compressed[encoding] = self.compressor.compress(body, encoding) or ''
+        response.vary.add('Accept-Encoding')
+        if variant:
+            response.set_data(variant)
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+    def make_conditional(self, response, etag=None):
+        """
+        add ETag to successful response of GET, 304 if it matches `If-None-Match`
+        :param etag: ETag by version of entry, hash of body if None, streamed body gets no ETag
+            without version, hashing it would hold the whole body in memory
+        """
+        if response.status_code != OK or response.mimetype == NDJSON:
+            return response
+        if etag is None:
+            if response.is_streamed:
+                return response
+            etag = make_etag(response.mimetype, response.get_data())
+        response.set_etag(etag)
+        response.vary.add('Accept')
+        if etag in self.request.if_none_match:
+            return self.render_not_modified(etag)
+        return response
+
+    def render_not_modified(self, etag):
+        response = flask.Response(status=NOT_MODIFIED)
+        response.set_etag(etag)
+        response.vary.add('Accept')
+        if self.compressor is not None:
+            response.vary.add('Accept-Encoding')
+        return response
+
+    def render_stream_to_client(self, iterator):
+        """
+        stream items of generator entry as NDJSON, one record per line (see: pingpong.pack_stream)
+        """
+        lines = (encoder.encode(record) + '\n' for record in pingpong.pack_stream(iterator))
+        # generator runs after view returns, keep request context for entries reading flask.request or g
+        return flask.Response(flask.stream_with_context(lines), status=OK, mimetype=NDJSON)
 
     def convert_path(self, url_path):
         return re.sub(r"(\{[A-Za-z0-9_]+\})", lambda x: '<string:%s>' % x.group()[1:-1], url_path)
+
+
+class AsyncInterface(WebInterface):
+    """
+    http server on event loop (see: core.aio), a single thread holds all connections
+
+    coroutine entries (see: aio.coroutine) run in the loop, so thousands of them could wait
+    for I/O at the same time, plain functions run in executor of the loop, requests over
+    `max_concurrency` wait in a queue until a running one finishes
+
+        interface = AsyncInterface(port=5000, max_concurrency=5000)
+        WebServiceCenter.bind_web_interface(interface)
+        interface.serve_forever()
+
+    :param host: address to listen
+    :param port: port to listen, 0 to pick a free one
+    :param max_concurrency: max number of requests in process
+    :param loop: aio.EventLoop, the default one of process if not given, it should be the loop
+        used by coroutine entries
+    """
+    backlog = 1024
+    max_body_size = MAX_BODY_SIZE
+    stream_high_water = STREAM_HIGH_WATER
+
+    def __init__(self, host='127.0.0.1', port=5000, max_concurrency=1000, loop=None):
+        self.host = host
+        self.port = port
+        self.max_concurrency = max_concurrency
+        self.loop = loop or aio.get_event_loop()
+        self.routes = []
+        self.in_flight = 0
+        self.waiting = collections.deque()
+        self.server = None
+
+    def register(self, entry):
+        """
+        :param entry: EntryPoint
+        :return:
+        """
+        if entry.support_get:
+            default_method = ['GET', 'POST']
+        else:
+            default_method = ['POST']
+        self.routes.append((self.convert_path(entry.path), default_method, entry))
+        log.debug('AsyncInterface connected @ %s %s', entry.path, default_method)
+
+    def convert_path(self, url_path):
+        parts = re.split(r"(\{[A-Za-z0-9_]+\})", url_path)
+        pattern = ''.join('(?P<%s>[^/]+)' % part[1:-1] if index % 2 else re.escape(part)
+                          for index, part in enumerate(parts))
+        return re.compile('^%s$' % pattern)
+
+    def listen(self):
+        self.server = _HttpServer(self)
+        self.port = self.server.getsockname()[1]
+        log.debug('AsyncInterface listen @ %s:%s', self.host, self.port)
+        return self.server
+
+    def serve_forever(self):
+        if self.server is None:
+            self.listen()
+        self.loop.run_forever()
+
+    def match(self, method, path):
+        """
+        :return: entry, path args
+        """
+        allowed = False
+        for pattern, methods, entry in self.routes:
+            matched = pattern.match(path)
+            if matched:
+                if method in methods:
+                    return entry, matched.groupdict()
+                allowed = True
+        if allowed:
+            raise MethodNotAllowedError('%s is not allowed on %s' % (method, path))
+        raise NotFoundError('no entry on %s' % path)
+
+    def handle_request(self, channel, request):
+        if self.in_flight >= self.max_concurrency:
+            self.waiting.append((channel, request))
+            return
+        self.in_flight += 1
+        self.start(channel, request)
+
+    def finish_request(self):
+        self.in_flight -= 1
+        while self.waiting and self.in_flight < self.max_concurrency:
+            channel, request = self.waiting.popleft()
+            # client gave up while waiting
+            if channel.connected:
+                self.in_flight += 1
+                self.start(channel, request)
+
+    def start(self, channel, request):
+        try:
+            entry, path_args = self.match(request.method, request.path)
+            args = self.input_args(request, path_args)
+        except Exception, error:
+            response = pingpong.pack_result(callback=lambda: _raise(error))
+            return self.reply(channel, request, None, response)
+        cache_key = self.response_cache_key(entry, args, request.headers.get('accept'))
+        if cache_key is not None:
+            hit = entry.cache.get(cache_key)
+            if hit is not None:
+                return self.send(channel, request, OK, hit[0], hit[1])
+        callback = lambda: entry.call_from_request(**args)
+        if aio.is_coroutine_function(entry.original_callable):
+            try:
+                # steps of coroutine run out of the scope of deadline, it is only checked before start
+                deadline.check(request.deadline)
+                task = self.spawn(entry, args, callback)
+            except Exception, error:
+                task = aio.Future()
+                task.set_exception(error)
+            task.add_done_callback(lambda future: self.reply(channel, request, entry, pingpong.pack_result(
+                callback=future.result, plain=entry.retype_is_string), cache_key))
+        else:
+            # result is also encoded in executor, only sending is left to the loop
+            rendered = self.loop.run_in_executor(lambda: self.render_in_time(request, entry, callback, cache_key))
+            rendered.add_done_callback(lambda future: self.send_rendered(channel, request, future))
+
+    def spawn(self, entry, args, callback):
+        """
+        run coroutine entry, identical calls share the running task if entry is single flight
+        """
+        if entry.single_flight is not None:
+            key = entry.flight_key(entry.convert_arg_dict(args, direction='from_string'))
+            if key is not None:
+                return entry.single_flight.share(key, lambda: self.loop.spawn(callback()))
+        return self.loop.spawn(callback())
+
+    def input_args(self, request, path_args):
+        entry_point_arg_dict = dict(urlparse.parse_qsl(request.query, keep_blank_values=True))
+        entry_point_arg_dict.update(path_args)
+        if request.method == 'POST' and request.body:
+            body = compression.decompress(request.body, request.headers.get('content-encoding'), self.max_body_size)
+            entry_point_arg_dict.update(self.decode_body(body, request.headers.get('content-type')))
+        log.debug('[%s]Path Args:%s, Query Args:%s', request.method, path_args, entry_point_arg_dict)
+        return entry_point_arg_dict
+
+    def render_in_time(self, request, entry, callback, cache_key=None):
+        """
+        call entry within deadline of request, expired request is not called, it may have waited in queue
+        """
+        with deadline.Scope(request.deadline):
+            response = pingpong.pack_result(callback=callback, plain=entry.retype_is_string)
+            return self.render(request, entry, response, cache_key)
+
+    def render(self, request, entry, response, cache_key=None):
+        """
+        :param response: response dict (see: pingpong.pack_result)
+        :param cache_key: successful response is stored in cache of entry with this key
+        :return: status, content type, body, body is an iterator of lines for stream
+        """
+        if pingpong.is_stream(response.get('data')):
+            lines = (encoder.encode(record) + '\n' for record in pingpong.pack_stream(response.data))
+            return OK, NDJSON, lines
+        if entry is not None and entry.retype_is_string and response.code == OK:
+            content_type, body = 'text/html; charset=utf-8', response.data
+        else:
+            wire = codec.negotiate(request.headers.get('accept'))
+            content_type, body = wire.content_type, wire.encode(response)
+        if cache_key is not None and response.code == OK:
+            entry.cache.set(cache_key, (content_type, body, {}), len(body))
+        return response.code, content_type, body
+
+    def reply(self, channel, request, entry, response, cache_key=None):
+        try:
+            rendered = self.render(request, entry, response, cache_key)
+        except Exception, error:
+            rendered = self.render(request, None, pingpong.pack_result(callback=lambda: _raise(error)))
+        self.send(channel, request, *rendered)
+
+    def send_rendered(self, channel, request, future):
+        try:
+            rendered = future.result()
+        except Exception, error:
+            # result could not be encoded
+            rendered = self.render(request, None, pingpong.pack_result(callback=lambda: _raise(error)))
+        self.send(channel, request, *rendered)
+
+    def send(self, channel, request, status, content_type, body):
+        if isinstance(body, basestring):
+            channel.send_response(request, status, content_type, body)
+            self.finish_request()
+            return
+        channel.start_stream(request, status, content_type)
+        self.pull(channel, request, deadline.scoped(body, request.deadline))
+
+    def pull(self, channel, request, lines):
+        """
+        read the next line of stream in executor, one line at a time, so no thread is held
+        while lines wait to be sent, a slow reader delays the read (see: _HttpChannel.when_drained)
+        :param lines: generator of stream
+        """
+        read = self.loop.run_in_executor(next, lines, None)
+        read.add_done_callback(lambda future: self.push_line(channel, request, lines, future))
+
+    def push_line(self, channel, request, lines, future):
+        try:
+            line = future.result()
+        except Exception:
+            # errors of entry are in the last record (see: pingpong.pack_stream), this one is not
+            log.exception('stream of %s is broken', request.path)
+            line = None
+        if line is not None and not channel.connected:
+            # client is gone, finally blocks of generator may block too
+            self.loop.run_in_executor(lines.close)
+            line = None
+        if line is None:
+            channel.end_stream(request)
+            self.finish_request()
+            return
+        channel.send_chunk(request, line)
+        channel.when_drained(lambda: self.pull(channel, request, lines))
+
+    def close(self):
+        self.loop.close()
+
+
+def make_etag(*parts):
+    """
+    :param parts: str, unicode is encoded as utf-8
+    :return: strong ETag of parts, without quotes
+    """
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part.encode('utf-8') if isinstance(part, unicode) else part)
+        digest.update('\n')
+    return digest.hexdigest()
+
+
+def _raise(error):
+    raise error
+
+
+class _HttpServer(asyncore.dispatcher):
+    def __init__(self, interface):
+        asyncore.dispatcher.__init__(self, map=interface.loop.map)
+        self.interface = interface
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind((interface.host, interface.port))
+        self.listen(interface.backlog)
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is not None:
+            _HttpChannel(self.interface, pair[0], self.interface.loop.map)
+
+    def writable(self):
+        return False
+
+
+class _HttpChannel(asynchat.async_chat):
+    """
+    one client connection, requests are handled one by one, pipelined ones wait in `pending`
+    """
+
+    def __init__(self, interface, sock, loop_map):
+        asynchat.async_chat.__init__(self, sock, map=loop_map)
+        self.interface = interface
+        self.set_terminator('\r\n\r\n')
+        self.buffer = []
+        self.request = None
+        self.pending = collections.deque()
+        self.busy = False
+        # bytes pushed but not sent, and callback waiting for them to drop below high water of stream
+        self.unsent = 0
+        self.on_drained = None
+        self.rejected = False
+
+    def collect_incoming_data(self, data):
+        # rest of a rejected request is dropped
+        if not self.rejected:
+            self.buffer.append(data)
+
+    def push(self, data):
+        self.unsent += len(data)
+        asynchat.async_chat.push(self, data)
+        # called by callbacks of loop, data not sent at once needs POLLOUT
+        self.interface.loop.touch(self)
+
+    def send(self, data):
+        sent = asynchat.async_chat.send(self, data)
+        self.unsent -= sent
+        if self.on_drained is not None and self.unsent < self.interface.stream_high_water:
+            self.drained()
+        return sent
+
+    def when_drained(self, callback):
+        """
+        call back once less than high water of stream is queued for the client, or it is gone
+        """
+        if self.unsent < self.interface.stream_high_water or not self.connected:
+            callback()
+        else:
+            self.on_drained = callback
+
+    def drained(self):
+        callback, self.on_drained = self.on_drained, None
+        callback()
+
+    def close_when_done(self):
+        asynchat.async_chat.close_when_done(self)
+        self.interface.loop.touch(self)
+
+    def found_terminator(self):
+        data = ''.join(self.buffer)
+        self.buffer = []
+        if self.request is None:
+            request = self.parse_head(data)
+            if request is None:
+                self.reject(BAD_REQUEST, 'Bad Request')
+                return
+            try:
+                length = int(request.headers.get('content-length') or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                self.reject(BAD_REQUEST, 'Bad Request')
+                return
+            if length > self.interface.max_body_size:
+                self.reject(REQUEST_ENTITY_TOO_LARGE, 'Request Entity Too Large')
+                return
+            if length > 0:
+                self.request = request
+                self.set_terminator(length)
+                return
+        else:
+            request, self.request = self.request, None
+            request.body = data
+        self.set_terminator('\r\n\r\n')
+        self.pending.append(request)
+        self.next_request()
+
+    def reject(self, status, reason):
+        """
+        answer a request which could not be read and close, the rest of it is not read
+        """
+        self.push('HTTP/1.1 %d %s\r\nContent-Length: 0\r\nConnection: close\r\n\r\n' % (status, reason))
+        self.close_when_done()
+        self.rejected = True
+        self.set_terminator(None)
+
+    def parse_head(self, data):
+        lines = data.lstrip('\r\n').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ', 2)
+        except ValueError:
+            return None
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        path, _, query = target.partition('?')
+        connection = headers.get('connection', '').lower()
+        if version == 'HTTP/1.0':
+            keep_alive = connection == 'keep-alive'
+        else:
+            keep_alive = connection != 'close'
+        # deadline is counted from arrival, time in queue is taken from the budget of caller
+        return utils.ObjectDict(method=method.upper(), path=urllib.unquote(path), query=query, headers=headers,
+                                body='', version=version, keep_alive=keep_alive,
+                                deadline=deadline.from_header(headers.get(deadline.HEADER.lower())))
+
+    def next_request(self):
+        if not self.busy and self.pending:
+            self.busy = True
+            self.interface.handle_request(self, self.pending.popleft())
+
+    def head(self, request, status, content_type, extra=''):
+        return 'HTTP/1.1 %d %s\r\nContent-Type: %s\r\nConnection: %s\r\n%s\r\n' % (
+            status, BaseHTTPRequestHandler.responses.get(status, ('',))[0], content_type,
+            'keep-alive' if request.keep_alive else 'close', extra)
+
+    def send_response(self, request, status, content_type, body):
+        if isinstance(body, unicode):
+            body = body.encode('utf-8')
+        if self.connected:
+            self.push(self.head(request, status, content_type, 'Content-Length: %d\r\n' % len(body)) + body)
+        self.end_request(request)
+
+    def start_stream(self, request, status, content_type):
+        # HTTP/1.0 has no chunked encoding, the end of body is told by closing connection
+        request.chunked = request.version != 'HTTP/1.0'
+        if not request.chunked:
+            request.keep_alive = False
+        if self.connected:
+            self.push(self.head(request, status, content_type,
+                                'Transfer-Encoding: chunked\r\n' if request.chunked else ''))
+
+    def send_chunk(self, request, data):
+        if data and self.connected:
+            self.push('%x\r\n%s\r\n' % (len(data), data) if request.chunked else data)
+
+    def end_stream(self, request):
+        if request.chunked and self.connected:
+            self.push('0\r\n\r\n')
+        self.end_request(request)
+
+    def end_request(self, request):
+        self.busy = False
+        if not request.keep_alive:
+            self.close_when_done()
+        else:
+            self.next_request()
+
+    def handle_close(self):
+        self.close()
+        if self.on_drained is not None:
+            self.drained()
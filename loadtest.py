@@ -0,0 +1,388 @@
+"""
+record and replay load test of the json-rpc endpoint
+
+capture live traffic, one json record per line, the same shape as requests.jsonl:
+
+    {"request_id": "17", "title": "get_categories", "body": "<raw json-rpc request>",
+     "path": "/api", "timestamp": 1508313600.123}
+
+    import loadtest
+    loadtest.capture(app, 'requests.jsonl')
+
+replay it in process through flask test client, or over http against a local server
+(started by the tool when no --url is given), and report throughput, latency and
+error rate per method:
+
+    python loadtest.py requests.jsonl --mode inprocess --concurrency 8 --speed 10
+    python loadtest.py requests.jsonl --mode http --rate 200 --duration 30
+
+lines without a json-rpc body, like the entries of the backlog, are skipped
+"""
+import argparse
+import collections
+import itertools
+import json
+import math
+import Queue
+import StringIO
+import sys
+import threading
+import time
+
+import requests
+
+API_PATH = '/api'
+
+
+def methods_of(payload):
+    """
+    :param payload: decoded json-rpc request, single or batch
+    :return: name of method, methods of batch are joined by comma
+    """
+    if isinstance(payload, list):
+        return ','.join(methods_of(p) for p in payload)
+    if isinstance(payload, dict):
+        return unicode(payload.get('method'))
+    return 'invalid'
+
+
+class CaptureMiddleware(object):
+    """
+    wsgi middleware writes json-rpc requests to a jsonl file, the request is passed on untouched
+
+    :param wsgi_app: wrapped wsgi application
+    :param path: file to append records to
+    :param paths: only requests to these paths are recorded
+    """
+
+    def __init__(self, wsgi_app, path, paths=(API_PATH,)):
+        self.wsgi_app = wsgi_app
+        self.path = path
+        self.paths = set(paths)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._file = open(path, 'a')
+
+    def __call__(self, environ, start_response):
+        if environ.get('REQUEST_METHOD') == 'POST' and environ.get('PATH_INFO') in self.paths:
+            body = self.read_body(environ)
+            self.record(environ['PATH_INFO'], body)
+        return self.wsgi_app(environ, start_response)
+
+    def read_body(self, environ):
+        if environ.get('HTTP_TRANSFER_ENCODING', '').lower() == 'chunked':
+            # no length is given, the server hands over the dechunked body till the end
+            body = environ['wsgi.input'].read()
+            environ['CONTENT_LENGTH'] = str(len(body))
+        else:
+            try:
+                length = int(environ.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                length = 0
+            body = environ['wsgi.input'].read(length) if length > 0 else ''
+        # put the body back for the application
+        environ['wsgi.input'] = StringIO.StringIO(body)
+        return body
+
+    def record(self, path, body):
+        try:
+            title = methods_of(json.loads(body))
+        except ValueError:
+            title = 'invalid'
+        with self._lock:
+            line = json.dumps({'request_id': str(next(self._ids)), 'title': title, 'body': body,
+                               'path': path, 'timestamp': time.time()})
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def capture(app, path, paths=(API_PATH,)):
+    """
+    record json-rpc traffic of flask app into path
+    :return: CaptureMiddleware
+    """
+    app.wsgi_app = CaptureMiddleware(app.wsgi_app, path, paths)
+    return app.wsgi_app
+
+
+def load_records(path):
+    """
+    :return: captured records sorted by timestamp, lines which are not json-rpc are skipped
+    """
+    records = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+                payload = json.loads(record['body'])
+            except (ValueError, KeyError, TypeError):
+                continue
+            calls = payload if isinstance(payload, list) else [payload]
+            if not calls or not all(isinstance(call, dict) and 'method' in call for call in calls):
+                continue
+            record.setdefault('path', API_PATH)
+            record.setdefault('title', methods_of(payload))
+            records.append(record)
+    records.sort(key=lambda r: r.get('timestamp', 0))
+    return records
+
+
+def is_error(status, content):
+    """
+    failed http status, json-rpc error, or errors reported by aa_data_api
+    """
+    if status != 200:
+        return True
+    try:
+        responses = json.loads(content)
+    except ValueError:
+        return True
+    if not isinstance(responses, list):
+        responses = [responses]
+    for response in responses:
+        if not isinstance(response, dict) or response.get('error'):
+            return True
+        result = response.get('result')
+        if isinstance(result, dict) and result.get('errors'):
+            return True
+    return False
+
+
+class TestClientTransport(object):
+    """
+    send requests to flask app in process, each thread has its own test client
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def send(self, path, body):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.post(path, data=body, content_type='application/json')
+        return response.status_code, response.get_data()
+
+    def close(self):
+        pass
+
+
+class HttpTransport(object):
+    """
+    send requests over http, each thread keeps its own keep-alive session
+    """
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self._local = threading.local()
+
+    def send(self, path, body):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        response = session.post(self.url + path, data=body, headers={'Content-Type': 'application/json'})
+        return response.status_code, response.content
+
+    def close(self):
+        pass
+
+
+class LocalServerTransport(HttpTransport):
+    """
+    start a threaded werkzeug server of app on a free port, and send requests to it
+    """
+
+    def __init__(self, app, host='127.0.0.1'):
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        self.server = make_server(host, 0, app, threaded=True, request_handler=QuietHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        super(LocalServerTransport, self).__init__('http://%s:%d' % (host, self.server.server_port))
+
+    def close(self):
+        self.server.shutdown()
+
+
+def schedule(records, speed=1.0, rate=None, duration=None):
+    """
+    :param speed: time compression, 10 replays 10 times faster than captured, 0 sends as fast as possible
+    :param rate: send at fixed requests per second instead of captured timestamps, records are cycled
+    :param duration: stop scheduling after seconds, only used with rate
+    :return: iterator of (offset in seconds, record), offset None means send at once
+    """
+    if rate:
+        count = int(rate * duration) if duration else len(records)
+        for index in xrange(count):
+            yield index / float(rate), records[index % len(records)]
+        return
+    if not records:
+        return
+    start = records[0].get('timestamp', 0)
+    for record in records:
+        if not speed:
+            yield None, record
+        else:
+            yield (record.get('timestamp', start) - start) / float(speed), record
+
+
+def replay(records, transport, concurrency=8, speed=1.0, rate=None, duration=None):
+    """
+    open loop replay: requests are sent on schedule no matter how long earlier ones take,
+    at most `concurrency` are in flight, latency counts from the scheduled time, so that
+    waiting for a free worker is not hidden
+
+    :return: Report
+    """
+    report = Report()
+    jobs = Queue.Queue(maxsize=concurrency * 4)
+
+    def worker():
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            scheduled_at, record = job
+            try:
+                status, content = transport.send(record['path'], record['body'])
+                error = is_error(status, content)
+            except Exception:
+                error = True
+            report.add(record['title'], time.time() - scheduled_at, error)
+
+    workers = [threading.Thread(target=worker) for _ in xrange(concurrency)]
+    for thread in workers:
+        thread.daemon = True
+        thread.start()
+    report.start()
+    begin = time.time()
+    for offset, record in schedule(records, speed, rate, duration):
+        if offset is None:
+            scheduled_at = time.time()
+        else:
+            scheduled_at = begin + offset
+            delay = scheduled_at - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        jobs.put((scheduled_at, record))
+    for _ in workers:
+        jobs.put(None)
+    for thread in workers:
+        thread.join()
+    report.stop()
+    return report
+
+
+def percentile(sorted_values, fraction):
+    """
+    nearest rank percentile
+    """
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(math.ceil(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class Report(object):
+    """
+    latency and errors per method, thread safe
+    """
+
+    def __init__(self):
+        self.latencies = collections.defaultdict(list)
+        self.errors = collections.defaultdict(int)
+        self._lock = threading.Lock()
+        self.started = self.stopped = None
+
+    def start(self):
+        self.started = time.time()
+
+    def stop(self):
+        self.stopped = time.time()
+
+    @property
+    def elapsed(self):
+        return (self.stopped or time.time()) - self.started
+
+    def add(self, method, latency, error):
+        with self._lock:
+            self.latencies[method].append(latency)
+            if error:
+                self.errors[method] += 1
+
+    def summary(self):
+        """
+        :return: dict of method => stats, `*` is the total
+        """
+        elapsed = max(self.elapsed, 1e-9)
+        rows = {}
+        groups = dict(self.latencies)
+        groups['*'] = [latency for values in self.latencies.values() for latency in values]
+        for method, values in groups.items():
+            values = sorted(values)
+            errors = sum(self.errors.values()) if method == '*' else self.errors[method]
+            rows[method] = {
+                'count': len(values),
+                'throughput': len(values) / elapsed,
+                'error_rate': float(errors) / len(values) if values else 0.0,
+                'p50': percentile(values, 0.50) * 1000,
+                'p95': percentile(values, 0.95) * 1000,
+                'p99': percentile(values, 0.99) * 1000,
+            }
+        return rows
+
+    def format(self):
+        lines = ['%-32s %8s %10s %8s %10s %10s %10s' % ('method', 'count', 'req/s', 'errors', 'p50 ms',
+                                                        'p95 ms', 'p99 ms')]
+        rows = self.summary()
+        for method in sorted(rows, key=lambda m: (m == '*', m)):
+            row = rows[method]
+            lines.append('%-32s %8d %10.1f %7.1f%% %10.2f %10.2f %10.2f' % (
+                method, row['count'], row['throughput'], row['error_rate'] * 100, row['p50'], row['p95'], row['p99']))
+        return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='replay captured json-rpc traffic')
+    parser.add_argument('path', help='jsonl file written by capture')
+    parser.add_argument('--mode', choices=('inprocess', 'http'), default='inprocess')
+    parser.add_argument('--url', help='server to replay against in http mode, a local one is started if omitted')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='time compression of captured timestamps, 0 for as fast as possible')
+    parser.add_argument('--rate', type=float, help='fixed requests per second instead of captured timestamps')
+    parser.add_argument('--duration', type=float, help='seconds to run with --rate')
+    parser.add_argument('--json', action='store_true', help='print report as json')
+    args = parser.parse_args(argv)
+
+    records = load_records(args.path)
+    if not records:
+        print 'no json-rpc records in %s' % args.path
+        return 1
+    if args.mode == 'http' and args.url:
+        transport = HttpTransport(args.url)
+    else:
+        from app import app
+        transport = TestClientTransport(app) if args.mode == 'inprocess' else LocalServerTransport(app)
+    try:
+        report = replay(records, transport, args.concurrency, args.speed, args.rate, args.duration)
+    finally:
+        transport.close()
+    print json.dumps(report.summary(), indent=2, sort_keys=True) if args.json else report.format()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
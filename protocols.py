@@ -1,6 +1,16 @@
 import json
+import threading
+from inspect import getargspec
+from multiprocessing.pool import ThreadPool
+
+import flask
+from flask_jsonrpc import JSONRPC, _parse_sig
+from flask_jsonrpc.exceptions import InvalidRequestError, OtherError
+from flask_jsonrpc.site import JSONRPC_VERSION_DEFAULT, JSONRPCSite
 
 from core.base import BaseDTO
+from core.cache import ResponseCache, canonical_key
+from core.encoder import DTOEncoder
 from functools import wraps
 
 from errors import APIError
@@ -11,21 +21,39 @@ class DTOJsonEncoder(json.JSONEncoder):
         if isinstance(dto, BaseDTO):
             return dto.to_dict()
         else:
-            return super().default(o)
+            return json.JSONEncoder.default(self, dto)
+
+    def iterencode(self, o, _one_shot=False):
+        """
+        walk dto directly instead of building the whole dict tree first,
+        pretty print and sorted keys still go through json.JSONEncoder
+        """
+        if self.indent is not None or self.sort_keys or not self.ensure_ascii:
+            return json.JSONEncoder.iterencode(self, o, _one_shot)
+        return DTOEncoder(default=self.default, separators=(self.item_separator, self.key_separator)).iterencode(o)
 
 
 class DTOJsonDecoder(json.JSONDecoder):
+    # restore dto by lazy_from_dict, fields are validated on first access
+    lazy = False
+
     def __init__(self, *args, **kwargs):
         json.JSONDecoder.__init__(self, object_hook=self.object_hook, *args, **kwargs)
 
     def object_hook(self, dto_dict):
         if isinstance(dto_dict, dict) and '__cls__' in dto_dict:
             dto_class = BaseDTO.find(dto_dict['__cls__'])
+            if self.lazy:
+                return dto_class.lazy_from_dict(dto_dict)
             return dto_class.from_dict(dto_dict)
         else:
             return dto_dict
 
 
+class LazyDTOJsonDecoder(DTOJsonDecoder):
+    lazy = True
+
+
 def aa_data_api(f):
 
     @wraps(f)
@@ -48,3 +76,180 @@ def aa_data_api(f):
                         'message': e.message
                     }}
     return _decorator
+
+
+class RawJSON(str):
+    """
+    encoded json, spliced into response as it is
+    """
+
+
+class CachedJSONRPC(JSONRPC):
+    """
+    JSONRPC accepts `cache` on method, the encoded result is cached by params (see: core.cache),
+    hits skip the method and encoding, it works with ParallelJSONRPCSite
+
+        @jsonrpc.method('get_categories', cache=ResponseCache(ttl=300))
+        @aa_data_api
+        def get_categories(id, name):
+            ...
+
+    cache is looked up inside the registered method, so that credentials of authenticated
+    method and params are checked on every call, hits included
+    """
+
+    def method(self, name, authenticated=False, safe=False, validate=False, cache=None, **options):
+        register = super(CachedJSONRPC, self).method(name, authenticated, safe, validate, **options)
+        cache = ResponseCache() if cache is True else cache
+        if cache is not None and not isinstance(self.site, ParallelJSONRPCSite):
+            raise TypeError('cache of method %s needs ParallelJSONRPCSite to send cached json' % name)
+
+        def decorator(f):
+            if cache is None:
+                return register(f)
+
+            def cached_call(*args, **kwargs):
+                # params are the same as in request, credentials are already taken by auth backend
+                key = canonical_key(_f.json_method, kwargs or list(args))
+                result = cache.get(key)
+                if result is not None:
+                    return result
+                result = f(*args, **kwargs)
+                # errors caught by aa_data_api are not cached
+                if isinstance(result, dict) and result.get('errors'):
+                    return result
+                result = RawJSON(flask.json.dumps(result))
+                cache.set(key, result)
+                return result
+
+            _f = register(cached_call)
+            # args of f are hidden by the wrapper, parse signature again with them
+            arg_names = getargspec(f)[0]
+            if authenticated:
+                arg_names = ['username', 'password'] + arg_names
+            _f.json_method, _f.json_arg_types, _f.json_return_type = _parse_sig(_f.json_sig, arg_names, validate)
+            _f.json_args = arg_names
+            _f.json_cache = cache
+            return _f
+        return decorator
+
+    def invalidate(self, method, params=None):
+        """
+        :param method: name of method
+        :param params: drop cached result of these params, or all results of method if None
+        """
+        cache = getattr(self.site.urls.get(method), 'json_cache', None)
+        if cache is None:
+            return
+        if params is None:
+            cache.invalidate()
+        else:
+            cache.invalidate(canonical_key(method, params))
+
+
+class ParallelJSONRPCSite(JSONRPCSite):
+    """
+    json-rpc site runs calls of a batch request concurrently on a bounded thread pool,
+    responses come back in request order, a failing call only gets its own error
+
+    cached json of methods with cache (see: CachedJSONRPC) is spliced into responses
+
+        jsonrpc = CachedJSONRPC(app, '/api', site=ParallelJSONRPCSite(max_workers=8))
+    """
+
+    def __init__(self, max_workers=8):
+        super(ParallelJSONRPCSite, self).__init__()
+        self.max_workers = max_workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    @property
+    def pool(self):
+        # threads are only started when the first batch comes
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPool(self.max_workers)
+        return self._pool
+
+    def dispatch(self, request, method=''):
+        response, status = super(ParallelJSONRPCSite, self).dispatch(request, method)
+        if isinstance(response, dict) and isinstance(response.get('result'), RawJSON):
+            return self.raw_response(self.encode_response(response), status), status
+        return response, status
+
+    def raw_response(self, body, status):
+        return flask.current_app.response_class(body, status=status, mimetype='application/json')
+
+    def encode_response(self, response):
+        result = response.get('result')
+        if not isinstance(result, RawJSON):
+            return flask.json.dumps(response)
+        envelope = flask.json.dumps({k: v for k, v in response.items() if k != 'result'})
+        return '%s, "result": %s}' % (envelope[:-1], result)
+
+    def batch_response_obj(self, request, D):
+        if not D:
+            response = self.empty_response(version='2.0')
+            response.pop('result', None)
+            response['error'] = InvalidRequestError('Empty array').json_rpc_format
+            return response, 200
+        if len(D) == 1:
+            responses = [self.call_response_obj(request, D[0])]
+        else:
+            # version is set on the shared request once, calls in pool write theirs to their own view of it
+            request.jsonrpc_version = _batch_version(D)
+            # each call runs in its own copy of request context, so that flask.request works in the pool
+            calls = [flask.copy_current_request_context(self._bind_call(_CallRequest(request), d)) for d in D]
+            responses = self.pool.map(lambda call: call(), calls, chunksize=1)
+        # notifications get no response
+        responses = [response for response in responses if response is not None]
+        if not responses:
+            return '', 204
+        if any(isinstance(response.get('result'), RawJSON) for response in responses if isinstance(response, dict)):
+            body = '[%s]' % ', '.join(self.encode_response(response) for response in responses)
+            return self.raw_response(body, 200), 200
+        return responses, 200
+
+    def _bind_call(self, request, d):
+        def call():
+            return self.call_response_obj(request, d)
+        return call
+
+    def call_response_obj(self, request, d):
+        request_id = d.get('id') if isinstance(d, dict) else None
+        try:
+            response = self.response_obj(request, d)[0]
+        except Exception, e:
+            response = self.empty_response(version='2.0')
+            response.pop('result', None)
+            response['error'] = OtherError(e).json_rpc_format
+        # errors raised before the call, like method not found, should still carry the id
+        if isinstance(response, dict) and response.get('id') is None:
+            response['id'] = request_id
+        return response
+
+
+class _CallRequest(object):
+    """
+    view of request for one call of a batch, attributes set by the call, like `jsonrpc_version`,
+    stay on the view, others are read from the request shared by the calls
+    """
+
+    def __init__(self, request):
+        self._request = request
+
+    def __getattr__(self, name):
+        return getattr(self._request, name)
+
+
+def _batch_version(D):
+    """
+    :param D: decoded calls of batch
+    :return: json-rpc version of the first call
+    """
+    d = D[0] if isinstance(D[0], dict) else {}
+    for key in ('jsonrpc', 'version'):
+        if key in d:
+            return unicode(d[key])
+    return JSONRPC_VERSION_DEFAULT
@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import benchmark
+
+
+class BenchmarkTest(unittest.TestCase):
+
+    def test_cases_run(self):
+        names = [name for name, _ in benchmark.CASES]
+        self.assertEqual(len(names), len(set(names)))
+        for name, setup in benchmark.CASES:
+            setup()()
+
+    def test_baseline_covers_cases(self):
+        baseline = benchmark.load()
+        self.assertEqual(sorted(baseline), sorted(name for name, _ in benchmark.CASES))
+
+    def test_measure(self):
+        calls = []
+        seconds = benchmark.measure(lambda: calls.append(1), repeat=2, repeat_time=0.01)
+        self.assertGreater(seconds, 0)
+        self.assertLess(seconds, 0.01)
+        self.assertGreater(len(calls), 2)
+
+    def test_compare(self):
+        baseline = {'same': 10.0, 'slow': 10.0, 'fast': 10.0}
+        lines, regressions = benchmark.compare({'same': 11.0, 'slow': 13.0, 'fast': 5.0, 'added': 1.0}, baseline,
+                                               threshold=0.25)
+        self.assertEqual(regressions, ['slow'])
+        text = '\n'.join(lines)
+        self.assertIn('REGRESSION', text)
+        self.assertIn('faster', text)
+        self.assertIn('new', text)
+
+    def test_save_and_compare(self):
+        directory = tempfile.mkdtemp()
+        run = benchmark.run
+        try:
+            path = os.path.join(directory, 'baseline.json')
+            benchmark.save({'a': 1.23456}, path)
+            self.assertEqual(benchmark.load(path), {'a': 1.235})
+            results = {'a': 10.0}
+            benchmark.run = lambda *args: results
+            self.assertEqual(benchmark.main(['--compare', path]), 1)
+            results['a'] = 1.2
+            self.assertEqual(benchmark.main(['--compare', path]), 0)
+        finally:
+            benchmark.run = run
+            shutil.rmtree(directory)
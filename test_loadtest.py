@@ -0,0 +1,118 @@
+import json
+import os
+import shutil
+import StringIO
+import tempfile
+import unittest
+
+import flask
+
+import loadtest
+
+
+def make_app():
+    app = flask.Flask(__name__)
+
+    @app.route('/api', methods=['POST'])
+    def api():
+        payload = json.loads(flask.request.get_data())
+        calls = payload if isinstance(payload, list) else [payload]
+        responses = [{'id': call.get('id'), 'result': {'method': call['method']}} if call['method'] != 'fail' else
+                     {'id': call.get('id'), 'error': {'message': 'failed'}} for call in calls]
+        return flask.jsonify(responses if isinstance(payload, list) else responses[0])
+
+    @app.route('/other', methods=['POST'])
+    def other():
+        return 'ok'
+
+    return app
+
+
+def call(method, id=1):
+    return {'jsonrpc': '2.0', 'method': method, 'params': {}, 'id': id}
+
+
+class CaptureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'requests.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_capture_and_load(self):
+        app = make_app()
+        middleware = loadtest.capture(app, self.path)
+        client = app.test_client()
+        for body in (call('a'), [call('b'), call('c', 2)]):
+            response = client.post('/api', data=json.dumps(body), content_type='application/json')
+            # the body is still read by the app
+            self.assertEqual(response.status_code, 200)
+        client.post('/other', data='{}')
+        client.post('/api', data='not json')
+        middleware.close()
+        with open(self.path, 'a') as f:
+            # lines of the backlog have no json-rpc body
+            f.write(json.dumps({'request_id': 'user-001', 'title': 'x', 'body': 'text'}) + '\n\n')
+        records = loadtest.load_records(self.path)
+        self.assertEqual([record['title'] for record in records], ['a', 'b,c'])
+        self.assertEqual(json.loads(records[1]['body'])[1]['id'], 2)
+        self.assertEqual(records[0]['path'], '/api')
+
+    def test_chunked_body(self):
+        seen = []
+
+        def app(environ, start_response):
+            seen.append(environ['wsgi.input'].read(int(environ['CONTENT_LENGTH'])))
+            return []
+
+        middleware = loadtest.CaptureMiddleware(app, self.path)
+        body = json.dumps(call('a'))
+        middleware({'REQUEST_METHOD': 'POST', 'PATH_INFO': '/api', 'HTTP_TRANSFER_ENCODING': 'chunked',
+                    'wsgi.input': StringIO.StringIO(body)}, None)
+        middleware.close()
+        self.assertEqual(seen, [body])
+        self.assertEqual(loadtest.load_records(self.path)[0]['body'], body)
+
+
+class ReplayTest(unittest.TestCase):
+
+    def records(self):
+        return [{'title': method, 'path': '/api', 'body': json.dumps(call(method)), 'timestamp': 100 + i}
+                for i, method in enumerate(['a', 'fail', 'a', 'b'])]
+
+    def test_schedule(self):
+        records = self.records()
+        self.assertEqual([offset for offset, _ in loadtest.schedule(records, speed=2)], [0, 0.5, 1, 1.5])
+        self.assertEqual([offset for offset, _ in loadtest.schedule(records, speed=0)], [None] * 4)
+        scheduled = list(loadtest.schedule(records, rate=10, duration=0.6))
+        self.assertEqual([offset for offset, _ in scheduled], [i / 10.0 for i in range(6)])
+        self.assertEqual(scheduled[4][1], records[0])
+        self.assertEqual(list(loadtest.schedule([])), [])
+
+    def test_replay(self):
+        transport = loadtest.TestClientTransport(make_app())
+        report = loadtest.replay(self.records(), transport, concurrency=2, speed=0)
+        summary = report.summary()
+        self.assertEqual(summary['*']['count'], 4)
+        self.assertEqual(summary['a']['count'], 2)
+        self.assertEqual(summary['fail']['error_rate'], 1.0)
+        self.assertEqual(summary['*']['error_rate'], 0.25)
+        self.assertIn('fail', report.format())
+
+    def test_is_error(self):
+        self.assertFalse(loadtest.is_error(200, '{"result": 1}'))
+        self.assertFalse(loadtest.is_error(200, '[{"result": {"data": 1}}]'))
+        self.assertTrue(loadtest.is_error(500, '{"result": 1}'))
+        self.assertTrue(loadtest.is_error(200, 'oops'))
+        self.assertTrue(loadtest.is_error(200, '[{"result": 1}, {"error": {"code": -32000}}]'))
+        self.assertTrue(loadtest.is_error(200, '{"result": {"errors": ["bad"]}}'))
+
+    def test_percentile(self):
+        values = range(1, 101)
+        self.assertEqual(loadtest.percentile(values, 0.5), 50)
+        self.assertEqual(loadtest.percentile(values, 0.95), 95)
+        self.assertEqual(loadtest.percentile(values, 1), 100)
+        self.assertEqual(loadtest.percentile([7], 0.99), 7)
+        self.assertEqual(loadtest.percentile([], 0.5), 0.0)
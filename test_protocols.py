@@ -0,0 +1,72 @@
+import json
+import time
+import unittest
+
+import flask
+
+from protocols import CachedJSONRPC, ParallelJSONRPCSite, aa_data_api
+
+
+def make_app():
+    app = flask.Flask(__name__)
+    jsonrpc = CachedJSONRPC(app, '/api', site=ParallelJSONRPCSite(max_workers=4))
+
+    @jsonrpc.method('seen_version')
+    def seen_version(delay):
+        time.sleep(delay)
+        return flask.request.jsonrpc_version
+
+    @jsonrpc.method('fail')
+    @aa_data_api
+    def fail():
+        raise ValueError('failed')
+
+    return app
+
+
+def post(client, body):
+    response = client.post('/api', data=json.dumps(body), content_type='application/json')
+    return response.status_code, json.loads(response.data) if response.data else None
+
+
+class ParallelJSONRPCSiteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = make_app().test_client()
+
+    def test_batch_responses_in_request_order(self):
+        calls = [{'jsonrpc': '2.0', 'method': 'seen_version', 'params': {'delay': delay}, 'id': index}
+                 for index, delay in enumerate([0.05, 0, 0.02])]
+        status, responses = post(self.client, calls)
+        self.assertEqual(status, 200)
+        self.assertEqual([response['id'] for response in responses], [0, 1, 2])
+
+    def test_calls_do_not_change_version_of_shared_request(self):
+        calls = [{'jsonrpc': '2.0', 'method': 'seen_version', 'params': {'delay': 0.1}, 'id': 0}]
+        calls += [{'version': '1.1', 'method': 'seen_version', 'params': {'delay': 0}, 'id': index}
+                  for index in range(1, 4)]
+        status, responses = post(self.client, calls)
+        self.assertEqual(status, 200)
+        self.assertEqual(responses[0]['jsonrpc'], '2.0')
+        self.assertEqual([response['version'] for response in responses[1:]], ['1.1'] * 3)
+        # methods see the version of batch, set once before the calls are spread over the pool
+        self.assertEqual([response['result'] for response in responses], ['2.0'] * 4)
+
+    def test_failing_call_gets_its_own_error(self):
+        calls = [{'jsonrpc': '2.0', 'method': 'fail', 'params': {}, 'id': 1},
+                 {'jsonrpc': '2.0', 'method': 'missing', 'params': {}, 'id': 2},
+                 {'jsonrpc': '2.0', 'method': 'seen_version', 'params': {'delay': 0}, 'id': 3}]
+        status, responses = post(self.client, calls)
+        self.assertEqual(responses[0]['result']['errors']['code'], 500)
+        self.assertEqual(responses[1]['id'], 2)
+        self.assertIn('error', responses[1])
+        self.assertEqual(responses[2]['result'], '2.0')
+
+    def test_notifications_get_no_response(self):
+        calls = [{'jsonrpc': '2.0', 'method': 'seen_version', 'params': {'delay': 0}} for _ in range(2)]
+        status, responses = post(self.client, calls)
+        self.assertEqual(status, 204)
+
+    def test_empty_batch(self):
+        status, response = post(self.client, [])
+        self.assertIn('error', response)